@@ -0,0 +1,70 @@
+"""
+Time `savannah check` against migration histories of increasing length.
+
+    python benchmarks/check.py [--sizes 10,100,1000] [--repeat 20]
+
+Each history is a chain of empty migrations, applied to a SQLite database in
+a temporary directory. Once applied, `check` should take roughly the same
+time whatever the length of the history, while `list_migrations` grows with
+it. The manifest is warmed first, so the timings do not include parsing.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import savannah  # noqa: E402
+from synthetic import write_history  # noqa: E402
+
+
+async def timed(function, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await function()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+async def run(sizes, repeat: int) -> None:
+    print(f"{'migrations':>10}  {'check':>10}  {'list_migrations':>16}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            dir = f"migrations_{size}"
+            url = f"sqlite:///{tmp}/{dir}.db"
+            write_history(dir, size)
+            with contextlib.redirect_stdout(io.StringIO()):
+                await savannah.migrate(url, dir=dir, batch=True)
+
+            async def check():
+                assert await savannah.check(url, dir=dir)
+
+            async def list_migrations():
+                await savannah.list_migrations(url, dir=dir)
+
+            check_time = await timed(check, repeat)
+            list_time = await timed(list_migrations, repeat)
+            print(
+                f"{size:>10}  {check_time * 1000:>8.2f}ms  {list_time * 1000:>14.2f}ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    asyncio.run(run(sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
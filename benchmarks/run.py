@@ -0,0 +1,216 @@
+"""
+Benchmark the hot paths of savannah against synthetic migration histories.
+
+    python benchmarks/run.py --sizes 100,1000,20000 --shapes linear,wide,merges
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --baseline results.json
+
+For each shape and size of history this times:
+
+* manifest_cold - Reading the manifest with no cache on disk.
+* load_migrations - Loading the migration graph from a warm manifest.
+* order_dependencies - Topologically sorting the dependencies.
+* resolve_target - Matching a `--target` prefix against the history.
+* plan - Working out what `migrate` would run, with half the history applied.
+* apply - A full `migrate` against a local SQLite database. This is only
+  run for histories of up to `--apply-max` migrations.
+
+Results are written as JSON. Given a `--baseline` from an earlier run, any
+benchmark whose median is more than `--tolerance` slower than the baseline
+is reported, and the exit code is non-zero.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import savannah  # noqa: E402
+from savannah.commands import _match_migration, plan_migrations  # noqa: E402
+from savannah.loader import load_migrations, order_dependencies  # noqa: E402
+from savannah.manifest import MANIFEST_PATH, load_manifest  # noqa: E402
+from synthetic import SHAPES, write_history  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+def timed(function: Callable, repeat: int, setup: Callable = None) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def run_case(shape: str, size: int, repeat: int, apply_max: int) -> Dict[str, list]:
+    dir = f"migrations_{shape}_{size}"
+    dependencies = write_history(dir, size, shape=shape)
+    manifest_path = os.path.join(dir, MANIFEST_PATH)
+
+    def remove_manifest():
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    timings = {}
+    timings["manifest_cold"] = timed(
+        lambda: load_manifest(dir), repeat, setup=remove_manifest
+    )
+    load_manifest(dir)
+    timings["load_migrations"] = timed(
+        lambda: load_migrations(set(), dir_name=dir), repeat
+    )
+    timings["order_dependencies"] = timed(
+        lambda: order_dependencies(dependencies), repeat
+    )
+
+    graph = load_migrations(set(), dir_name=dir)
+    target = graph.order[len(graph) // 2]
+    timings["resolve_target"] = timed(lambda: _match_migration(graph, target), repeat)
+
+    applied = set(graph.order[: len(graph) // 2])
+
+    def plan():
+        plan_migrations(load_migrations(applied, dir_name=dir), target=None)
+
+    timings["plan"] = timed(plan, repeat)
+
+    if size <= apply_max:
+        url = f"sqlite:///{dir}.db"
+
+        def remove_database():
+            for path in (f"{dir}.db", f"{dir}.db.lock"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        def apply():
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(savannah.migrate(url, dir=dir))
+
+        timings["apply"] = timed(apply, repeat, setup=remove_database)
+    return timings
+
+
+def run(sizes: List[int], shapes: List[str], repeat: int, apply_max: int) -> dict:
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        sys.path.insert(0, tmp)
+        try:
+            for shape in shapes:
+                for size in sizes:
+                    timings = run_case(shape, size, repeat, apply_max)
+                    for name, durations in timings.items():
+                        results.append(
+                            {
+                                "name": name,
+                                "shape": shape,
+                                "size": size,
+                                "repeat": repeat,
+                                "median": statistics.median(durations),
+                                "min": min(durations),
+                            }
+                        )
+        finally:
+            sys.path.remove(tmp)
+            os.chdir(cwd)
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, tolerance: float, min_delta: float
+) -> List[dict]:
+    """
+    Return the results that are slower than their baseline by more than
+    `tolerance`, as a fraction, and by more than `min_delta` seconds.
+    """
+    previous = {
+        (row["name"], row["shape"], row["size"]): row for row in baseline["results"]
+    }
+    regressions = []
+    for row in results["results"]:
+        before = previous.get((row["name"], row["shape"], row["size"]))
+        if before is None:
+            continue
+        delta = row["median"] - before["median"]
+        if delta > min_delta and row["median"] > before["median"] * (1 + tolerance):
+            regressions.append({**row, "baseline": before["median"]})
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict]) -> None:
+    previous = {}
+    if baseline is not None:
+        previous = {
+            (row["name"], row["shape"], row["size"]): row["median"]
+            for row in baseline["results"]
+        }
+    print(f"{'benchmark':<20} {'shape':<8} {'size':>7} {'median':>12} {'change':>8}")
+    for row in results["results"]:
+        line = (
+            f"{row['name']:<20} {row['shape']:<8} {row['size']:>7} "
+            f"{row['median'] * 1000:>10.3f}ms"
+        )
+        before = previous.get((row["name"], row["shape"], row["size"]))
+        if before:
+            line += f" {(row['median'] / before - 1) * 100:>+7.1f}%"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100,1000,5000")
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--apply-max", type=int, default=1000)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=0.001)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    shapes = args.shapes.split(",")
+    results = run(sizes, shapes, args.repeat, args.apply_max)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, "r") as fin:
+            baseline = json.load(fin)
+    print_results(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, "w") as fout:
+            json.dump(results, fout, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        for row in regressions:
+            print(
+                f"Regression: {row['name']} ({row['shape']}, {row['size']}) "
+                f"took {row['median'] * 1000:.3f}ms, "
+                f"against {row['baseline'] * 1000:.3f}ms."
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
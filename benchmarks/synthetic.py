@@ -0,0 +1,88 @@
+"""
+Generate synthetic migration packages for benchmarking.
+
+Three shapes of history are supported:
+
+* "linear" - A single chain, where each migration depends on the last.
+* "wide" - A root migration, followed by `width` independent chains, which
+  are joined by a final merge migration.
+* "merges" - A chain that repeatedly forks into two migrations, which are
+  then joined by a merge migration, so that a third of the history is merges.
+
+Migrations have no operations by default, so that applying them measures
+the cost of savannah itself, rather than of the DDL.
+"""
+from typing import Dict, List
+import os
+
+SHAPES = ("linear", "wide", "merges")
+
+MIGRATION = """\
+import savannah
+import sqlalchemy
+
+
+class Migration(savannah.Migration):
+    dependencies = {dependencies!r}
+    operations = {operations}
+"""
+
+
+def migration_name(index: int) -> str:
+    return f"{index:05}_auto"
+
+
+def generate_dependencies(
+    size: int, shape: str = "linear", width: int = 10
+) -> Dict[str, List[str]]:
+    """
+    Return the dependencies mapping for a history of `size` migrations.
+    """
+    names = [migration_name(index) for index in range(1, size + 1)]
+    dependencies = {names[0]: []}
+
+    if shape == "linear":
+        for previous, name in zip(names, names[1:]):
+            dependencies[name] = [previous]
+    elif shape == "wide":
+        # The last migration joins the chains, unless there are too few
+        # migrations for there to be any chains.
+        body = names[1:-1] if size > 2 else names[1:]
+        heads = [names[0]] * width
+        for position, name in enumerate(body):
+            chain = position % width
+            dependencies[name] = [heads[chain]]
+            heads[chain] = name
+        if size > 2:
+            dependencies[names[-1]] = sorted(set(heads))
+    elif shape == "merges":
+        fork = names[0]
+        for position, name in enumerate(names[1:]):
+            if position % 3 == 2:
+                dependencies[name] = sorted([names[position - 1], names[position]])
+                fork = name
+            else:
+                dependencies[name] = [fork]
+    else:
+        raise ValueError(f"Unknown shape {shape!r}, expected one of {SHAPES}.")
+    return dependencies
+
+
+def write_history(
+    dir: str,
+    size: int,
+    shape: str = "linear",
+    width: int = 10,
+    operations: str = "[]",
+) -> Dict[str, List[str]]:
+    """
+    Write a migrations package to `dir`, returning its dependencies mapping.
+    """
+    os.makedirs(dir)
+    with open(os.path.join(dir, "__init__.py"), "w") as fout:
+        fout.write("")
+    dependencies = generate_dependencies(size, shape=shape, width=width)
+    for name, parents in dependencies.items():
+        with open(os.path.join(dir, f"{name}.py"), "w") as fout:
+            fout.write(MIGRATION.format(dependencies=parents, operations=operations))
+    return dependencies
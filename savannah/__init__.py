@@ -1,13 +1,55 @@
+"""
+Everything is imported on first use, rather than when `savannah` itself is
+imported, so that the command line starts quickly, and migration modules
+that `import savannah` only load the parts that they refer to.
+"""
+from importlib import import_module
 from .cli import cli
-from .migration import Migration
-from .config import Config
-from .commands import (
-    create_database,
-    drop_database,
-    database_exists,
-    init,
-    make_migration,
-    migrate,
-    list_migrations,
-)
-from .operations.create_table import CreateTable
+
+_exports = {
+    "Migration": ".migration",
+    "Config": ".config",
+    "Event": ".instrumentation",
+    "Instrument": ".instrumentation",
+    "LockTimeout": ".locking",
+    "Timeouts": ".timeouts",
+    "create_database": ".commands",
+    "drop_database": ".commands",
+    "database_exists": ".commands",
+    "init": ".commands",
+    "make_migration": ".commands",
+    "squash": ".commands",
+    "check": ".commands",
+    "diff": ".commands",
+    "migrate": ".commands",
+    "migrate_iter": ".commands",
+    "migrate_sql": ".commands",
+    "migration_plan": ".commands",
+    "migration_timings": ".commands",
+    "list_migrations": ".commands",
+    "CreateTable": ".operations.create_table",
+    "DropTable": ".operations.drop_table",
+    "AddColumn": ".operations.add_column",
+    "DropColumn": ".operations.drop_column",
+    "AlterColumn": ".operations.alter_column",
+    "CreateIndex": ".operations.create_index",
+    "DropIndex": ".operations.drop_index",
+    "AddConstraint": ".operations.add_constraint",
+    "DropConstraint": ".operations.drop_constraint",
+    "RunSQL": ".operations.run_sql",
+    "Backfill": ".operations.backfill",
+}
+
+__all__ = ["cli", *_exports]
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
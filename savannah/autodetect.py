@@ -0,0 +1,304 @@
+"""
+This module compares two schema states, and returns the operations that
+take the database from one to the other.
+
+Each table is reduced to a fingerprint, so that unchanged tables are skipped
+with a single comparison, and only tables whose fingerprints differ are
+compared column by column. The resulting operations are ordered so that
+foreign keys always point at tables that exist.
+"""
+from typing import Dict, List, Tuple
+import hashlib
+import sqlalchemy
+from .graph import CircularDependency, MigrationGraph
+from .operations.add_column import AddColumn
+from .operations.add_constraint import AddConstraint
+from .operations.alter_column import AlterColumn
+from .operations.create_index import CreateIndex
+from .operations.create_table import CreateTable
+from .operations.drop_column import DropColumn
+from .operations.drop_constraint import DropConstraint
+from .operations.drop_index import DropIndex
+from .operations.drop_table import DropTable
+from .operations.render import constraint_columns, render_default
+
+
+def column_signature(column: sqlalchemy.Column) -> tuple:
+    """
+    The parts of a column definition that an `AlterColumn` can change.
+    """
+    server_default = None
+    if column.server_default is not None:
+        server_default = str(render_default(column.server_default))
+    return (repr(column.type), bool(column.nullable), server_default)
+
+
+def index_signature(index: sqlalchemy.Index) -> tuple:
+    return (bool(index.unique), tuple(column.name for column in index.columns))
+
+
+def constraint_signature(constraint: sqlalchemy.Constraint) -> tuple:
+    if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+        targets = tuple(element.target_fullname for element in constraint.elements)
+        return (
+            "foreign_key",
+            tuple(constraint_columns(constraint)),
+            targets,
+            constraint.ondelete,
+            constraint.onupdate,
+        )
+    elif isinstance(constraint, sqlalchemy.UniqueConstraint):
+        return ("unique", tuple(constraint_columns(constraint)))
+    elif isinstance(constraint, sqlalchemy.CheckConstraint):
+        return ("check", constraint.name, str(constraint.sqltext))
+    return None
+
+
+def table_constraints(
+    table: sqlalchemy.Table, constraint_key=constraint_signature
+) -> Dict[tuple, sqlalchemy.Constraint]:
+    constraints = {}
+    for constraint in table.constraints:
+        signature = constraint_key(constraint)
+        if signature is not None:
+            constraints[signature] = constraint
+    return constraints
+
+
+def table_indexes(table: sqlalchemy.Table) -> Dict[str, sqlalchemy.Index]:
+    return {str(index.name): index for index in table.indexes}
+
+
+def table_fingerprint(
+    table: sqlalchemy.Table,
+    column_key=column_signature,
+    constraint_key=constraint_signature,
+) -> str:
+    description = (
+        [
+            (column.name, bool(column.primary_key), column_key(column))
+            for column in table.columns
+        ],
+        sorted(
+            (name, index_signature(index))
+            for name, index in table_indexes(table).items()
+        ),
+        sorted(
+            repr(signature) for signature in table_constraints(table, constraint_key)
+        ),
+    )
+    return hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+
+
+class Autodetector:
+    def __init__(
+        self, from_metadata: sqlalchemy.MetaData, to_metadata: sqlalchemy.MetaData
+    ) -> None:
+        self.from_tables = dict(from_metadata.tables)
+        self.to_tables = dict(to_metadata.tables)
+
+    def column_signature(self, column: sqlalchemy.Column) -> tuple:
+        return column_signature(column)
+
+    def constraint_signature(self, constraint: sqlalchemy.Constraint) -> tuple:
+        return constraint_signature(constraint)
+
+    def table_constraints(self, table: sqlalchemy.Table) -> dict:
+        return table_constraints(table, self.constraint_signature)
+
+    def table_fingerprint(self, table: sqlalchemy.Table) -> str:
+        return table_fingerprint(
+            table, self.column_signature, self.constraint_signature
+        )
+
+    def changed_tables(self) -> List[str]:
+        names = self.from_tables.keys() & self.to_tables.keys()
+        return sorted(
+            name
+            for name in names
+            if self.table_fingerprint(self.from_tables[name])
+            != self.table_fingerprint(self.to_tables[name])
+        )
+
+    def has_changes(self) -> bool:
+        if self.from_tables.keys() != self.to_tables.keys():
+            return True
+        return bool(self.changed_tables())
+
+    def detect(self) -> list:
+        created = [name for name in self.to_tables if name not in self.from_tables]
+        dropped = [name for name in self.from_tables if name not in self.to_tables]
+        changed = self.changed_tables()
+
+        removals, alterations, additions = [], [], []
+        for name in changed:
+            table_removals, table_alterations, table_additions = self.diff_table(name)
+            removals.extend(table_removals)
+            alterations.extend(table_alterations)
+            additions.extend(table_additions)
+
+        operations = list(removals)
+        for name in reversed(self.order_tables(dropped, self.from_tables)):
+            operations.append(self.drop_table(name))
+        for name in self.order_tables(created, self.to_tables):
+            table = self.to_tables[name]
+            operations.append(self.create_table(table))
+            for index_name, index in sorted(table_indexes(table).items()):
+                operations.append(self.create_index(name, index_name, index))
+        operations.extend(alterations)
+        operations.extend(additions)
+        return operations
+
+    def diff_table(self, name: str) -> Tuple[list, list, list]:
+        """
+        Return the operations for a table that exists in both states, split
+        into removals, column changes, and additions.
+        """
+        old = self.from_tables[name]
+        new = self.to_tables[name]
+        removals, alterations, additions = [], [], []
+
+        added_columns = [column for column in new.columns if column.name not in old.c]
+        dropped_columns = [column for column in old.columns if column.name not in new.c]
+        added_names = {column.name for column in added_columns}
+        dropped_names = {column.name for column in dropped_columns}
+
+        old_indexes, new_indexes = table_indexes(old), table_indexes(new)
+        old_signatures = {
+            index_name: index_signature(index)
+            for index_name, index in old_indexes.items()
+        }
+        new_signatures = {
+            index_name: index_signature(index)
+            for index_name, index in new_indexes.items()
+        }
+        for index_name, index in sorted(old_indexes.items()):
+            if new_signatures.get(index_name) != old_signatures[index_name]:
+                removals.append(self.drop_index(name, index_name, index))
+        for index_name, index in sorted(new_indexes.items()):
+            if old_signatures.get(index_name) != new_signatures[index_name]:
+                additions.append(self.create_index(name, index_name, index))
+
+        old_constraints = self.table_constraints(old)
+        new_constraints = self.table_constraints(new)
+        for signature in sorted(
+            old_constraints.keys() - new_constraints.keys(), key=repr
+        ):
+            constraint = old_constraints[signature]
+            # Dropping a column drops the constraints that cover it.
+            if set(constraint_columns(constraint)) & dropped_names:
+                continue
+            removals.append(DropConstraint(name, constraint.copy()))
+        for signature in sorted(
+            new_constraints.keys() - old_constraints.keys(), key=repr
+        ):
+            constraint = new_constraints[signature]
+            # Single column foreign keys on new columns are created along
+            # with the column.
+            if (
+                isinstance(constraint, sqlalchemy.ForeignKeyConstraint)
+                and len(constraint.elements) == 1
+                and constraint.elements[0].parent.name in added_names
+            ):
+                continue
+            additions.append(AddConstraint(name, constraint.copy()))
+
+        for column in added_columns:
+            alterations.append(AddColumn(name, self.copy_column(column)))
+        for column in new.columns:
+            if column.name in added_names:
+                continue
+            existing = old.c[column.name]
+            if self.column_signature(existing) != self.column_signature(column):
+                alterations.append(
+                    AlterColumn(
+                        name,
+                        column=self.copy_column(column),
+                        existing=self.copy_column(existing),
+                    )
+                )
+        for column in dropped_columns:
+            alterations.append(DropColumn(name, self.copy_column(column)))
+
+        return removals, alterations, additions
+
+    def create_table(self, table: sqlalchemy.Table) -> CreateTable:
+        columns = [self.copy_column(column) for column in table.columns]
+        return CreateTable(table.name, columns, self.table_level_constraints(table))
+
+    def drop_table(self, name: str) -> DropTable:
+        table = self.from_tables[name]
+        columns = [self.copy_column(column) for column in table.columns]
+        return DropTable(name, columns, self.table_level_constraints(table))
+
+    def create_index(self, table_name: str, index_name: str, index) -> CreateIndex:
+        columns = [column.name for column in index.columns]
+        return CreateIndex(index_name, table_name, columns, unique=bool(index.unique))
+
+    def drop_index(self, table_name: str, index_name: str, index) -> DropIndex:
+        columns = [column.name for column in index.columns]
+        return DropIndex(index_name, table_name, columns, unique=bool(index.unique))
+
+    def copy_column(self, column: sqlalchemy.Column) -> sqlalchemy.Column:
+        # Indexes and unique constraints are handled as operations of their
+        # own, so the flags that create them implicitly are cleared.
+        copied = column.copy()
+        # Copies take the nullability given when the column was created,
+        # rather than any set since, as `AlterColumn` does.
+        copied.nullable = column.nullable
+        copied.index = None
+        copied.unique = None
+        # Copying a column that belongs to a table leaves its foreign keys
+        # behind with the table's constraints, so single column foreign keys
+        # are copied across explicitly.
+        for foreign_key in column.foreign_keys:
+            if foreign_key.constraint is None:
+                continue
+            if len(foreign_key.constraint.elements) == 1:
+                copied.append_foreign_key(
+                    sqlalchemy.ForeignKey(
+                        foreign_key.target_fullname,
+                        name=foreign_key.name,
+                        ondelete=foreign_key.ondelete,
+                        onupdate=foreign_key.onupdate,
+                    )
+                )
+        return copied
+
+    def table_level_constraints(self, table: sqlalchemy.Table) -> list:
+        """
+        The constraints that are not already expressed on the columns.
+        """
+        constraints = []
+        for constraint in table_constraints(table).values():
+            if (
+                isinstance(constraint, sqlalchemy.ForeignKeyConstraint)
+                and len(constraint.elements) == 1
+            ):
+                continue
+            constraints.append(constraint.copy())
+        return sorted(
+            constraints, key=lambda constraint: repr(constraint_signature(constraint))
+        )
+
+    def order_tables(self, names: List[str], tables: Dict[str, sqlalchemy.Table]):
+        """
+        Order the given tables so that each comes after the tables that it
+        references. If the references are circular, use alphabetical order.
+        """
+        members = set(names)
+        dependencies = {}
+        for name in names:
+            referenced = {
+                foreign_key.target_fullname.rpartition(".")[0]
+                for foreign_key in tables[name].foreign_keys
+            }
+            dependencies[name] = sorted((referenced & members) - {name})
+        try:
+            return MigrationGraph(dependencies).order
+        except CircularDependency:
+            return sorted(names)
+
+
+def detect_changes(from_state: dict, to_state: dict) -> list:
+    return Autodetector(from_state["metadata"], to_state["metadata"]).detect()
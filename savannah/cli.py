@@ -1,41 +1,227 @@
-import asyncio
 import click
+import json
 import os
-from dotenv import load_dotenv
-from . import commands
+import sys
+
+# The commands pull in databases, SQLAlchemy and the rest, so they are only
+# imported by the subcommands that use them. That keeps `--help` fast.
+
+
+def run(coroutine):
+    import asyncio
+
+    return asyncio.run(coroutine)
+
+
+async def print_events(events) -> None:
+    """
+    Print the progress of a migration from its stream of events.
+    """
+    unapplying = set()
+    async for event in events:
+        if event.kind == "lock" and event.phase == "timeout":
+            delay = event.details["delay"]
+            print(
+                f"  Lock timed out after {event.duration:.1f}s, retrying in {delay:.1f}s"
+            )
+        elif event.kind == "lock" and event.duration:
+            print(f"Waited {event.duration:.1f}s for the migration lock.")
+        elif event.kind == "plan":
+            unapplying = set(event.details["downgrades"])
+            if not unapplying and not event.details["upgrades"]:
+                print("No migrations required.")
+        elif event.kind == "migration" and event.phase in ("start", "batched"):
+            action = "Unapplying" if event.name in unapplying else "Applying"
+            print(f"{action} {event.name}")
+        elif event.kind == "migration" and event.details.get("lock_wait"):
+            waited = event.details["lock_wait"]
+            execution = event.details["execution"]
+            print(f"  Waited {waited:.1f}s for locks, executed in {execution:.1f}s")
 
 
 def load_database_url():
+    from dotenv import load_dotenv
+
     load_dotenv()
     if "DATABASE_URL" not in os.environ:
         raise Exception("DATABASE_URL not in environment. You must specify --database.")
     return os.environ["DATABASE_URL"]
 
 
+def fanout_options(function):
+    """
+    Options for running a command against many databases at once.
+    """
+    options = [
+        click.option(
+            "--databases-file",
+            type=click.Path(exists=True, dir_okay=False),
+            help="File listing one database URL per line.",
+        ),
+        click.option("--databases-glob", help="Glob pattern of SQLite database files."),
+        click.option(
+            "--databases-from",
+            help="A 'module:function' returning an iterable of database URLs.",
+        ),
+        click.option(
+            "--concurrency",
+            type=int,
+            default=10,
+            show_default=True,
+            help="Maximum number of databases to work on at once.",
+        ),
+    ]
+    for option in reversed(options):
+        function = option(function)
+    return function
+
+
+def load_fanout_urls(databases_file, databases_glob, databases_from):
+    if databases_file is None and databases_glob is None and databases_from is None:
+        return None
+    from . import fanout
+
+    return fanout.load_database_urls(
+        file=databases_file, glob=databases_glob, factory=databases_from
+    )
+
+
+def print_fanout_summary(results, describe):
+    failed = 0
+    for result in results:
+        if result.is_success:
+            status = "ok"
+            detail = describe(result.result)
+        else:
+            failed += 1
+            status = "FAILED"
+            detail = f"{type(result.error).__name__}: {result.error}"
+        print(f"{status:6} {result.url} ({result.duration:.2f}s) {detail}")
+    print(f"{len(results) - failed} succeeded, {failed} failed.")
+    if failed:
+        sys.exit(1)
+
+
+def print_timings(report):
+    width = max([len(row["name"]) for row in report], default=0)
+    for row in report:
+        checkmark = "+" if row["applied"] else " "
+        line = f"[{checkmark}] {row['name']:{width}}"
+        if row["applied_at"] is not None:
+            line += f"  {row['applied_at']}"
+        if row["duration"] is not None:
+            line += f"  {row['duration']:.3f}s"
+        if row["statements"] is not None:
+            line += f"  {row['statements']} statements"
+        if row["modified"]:
+            line += "  (modified since applied)"
+        print(line.rstrip())
+    total = sum(row["duration"] or 0.0 for row in report)
+    print(f"Total: {total:.3f}s")
+
+
 @click.group()
 def cli():
     pass
 
 
+def black_option(function):
+    return click.option(
+        "--black",
+        "use_black",
+        is_flag=True,
+        help="Also format the new migration with black, which must be installed.",
+    )(function)
+
+
 @click.command()
-def init():
-    asyncio.run(commands.init(dir="migrations"))
+@black_option
+def init(use_black=False):
+    from . import commands
+
+    run(commands.init(dir="migrations", use_black=use_black))
 
 
 @click.command()
-@click.option("--database", help="Database URL.")
-def make_migration(database):
-    if database is None:
-        database = load_database_url()
-    asyncio.run(commands.make_migration(database))
+@click.option("--database", help="Deprecated, and ignored.")
+@black_option
+@click.option(
+    "--check",
+    is_flag=True,
+    help="Exit non-zero if the metadata has changes that need a migration, "
+    "without writing one.",
+)
+def make_migration(database=None, check=False, use_black=False):
+    from . import commands
+
+    if database is not None:
+        click.echo(f"DeprecationWarning: {commands.DATABASE_URL_IGNORED}", err=True)
+    if check:
+        if run(commands.make_migration(dir="migrations", check=True)):
+            print("Changes detected. Run 'savannah make-migration'.")
+            sys.exit(1)
+        print("No changes detected.")
+        return
+    run(commands.make_migration(dir="migrations", use_black=use_black))
+
+
+@click.command()
+@click.argument("start")
+@click.argument("end")
+@black_option
+def squash(start, end, use_black=False):
+    from . import commands
+
+    run(commands.squash(start, end, dir="migrations", use_black=use_black))
 
 
 @click.command()
 @click.option("--database", help="Database URL.")
-def list_migrations(database):
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Show when each migration was applied, and how long it took.",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    help="Output the migrations and their timings as JSON.",
+)
+@fanout_options
+def list_migrations(
+    database,
+    databases_file,
+    databases_glob,
+    databases_from,
+    concurrency,
+    timings=False,
+    as_json=False,
+):
+    from . import commands, fanout
+
+    urls = load_fanout_urls(databases_file, databases_glob, databases_from)
+    if urls is not None:
+        results = run(fanout.list_migrations_many(urls, concurrency=concurrency))
+
+        def describe(migrations):
+            applied = sum(1 for migration in migrations if migration.is_applied)
+            return f"{applied}/{len(migrations)} applied"
+
+        print_fanout_summary(results, describe)
+        return
+
     if database is None:
         database = load_database_url()
-    migrations = asyncio.run(commands.list_migrations(database))
+    if timings or as_json:
+        report = run(commands.migration_timings(database))
+        if as_json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_timings(report)
+        return
+
+    migrations = run(commands.list_migrations(database))
     for migration in migrations:
         if migration.is_applied:
             checkmark = "+"
@@ -47,20 +233,190 @@ def list_migrations(database):
 @click.command()
 @click.option("--database", help="Database URL.")
 @click.option("--target", type=str, help="Target.")
-def migrate(database, target=None):
+@click.option(
+    "--batch",
+    is_flag=True,
+    help="Compile statements up front, and send them in as few round trips as possible.",
+)
+@click.option(
+    "--atomicity",
+    type=click.Choice(["all", "per-migration", "none"]),
+    help="Run everything in one transaction, commit after each migration, "
+    "or use no transactions. Defaults to 'all', or to 'per-migration' "
+    "with --parallel.",
+)
+@click.option(
+    "--parallel",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Apply up to this many migrations from independent branches at once.",
+)
+@click.option(
+    "--plan",
+    "show_plan",
+    is_flag=True,
+    help="Print the migrations that would run, without running them.",
+)
+@click.option(
+    "--migration-lock-timeout",
+    type=float,
+    default=60.0,
+    show_default=True,
+    help="Seconds to wait for another process that is migrating the database.",
+)
+@click.option(
+    "--ddl-lock-timeout",
+    type=float,
+    help="Seconds each statement may wait for a table lock before the "
+    "migration is retried (lock_timeout on PostgreSQL, lock_wait_timeout "
+    "on MySQL).",
+)
+@click.option(
+    "--statement-timeout",
+    type=float,
+    help="Seconds each statement may run for, on PostgreSQL.",
+)
+@click.option(
+    "--lock-attempts",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Times to attempt a migration whose table lock times out, with "
+    "jittered exponential backoff between attempts.",
+)
+@click.option(
+    "--sql",
+    is_flag=True,
+    help="Print the SQL script for the migration plan, without connecting.",
+)
+@click.option(
+    "--from",
+    "start",
+    type=str,
+    help="With --sql, the last migration already applied to the database.",
+)
+@fanout_options
+def migrate(
+    database,
+    databases_file,
+    databases_glob,
+    databases_from,
+    concurrency,
+    target=None,
+    batch=False,
+    sql=False,
+    start=None,
+    migration_lock_timeout=60.0,
+    show_plan=False,
+    atomicity=None,
+    parallel=1,
+    ddl_lock_timeout=None,
+    statement_timeout=None,
+    lock_attempts=1,
+):
+    from . import commands, fanout
+    from .timeouts import Timeouts
+
+    if atomicity is None:
+        atomicity = "per-migration" if parallel > 1 else "all"
+    timeouts = Timeouts(
+        lock_timeout=ddl_lock_timeout,
+        statement_timeout=statement_timeout,
+        attempts=lock_attempts,
+    )
+
+    if sql:
+        if database is None:
+            database = load_database_url()
+        script = commands.migrate_sql(
+            database, target=target, start=start, atomicity=atomicity
+        )
+        for chunk in script:
+            sys.stdout.write(chunk)
+        return
+
+    urls = load_fanout_urls(databases_file, databases_glob, databases_from)
+    if urls is not None:
+        results = run(
+            fanout.migrate_many(
+                urls,
+                target=target,
+                batch=batch,
+                concurrency=concurrency,
+                migration_lock_timeout=migration_lock_timeout,
+                atomicity=atomicity,
+                parallel=parallel,
+                timeouts=timeouts,
+            )
+        )
+        print_fanout_summary(results, lambda count: f"{count} migrations run")
+        return
+
     if database is None:
         database = load_database_url()
-    asyncio.run(commands.migrate(database, target=target))
+    if show_plan:
+        downgrades, upgrades = run(commands.migration_plan(database, target=target))
+        for migration in downgrades:
+            print(f"Unapply {migration.name}")
+        for migration in upgrades:
+            print(f"Apply   {migration.name}")
+        if not downgrades and not upgrades:
+            print("No migrations required.")
+        return
+
+    events = commands.migrate_iter(
+        database,
+        target=target,
+        batch=batch,
+        migration_lock_timeout=migration_lock_timeout,
+        atomicity=atomicity,
+        parallel=parallel,
+        timeouts=timeouts,
+    )
+    run(print_events(events))
+
+
+@click.command()
+@click.option("--database", help="Database URL.")
+def check(database):
+    from . import commands
+
+    if database is None:
+        database = load_database_url()
+    if not run(commands.check(database)):
+        print("Migrations are not up to date.")
+        sys.exit(1)
+
+
+@click.command()
+@click.option("--database", help="Database URL.")
+def diff(database):
+    from . import commands
+    from .generators.writer import layout
+
+    if database is None:
+        database = load_database_url()
+    operations = run(commands.diff(database, dir="migrations"))
+    if not operations:
+        print("No differences.")
+        return
+    print("The database differs from the migrations:")
+    for operation in operations:
+        print("\n".join(layout(operation.render())))
+    sys.exit(1)
 
 
 @click.command()
 @click.option("--database", help="Database URL.")
 def create_database(database):
+    from . import commands
+
     if database is None:
         database = load_database_url()
-    exists = asyncio.run(commands.database_exists(database))
+    exists = run(commands.database_exists(database))
     if not exists:
-        asyncio.run(commands.create_database(database))
+        run(commands.create_database(database))
         print("Created database")
     else:
         print("Database already exists")
@@ -69,11 +425,13 @@ def create_database(database):
 @click.command()
 @click.option("--database", help="Database URL.")
 def drop_database(database):
+    from . import commands
+
     if database is None:
         database = load_database_url()
-    exists = asyncio.run(commands.database_exists(database))
+    exists = run(commands.database_exists(database))
     if exists:
-        asyncio.run(commands.drop_database(database))
+        run(commands.drop_database(database))
         print("Dropped database")
     else:
         print("Database does not exist")
@@ -81,8 +439,11 @@ def drop_database(database):
 
 cli.add_command(init)
 cli.add_command(make_migration)
+cli.add_command(squash)
 cli.add_command(list_migrations)
 cli.add_command(migrate)
+cli.add_command(check)
+cli.add_command(diff)
 cli.add_command(create_database)
 cli.add_command(drop_database)
 
@@ -1,19 +1,41 @@
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple
 from databases import Database, DatabaseURL
+import asyncio
 import os
-from .config import load_config, Config
-from .generators.empty import EmptyGenerator
-from .generators.initial import InitialGenerator
+import time
+import warnings
+from .graph import MigrationGraph
+from .executor import run_migrations
+from .instrumentation import Event, EventStream, Instrument, InstrumentedDatabase
 from .tables import (
+    _get_dialect,
     db_create_migrations_table_if_not_exists,
+    db_load_fingerprint,
+    db_load_migration_details,
     db_load_migrations_table,
-    db_apply_migration,
-    db_unapply_migration,
+    db_save_fingerprint,
+    migrations_digest,
 )
 from .loader import load_migrations
+from .locking import migration_lock
+from .manifest import load_manifest
+from .timeouts import Timeouts
 import sqlalchemy
 
+# make_migration() used to connect to the database, but no longer does.
+DATABASE_URL_IGNORED = (
+    "make_migration no longer connects to the database, so the database URL "
+    "is ignored."
+)
+
+# The commands that write migrations import what they need themselves, so
+# that running migrations does not load the autodetector or code formatter.
+
+
+async def init(dir="migrations", use_black: bool = False):
+    from .config import Config
+    from .generators.initial import InitialGenerator
 
-async def init(dir="migrations"):
     migration_init_path = os.path.join(dir, "__init__.py")
     migration_0001_path = os.path.join(dir, "0001_initial.py")
 
@@ -25,98 +47,531 @@ async def init(dir="migrations"):
     os.mkdir(dir)
     config.write_config_to_disk(path=migration_init_path)
     print(f"Created config in {migration_init_path!r}")
-    generator.write_migration_to_disk(path=migration_0001_path)
+    generator.write_migration_to_disk(path=migration_0001_path, use_black=use_black)
     print(f"Created migration '0001_initial'")
 
 
-async def make_migration(url: str, dir: str = "migrations"):
-    async with Database(url) as database:
-        applied = await db_load_migrations_table(database)
+async def make_migration(
+    url: str = None,
+    dir: str = "migrations",
+    check: bool = False,
+    use_black: bool = False,
+) -> bool:
+    """
+    Write a new migration, taking the schema from the state at the head of
+    the migration history to the current state of the configured metadata.
+
+    This no longer connects to the database, so `url` is ignored. It is
+    only accepted so that existing calls keep working.
+
+    With `check=True` nothing is written, and the return value indicates
+    whether there are changes that still need a migration.
+
+    The migration is written in black's style without running black. Pass
+    `use_black=True` to also run it through black, which must be installed.
+    """
+    from .config import load_config
+    from .generators.auto import AutoGenerator
+
+    if url is not None:
+        warnings.warn(DATABASE_URL_IGNORED, DeprecationWarning, stacklevel=2)
+    from .state import (
+        apply_operations,
+        compute_state_hashes,
+        load_state,
+        write_snapshot,
+    )
 
-    import os
+    # Finding the leaf migrations only requires the manifest, so there is
+    # no need to connect to the database here.
+    graph = load_migrations(set(), dir_name=dir)
+    dependencies = graph.leaves
+    # A squashed migration takes the number at the start of its range, so
+    # the next number comes after every migration, including replaced ones.
+    numbers = [0]
+    for entry in load_manifest(dir).values():
+        for migration_name in (entry.name, *entry.replaces):
+            prefix = migration_name.split("_")[0]
+            if prefix.isdigit():
+                numbers.append(int(prefix))
+    name = f"{max(numbers) + 1:04}_auto"
+
+    config = load_config(dir)
+    from_state = {"metadata": load_state(graph, dir_name=dir)}
+    to_state = config.get_current_state()
+    generator = AutoGenerator(from_state=from_state, to_state=to_state)
+    if check:
+        return generator.has_changes()
+
+    migration_000x_path = os.path.join(dir, f"{name}.py")
+    if os.path.exists(migration_000x_path):
+        raise Exception(f"Migration file {migration_000x_path!r} already exists.")
+    operations = generator.write_migration_to_disk(
+        path=migration_000x_path, dependencies=dependencies, use_black=use_black
+    )
+    if operations:
+        print(f"Created migration '{name}'")
+    else:
+        print(f"Created migration '{name}' (no changes detected)")
+
+    # Cache the state after the new migration, so that the next
+    # make_migration does not have to replay it.
+    graph = load_migrations(set(), dir_name=dir)
+    apply_operations(from_state["metadata"], operations)
+    state_hash = compute_state_hashes(graph)[name]
+    write_snapshot(dir, state_hash, from_state["metadata"])
+    return bool(operations)
+
+
+async def squash(
+    start: str, end: str, dir: str = "migrations", use_black: bool = False
+):
+    """
+    Write a migration that replaces the migrations from `start` to `end`.
+
+    A range that starts at the root of the history, and only changes the
+    schema, is squashed into a migration that creates each resulting table
+    once. Ranges that depend on earlier migrations, or that include
+    `RunSQL` or `Backfill`, keep their operations in order instead. Ranges
+    with custom `upgrade()` or `downgrade()` code cannot be squashed.
+    """
+    from .generators.squash import SquashGenerator
+
+    graph = load_migrations(set(), dir_name=dir)
+    start_name = _match_migration(graph, start)
+    end_name = _match_migration(graph, end)
+    if graph.index[start_name] > graph.index[end_name]:
+        raise Exception(f"Migration {start_name!r} comes after {end_name!r}.")
+
+    names = graph.order[graph.index[start_name] : graph.index[end_name] + 1]
+    members = set(names)
+    for name in names:
+        if graph[name].replaces:
+            raise Exception(
+                f"Cannot squash {name!r}, since it is itself a squashed migration. "
+                "Once every database has applied it, remove its 'replaces' "
+                "list and the migrations it replaced, then squash again."
+            )
+
+    # Dependencies on migrations outside the squashed range are kept.
+    dependencies = []
+    for name in names:
+        for dependency in graph.dependencies[name]:
+            if dependency not in members and dependency not in dependencies:
+                dependencies.append(dependency)
+
+    # If a migration outside the range sits between two migrations inside it,
+    # then collapsing the range into one node would introduce a cycle.
+    contracted = {}
+    for name in graph.order:
+        if name in members:
+            continue
+        parents = graph.dependencies[name]
+        if any(parent in members for parent in parents):
+            parents = [parent for parent in parents if parent not in members]
+            parents.append(start_name)
+        contracted[name] = parents
+    contracted[start_name] = dependencies
+    MigrationGraph(contracted)
+
+    operations = []
+    for name in names:
+        migration = graph[name].load()
+        if migration.has_custom_code:
+            raise Exception(
+                f"Cannot squash {name!r}, since it overrides upgrade() or downgrade()."
+            )
+        operations.extend(migration.operations)
+
+    prefix = start_name.split("_")[0]
+    squashed_name = f"{prefix}_squashed_{end_name}"
+    generator = SquashGenerator(
+        dependencies=dependencies, replaces=names, operations=operations
+    )
+    generator.write_migration_to_disk(
+        path=os.path.join(dir, f"{squashed_name}.py"), use_black=use_black
+    )
+    print(f"Created migration {squashed_name!r}, replacing {len(names)} migrations")
 
-    print("list dir", os.listdir(dir))
-    migrations = load_migrations(applied, dir_name="migrations")
-    dependencies = [migration.name for migration in migrations if migration.is_leaf]
-    final_name = dependencies[-1]
-    index = int(final_name.split("_")[0]) + 1
 
-    migration_000x_path = os.path.join(dir, f"{index:04}_auto.py")
-    generator = EmptyGenerator()
+async def list_migrations(url: str, dir: str = "migrations"):
+    async with Database(url) as database:
+        return await list_database_migrations(database, dir=dir)
+
+
+async def list_database_migrations(
+    database: Database, dir: str = "migrations", entries: dict = None
+):
+    """
+    As `list_migrations()`, but against an existing database connection,
+    optionally using manifest entries that have already been loaded.
+    """
+    applied = await db_load_migrations_table(database)
+    return list(load_migrations(applied, dir_name=dir, entries=entries))
+
+
+async def migration_timings(url: str, dir: str = "migrations") -> List[dict]:
+    """
+    Return a report of every migration, in order, with the time it took to
+    apply and the number of statements it ran, as recorded when it was
+    applied. `modified` is set if the migration file has changed since.
+    """
+    async with Database(url) as database:
+        details = await db_load_migration_details(database)
+    graph = load_migrations(set(details), dir_name=dir)
+
+    report = []
+    for migration in graph:
+        recorded = details.get(migration.name, {})
+        applied_at = recorded.get("applied_at")
+        checksum = recorded.get("checksum")
+        report.append(
+            {
+                "name": migration.name,
+                "applied": migration.is_applied,
+                "applied_at": None if applied_at is None else str(applied_at),
+                "duration": recorded.get("duration"),
+                "statements": recorded.get("statements"),
+                "checksum": checksum,
+                "modified": checksum is not None and checksum != migration.hash,
+            }
+        )
+    return report
 
-    generator.write_migration_to_disk(
-        path=migration_000x_path, dependencies=dependencies
-    )
-    print(f"Created migration '{index:04}_auto'")
 
+async def check(url: str, dir: str = "migrations") -> bool:
+    """
+    Return `True` if every migration on disk has been applied to the database.
 
-async def list_migrations(url: str):
+    This compares the names on disk against a fingerprint stored in the
+    database, in a single query, and without importing any migration modules.
+    Only if the fingerprint does not match do we load the applied names, to
+    allow for databases part way through a squashed migration.
+    """
+    async with Database(url) as database:
+        return await check_database(database, dir=dir)
+
+
+async def check_database(
+    database: Database, dir: str = "migrations", entries: dict = None
+) -> bool:
+    """
+    As `check()`, but against an existing database connection, optionally
+    using manifest entries that have already been loaded.
+    """
+    if entries is None:
+        entries = load_manifest(dir)
+    if await _fingerprint_matches(database, entries):
+        return True
+
+    applied = await db_load_migrations_table(database)
+    graph = load_migrations(applied, dir_name=dir, entries=entries)
+    return all(migration.is_applied for migration in graph)
+
+
+async def migration_plan(
+    url: str, target: str = None, dir: str = "migrations"
+) -> Tuple[list, list]:
+    """
+    Return the migrations that `migrate()` would unapply, and then apply,
+    to bring the database to `target`, without running them.
+    """
     async with Database(url) as database:
         applied = await db_load_migrations_table(database)
+    graph = load_migrations(applied, dir_name=dir)
+    return plan_migrations(graph, target)
+
+
+async def migrate(
+    url: str,
+    target: str = None,
+    dir: str = "migrations",
+    batch: bool = False,
+    instruments: Sequence[Instrument] = (),
+    migration_lock_timeout: Optional[float] = 60.0,
+    atomicity: str = "all",
+    parallel: int = 1,
+    timeouts: Optional[Timeouts] = None,
+    release: bool = False,
+):
+    async with Database(url) as database:
+        await migrate_database(
+            database,
+            target=target,
+            dir=dir,
+            batch=batch,
+            instruments=instruments,
+            migration_lock_timeout=migration_lock_timeout,
+            atomicity=atomicity,
+            parallel=parallel,
+            timeouts=timeouts,
+            release=release,
+        )
 
-    return load_migrations(applied, dir_name="migrations")
 
+async def migrate_iter(
+    url: str,
+    target: str = None,
+    dir: str = "migrations",
+    batch: bool = False,
+    instruments: Sequence[Instrument] = (),
+    migration_lock_timeout: Optional[float] = 60.0,
+    atomicity: str = "all",
+    parallel: int = 1,
+    timeouts: Optional[Timeouts] = None,
+    release: bool = False,
+) -> AsyncIterator[Event]:
+    """
+    As `migrate()`, but yields each `Event` as it happens, as described in
+    `savannah.instrumentation`:
+
+        async for event in savannah.migrate_iter(url):
+            ...
+
+    The migration runs in a task of its own, which queues events without
+    waiting for them to be read. Any exception it raises is raised once
+    the events before it have been yielded. Breaking out of the loop early
+    cancels the migration.
+    """
+    stream = EventStream()
+    task = asyncio.create_task(
+        migrate(
+            url,
+            target=target,
+            dir=dir,
+            batch=batch,
+            instruments=[*instruments, stream],
+            migration_lock_timeout=migration_lock_timeout,
+            atomicity=atomicity,
+            parallel=parallel,
+            timeouts=timeouts,
+            release=release,
+        )
+    )
+    async for event in stream.follow(task):
+        yield event
+
+
+async def migrate_database(
+    database: Database,
+    target: str = None,
+    dir: str = "migrations",
+    batch: bool = False,
+    entries: dict = None,
+    instruments: Sequence[Instrument] = (),
+    migration_lock_timeout: Optional[float] = 60.0,
+    atomicity: str = "all",
+    parallel: int = 1,
+    timeouts: Optional[Timeouts] = None,
+    release: bool = False,
+) -> int:
+    """
+    As `migrate()`, but against an existing database connection, optionally
+    using manifest entries that have already been loaded.
+
+    The migration lock is held while migrating, so that processes started
+    together take turns. Raises `LockTimeout` if it cannot be acquired within
+    `migration_lock_timeout` seconds.
+
+    `atomicity` is one of "all", "per-migration" or "none", as described
+    for `run_migrations()`. With either of the latter, a run that fails
+    part way can simply be re-run, and resumes from the first migration
+    that did not complete.
+
+    With `parallel` greater than one, migrations on independent branches
+    are applied up to `parallel` at a time, as for `run_migrations()`.
+
+    `timeouts` limits how long each migration may wait for locks on the
+    tables it changes, and how often it is retried when a lock times out,
+    as described in `savannah.timeouts`.
+
+    With `release`, the migration modules are unloaded once they have run,
+    so that a long-running process does not keep them in memory.
+
+    Returns the number of migrations that were applied or unapplied.
+    Timing events are reported to each of the `instruments`, including the
+    plan, and the time spent waiting for the lock.
+    """
+    if entries is None:
+        entries = load_manifest(dir)
+    instrumented = InstrumentedDatabase(database, instruments)
+
+    # When migrating to the latest migration, a database that is already up
+    # to date is spotted with a single query, without taking the lock.
+    if target is None and await _fingerprint_matches(database, entries):
+        instrumented.emit(_plan_event(target, [], []))
+        return 0
+
+    async with migration_lock(database, timeout=migration_lock_timeout) as lock:
+        instrumented.emit(
+            Event("lock", "end", "migration", time.monotonic(), duration=lock.waited)
+        )
+        # If we had to wait, another process was migrating, and has most
+        # likely done the work already.
+        if lock.did_wait and target is None:
+            if await _fingerprint_matches(database, entries):
+                instrumented.emit(_plan_event(target, [], []))
+                return 0
 
-async def migrate(url: str, target: str = None):
-    async with Database(url) as database:
         await db_create_migrations_table_if_not_exists(database)
         applied_migrations = await db_load_migrations_table(database)
 
-        #  Load the migrations from disk.
-        migrations = load_migrations(applied_migrations, dir_name="migrations")
-
-        # Determine which migration we are targeting.
-        if target is None:
-            index = len(migrations) + 1
-        elif target.lower() == "zero":
-            index = 0
-        else:
-            candidates = [
-                (index, migration)
-                for index, migration in enumerate(migrations, 1)
-                if migration.name.startswith(target)
-            ]
-            if len(candidates) > 1:
-                raise Exception(
-                    f"Target {target!r} matched more than one migration name."
-                )
-            elif len(candidates) == 0:
-                raise Exception(f"Target {target!r} does not match any migrations.")
-            index, migration = candidates[0]
-
-        has_downgrades = any(migration.is_applied for migration in migrations[index:])
-        has_upgrades = any(not migration.is_applied for migration in migrations[:index])
-        if not has_downgrades and not has_upgrades:
-            print("No migrations required.")
-            return
+        #  Load the migrations from disk.
+        graph = load_migrations(applied_migrations, dir_name=dir, entries=entries)
+        downgrades, upgrades = plan_migrations(graph, target)
+        instrumented.emit(_plan_event(target, downgrades, upgrades))
+        if not downgrades and not upgrades:
+            # Databases migrated before fingerprints were kept have none, so
+            # store it now, for `check()` and the next `migrate()` to use.
+            fingerprint = (
+                migrations_digest(applied_migrations),
+                len(applied_migrations),
+            )
+            if await db_load_fingerprint(database) != fingerprint:
+                await db_save_fingerprint(database)
+            return 0
 
         # Apply or unapply migrations.
-        async with database.transaction():
-            # Unapply migrations.
-            if has_downgrades:
-                for migration in reversed(migrations[index:]):
-                    if not (migration.is_applied):
-                        continue
-                    await migration.downgrade()
-                    await db_unapply_migration(database, migration.name)
-
-            # Apply migrations.
-            if has_upgrades:
-                for migration in migrations[:index]:
-                    if migration.is_applied:
-                        continue
-                    await migration.upgrade()
-                    await db_apply_migration(database, migration.name)
+        await run_migrations(
+            database,
+            downgrades,
+            upgrades,
+            batch=batch,
+            instruments=instruments,
+            atomicity=atomicity,
+            parallel=parallel,
+            timeouts=timeouts,
+            release=release,
+        )
+        return len(downgrades) + len(upgrades)
 
 
-async def create_database(url: str, encoding: str = "utf8") -> None:
-    url = DatabaseURL(url)
-    database_name = url.database
+def _plan_event(target: Optional[str], downgrades: list, upgrades: list) -> Event:
+    details = {
+        "downgrades": [migration.name for migration in downgrades],
+        "upgrades": [migration.name for migration in upgrades],
+    }
+    return Event("plan", "end", target or "", time.monotonic(), details=details)
+
+
+async def _fingerprint_matches(database: Database, entries: dict) -> bool:
+    names = set(entries)
+    for entry in entries.values():
+        names.update(entry.replaces)
+    fingerprint = await db_load_fingerprint(database)
+    return fingerprint == (migrations_digest(names), len(names))
+
+
+async def diff(url: str, dir: str = "migrations") -> list:
+    """
+    Compare the schema of the database with the configured metadata, and
+    return the operations that would bring the database in line with it.
+    Changes made to the database outside of migrations show up here.
+    """
+    from .config import load_config
+    from .introspect import DatabaseAutodetector, load_database_schema
+
+    metadata = load_config(dir).get_current_state()["metadata"]
+    async with Database(url) as database:
+        schema = await load_database_schema(database)
+    return DatabaseAutodetector(schema, metadata, _get_dialect(url)).detect()
+
+
+def migrate_sql(
+    url: str,
+    target: str = None,
+    dir: str = "migrations",
+    start: str = None,
+    atomicity: str = "all",
+) -> Iterator[str]:
+    """
+    As `migrate()`, but instead of connecting to the database, yield the
+    SQL script that would bring it to `target`, compiled for the dialect
+    of `url`.
+
+    The database is assumed to have the migrations up to and including
+    `start` applied, or none at all if `start` is not given.
+    """
+    from .offline import generate_script
+
+    graph = load_migrations(set(), dir_name=dir)
+    if start is None or start.lower() == "zero":
+        applied = set()
+    else:
+        name = _match_migration(graph, start)
+        applied = {name, *graph.ancestors(name)}
+        for record in graph:
+            if record.name in applied:
+                applied.update(record.replaces)
+        graph = load_migrations(applied, dir_name=dir)
+
+    downgrades, upgrades = plan_migrations(graph, target)
+    return generate_script(
+        _get_dialect(url),
+        downgrades,
+        upgrades,
+        create_migrations_table=not applied,
+        atomicity=atomicity,
+    )
 
+
+def plan_migrations(graph: MigrationGraph, target: str = None) -> Tuple[list, list]:
+    """
+    Return the migrations to unapply, and then the migrations to apply,
+    in order to bring the database to `target`.
+
+    Only the target and its ancestors are applied, and only its descendants
+    are unapplied. Migrations on other branches are left as they are.
+    """
+    if target is None:
+        downgrades = []
+        upgrades = [migration for migration in graph if not migration.is_applied]
+        return downgrades, upgrades
+    elif target.lower() == "zero":
+        keep = set()
+        remove = set(graph.order)
+    else:
+        name = _match_migration(graph, target)
+        keep = graph.ancestors(name) | {name}
+        remove = graph.descendants(name)
+
+    downgrades = [
+        graph[name]
+        for name in reversed(graph.order)
+        if name in remove and graph[name].is_applied
+    ]
+    upgrades = [
+        graph[name]
+        for name in graph.order
+        if name in keep and not graph[name].is_applied
+    ]
+    return downgrades, upgrades
+
+
+def _match_migration(graph: MigrationGraph, target: str) -> str:
+    candidates = graph.match(target)
+    if len(candidates) > 1:
+        raise Exception(f"Target {target!r} matched more than one migration name.")
+    elif len(candidates) == 0:
+        raise Exception(f"Target {target!r} does not match any migrations.")
+    return candidates[0]
+
+
+def _server_url(url: DatabaseURL) -> DatabaseURL:
+    """
+    The URL to connect to in order to create or drop the database at `url`.
+    """
     if url.dialect in ("postgres", "postgresql"):
-        url = url.replace(database="postgres")
+        return url.replace(database="postgres")
     elif url.dialect == "mysql":
-        url = url.replace(database="")
+        return url.replace(database="")
+    return url
+
+
+async def create_database(url: str, encoding: str = "utf8") -> None:
+    url = DatabaseURL(url)
+    database_name = url.database
+    url = _server_url(url)
 
     if url.dialect in ("postgres", "postgresql"):
         statement = "CREATE DATABASE {0} ENCODING '{1}' TEMPLATE template1".format(
@@ -144,11 +599,7 @@ async def create_database(url: str, encoding: str = "utf8") -> None:
 async def drop_database(url: str) -> None:
     url = DatabaseURL(url)
     database_name = url.database
-
-    if url.dialect in ("postgres", "postgresql"):
-        url = url.replace(database="postgres")
-    elif url.dialect == "mysql":
-        url = url.replace(database="")
+    url = _server_url(url)
 
     if url.dialect == "sqlite":
         if database_name and database_name != ":memory:":
@@ -165,11 +616,7 @@ async def drop_database(url: str) -> None:
 async def database_exists(url: str) -> bool:
     url = DatabaseURL(url)
     database_name = url.database
-
-    if url.dialect in ("postgres", "postgresql"):
-        url = url.replace(database="postgres")
-    elif url.dialect == "mysql":
-        url = url.replace(database="")
+    url = _server_url(url)
 
     if url.dialect in ("postgres", "postgresql"):
         statement = "SELECT 1 FROM pg_database WHERE datname='%s'" % database_name
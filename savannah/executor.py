@@ -0,0 +1,304 @@
+"""
+This module runs a sequence of migrations against a database, either one
+statement at a time, or in batched mode, where the statements for the whole
+run are compiled up front and sent in as few round trips as possible.
+
+By default the whole run shares a transaction, which is split at any
+migration that cannot run inside one, such as those that build indexes
+concurrently. The run can instead commit after each migration, or run with
+no transactions at all. In either case each migration's bookkeeping is
+recorded as soon as it completes, so that a failed run resumes from the
+first migration that did not complete.
+
+Migrations on independent branches may also be applied in parallel, as
+described in `savannah.parallel`.
+
+Each migration is timed, and its duration and statement count are recorded
+in the migrations table. In batched mode, migrations that are compiled up
+front share their round trips, so only their statement counts are recorded.
+
+Limits on how long migrations wait for locks may be given as `Timeouts`,
+described in `savannah.timeouts`. Migrations whose locks time out are
+retried, except in batched mode, where the limits apply to the batch as a
+whole, and migrations that set limits of their own run in place.
+"""
+from typing import List, Optional, Sequence, Tuple
+import contextlib
+import time
+from databases import Database
+from .instrumentation import Event, Instrument, InstrumentedDatabase, span
+from .operations.rebuild_table import requires_rebuild
+from .tables import (
+    _get_dialect,
+    db_apply_migration,
+    db_apply_migrations,
+    db_save_fingerprint,
+    db_unapply_migration,
+    db_unapply_migrations,
+)
+from .timeouts import Timeouts, run_with_timeouts
+
+ATOMICITY_MODES = ("all", "per-migration", "none")
+
+
+async def run_migrations(
+    database: Database,
+    downgrades: list,
+    upgrades: list,
+    batch: bool = False,
+    instruments: Sequence[Instrument] = (),
+    atomicity: str = "all",
+    parallel: int = 1,
+    timeouts: Optional[Timeouts] = None,
+    release: bool = False,
+) -> None:
+    """
+    Unapply the `downgrades` migrations, and then apply the `upgrades`
+    migrations, in the order given.
+
+    With `atomicity="all"`, consecutive atomic migrations run together
+    inside a transaction. Non-atomic migrations split the run: the preceding
+    transaction is committed, and the migration runs on its own, outside of
+    a transaction, with its bookkeeping recorded as soon as it completes.
+
+    With `atomicity="per-migration"`, each atomic migration runs in a
+    transaction of its own, together with its bookkeeping. With
+    `atomicity="none"`, no transactions are used.
+
+    With `parallel` greater than one, the `downgrades` are unapplied as
+    usual, and then up to `parallel` of the `upgrades` are applied at once,
+    each with its own transaction and connection. That cannot be combined
+    with `batch`, or with `atomicity="all"`.
+
+    `timeouts` limits how long each migration waits for locks, and how
+    many times it is attempted. Batched runs are attempted once.
+
+    With `release`, the migration modules are unloaded once the run ends,
+    rather than kept in memory for the life of a long-running process.
+
+    Timing events are reported to each of the `instruments`.
+    """
+    timeouts = Timeouts() if timeouts is None else timeouts
+    if batch and timeouts.attempts > 1:
+        raise Exception("Batched migrations cannot be retried after lock timeouts.")
+    if parallel > 1:
+        if batch:
+            raise Exception("Batched migrations cannot be applied in parallel.")
+        if atomicity == "all":
+            raise Exception(
+                "Migrations applied in parallel cannot share a transaction. "
+                "Use atomicity 'per-migration' or 'none'."
+            )
+
+    instrumented = InstrumentedDatabase(database, instruments)
+    steps = [(migration, False) for migration in downgrades]
+    if parallel <= 1:
+        steps.extend((migration, True) for migration in upgrades)
+    run_segment = _run_batched if batch else _run_sequential
+
+    try:
+        for atomic, segment in split_segments(steps, atomicity):
+            if atomic:
+                async with instrumented.transaction():
+                    await run_segment(instrumented, segment, timeouts, atomic)
+            else:
+                await run_segment(instrumented, segment, timeouts, atomic)
+        if parallel > 1 and upgrades:
+            # The parallel module builds on this one.
+            from .parallel import apply_parallel
+
+            await apply_parallel(
+                database,
+                upgrades,
+                parallel,
+                instruments=instruments,
+                atomicity=atomicity,
+                timeouts=timeouts,
+            )
+    except BaseException:
+        # Migrations before the failure may have been committed, so bring
+        # the fingerprint up to date with them, if the database allows.
+        if atomicity != "all":
+            with contextlib.suppress(Exception):
+                await db_save_fingerprint(instrumented)
+        raise
+    finally:
+        if release:
+            for migration in (*downgrades, *upgrades):
+                migration.release()
+
+    await db_save_fingerprint(instrumented)
+
+
+def split_segments(steps: list, atomicity: str = "all") -> List[Tuple[bool, list]]:
+    """
+    Split a list of `(migration, forwards)` steps into the segments that run
+    together, each marked with whether it runs inside a transaction.
+
+    With `atomicity="all"` that is runs of atomic migrations, with each
+    non-atomic migration in a segment of its own. Otherwise every migration
+    is in a segment of its own.
+    """
+    if atomicity not in ATOMICITY_MODES:
+        modes = ", ".join(repr(mode) for mode in ATOMICITY_MODES)
+        raise Exception(f"Unknown atomicity {atomicity!r}, expected one of {modes}.")
+
+    segments = []
+    for migration, forwards in steps:
+        atomic = atomicity != "none" and migration.load().is_atomic
+        if atomicity == "all" and atomic and segments and segments[-1][0]:
+            segments[-1][1].append((migration, forwards))
+        else:
+            segments.append((atomic, [(migration, forwards)]))
+    return segments
+
+
+async def _run_sequential(
+    database: InstrumentedDatabase,
+    steps: list,
+    timeouts: Timeouts,
+    transactional: bool,
+):
+    for migration, forwards in steps:
+        limits = timeouts.for_migration(migration.load())
+        run = migration.upgrade if forwards else migration.downgrade
+        async with database.span("migration", migration.name) as timing:
+            await run_with_timeouts(
+                database, limits, timing, lambda: run(database), transactional
+            )
+
+        if forwards:
+            await db_apply_migration(
+                database,
+                migration.name,
+                duration=timing.duration,
+                statements=timing.statements,
+                checksum=migration.hash,
+            )
+            # Record the replaced migrations too, so that the database
+            # stays consistent if the squashed migration is removed.
+            for name in migration.replaces:
+                await db_apply_migration(database, name)
+        else:
+            await db_unapply_migration(database, migration.name)
+            for name in migration.replaces:
+                await db_unapply_migration(database, name)
+
+
+async def _run_batched(
+    database: InstrumentedDatabase,
+    steps: list,
+    timeouts: Timeouts,
+    transactional: bool,
+):
+    dialect = _get_dialect(str(database.url))
+    batch = StatementBatch(database)
+    batch.extend(timeouts.set_statements(dialect.name))
+
+    unapplied = []
+    applied = []
+    details = {}
+    for migration, forwards in steps:
+        instance = migration.load()
+        names = [migration.name, *migration.replaces]
+        limits = timeouts.for_migration(instance)
+        has_limits = limits is not timeouts
+        if (
+            instance.has_custom_code
+            or not instance.is_atomic
+            or requires_rebuild(instance.operations, dialect)
+            or has_limits
+        ):
+            # Arbitrary code, non-atomic operations, table rebuilds, which
+            # read the table's definition first, and migrations with limits
+            # of their own, run in place.
+            await batch.flush()
+            await _flush_bookkeeping(database, unapplied, applied, details)
+            # The run's own limits are already in place, and are set again
+            # after a migration with limits of its own resets them.
+            limits = limits if has_limits else Timeouts()
+            run = migration.upgrade if forwards else migration.downgrade
+            async with database.span("migration", migration.name) as timing:
+                await run_with_timeouts(
+                    database, limits, timing, lambda: run(database), transactional
+                )
+            if has_limits:
+                batch.extend(timeouts.set_statements(dialect.name))
+            details[migration.name] = {
+                "duration": timing.duration,
+                "statements": timing.statements,
+            }
+        elif forwards:
+            statements = instance.upgrade_statements(dialect)
+            batch.extend(statements)
+            details[migration.name] = {"statements": len(statements)}
+            database.emit(_batched_event(migration.name, statements))
+        else:
+            statements = instance.downgrade_statements(dialect)
+            batch.extend(statements)
+            database.emit(_batched_event(migration.name, statements))
+
+        if forwards:
+            details[migration.name]["checksum"] = migration.hash
+            applied.extend(names)
+        else:
+            unapplied.extend(names)
+
+    batch.extend(timeouts.reset_statements(dialect.name))
+    await batch.flush()
+    await _flush_bookkeeping(database, unapplied, applied, details)
+
+
+async def _flush_bookkeeping(
+    database: Database, unapplied: list, applied: list, details: dict
+):
+    await db_unapply_migrations(database, unapplied)
+    await db_apply_migrations(database, applied, details)
+    unapplied.clear()
+    applied.clear()
+    details.clear()
+
+
+def _batched_event(name: str, statements: List[str]) -> Event:
+    return Event(
+        "migration", "batched", name, time.monotonic(), statements=len(statements)
+    )
+
+
+class StatementBatch:
+    """
+    Collects statements, and sends them to the database together when flushed.
+
+    Drivers that accept several statements in a single call (asyncpg, when
+    no query arguments are given) get the whole batch in one round trip.
+    Other drivers get one call per statement.
+    """
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+        self.statements: List[str] = []
+
+    def extend(self, statements: List[str]) -> None:
+        self.statements.extend(statements)
+
+    async def flush(self) -> None:
+        statements, self.statements = self.statements, []
+        if not statements:
+            return
+
+        if supports_multiple_statements(self.database) and len(statements) > 1:
+            script = ";\n".join(
+                statement.strip().rstrip(";") for statement in statements
+            )
+            async with span(self.database, "batch", f"{len(statements)} statements"):
+                # Outside a transaction, the connection is only acquired here.
+                async with self.database.connection() as connection:
+                    await connection.raw_connection.execute(script)
+        else:
+            for statement in statements:
+                await self.database.execute(statement)
+
+
+def supports_multiple_statements(database: Database) -> bool:
+    url = database.url
+    return url.dialect in ("postgres", "postgresql") and url.driver in ("", "asyncpg")
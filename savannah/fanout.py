@@ -0,0 +1,159 @@
+"""
+This module runs commands against many databases at once, such as when
+each tenant has a database of its own.
+
+The migration manifest is loaded from disk once, and the per-database work
+runs concurrently on a single event loop, with a limit on how many databases
+are being worked on at any one time.
+"""
+from typing import Any, Callable, Iterable, List, Optional
+from importlib import import_module
+import asyncio
+import glob as globlib
+import sys
+import time
+from databases import Database, DatabaseURL
+from .commands import list_database_migrations, migrate_database
+from .loader import unload_module
+from .manifest import load_manifest
+from .timeouts import Timeouts
+
+
+class FanoutResult:
+    def __init__(
+        self,
+        url: str,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+        duration: float = 0.0,
+    ) -> None:
+        self.url = url
+        self.result = result
+        self.error = error
+        self.duration = duration
+
+    @property
+    def is_success(self) -> bool:
+        return self.error is None
+
+
+def load_database_urls(
+    file: str = None, glob: str = None, factory: str = None
+) -> List[str]:
+    """
+    Collect database URLs from any of:
+
+    * `file` - A text file with one URL per line. Blank lines and lines
+      starting with '#' are ignored.
+    * `glob` - A pattern matching SQLite database files.
+    * `factory` - A "module:attribute" string, naming a function that
+      returns an iterable of URLs.
+    """
+    urls = []
+    if file is not None:
+        with open(file, "r") as fin:
+            for line in fin:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    urls.append(line)
+    if glob is not None:
+        for path in sorted(globlib.glob(glob)):
+            urls.append(f"sqlite:///{path}")
+    if factory is not None:
+        if "." not in sys.path:
+            sys.path.insert(0, ".")
+        module_str, _, attr_str = factory.partition(":")
+        function = getattr(import_module(module_str), attr_str)
+        urls.extend(function())
+
+    # Preserve the order, but only visit each database once.
+    return list(dict.fromkeys(urls))
+
+
+async def fan_out(
+    urls: Iterable[str],
+    function: Callable,
+    concurrency: int = 10,
+    pool_size: int = 2,
+) -> List[FanoutResult]:
+    """
+    Call `await function(database)` for each database URL, with at most
+    `concurrency` databases in flight at once. Each database gets a single
+    connection pool of at most `pool_size` connections, which is shared by
+    all of the work against that database.
+
+    Failures are captured in the results, rather than cancelling the
+    other databases.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(url: str) -> FanoutResult:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                database = Database(url, **_pool_options(url, pool_size))
+                async with database:
+                    result = await function(database)
+            except Exception as exc:
+                return FanoutResult(url, error=exc, duration=time.monotonic() - started)
+            return FanoutResult(url, result=result, duration=time.monotonic() - started)
+
+    return await asyncio.gather(*[run(url) for url in urls])
+
+
+async def migrate_many(
+    urls: Iterable[str],
+    target: str = None,
+    dir: str = "migrations",
+    batch: bool = False,
+    concurrency: int = 10,
+    migration_lock_timeout: Optional[float] = 60.0,
+    atomicity: str = "all",
+    parallel: int = 1,
+    timeouts: Optional[Timeouts] = None,
+    release: bool = False,
+) -> List[FanoutResult]:
+    """
+    Migrate each of the databases, as for `migrate()`. The migration modules
+    are imported once, and shared by every database. With `release`, they
+    are unloaded after the last database has been migrated.
+    """
+    entries = load_manifest(dir)
+
+    async def function(database: Database) -> int:
+        return await migrate_database(
+            database,
+            target=target,
+            dir=dir,
+            batch=batch,
+            entries=entries,
+            migration_lock_timeout=migration_lock_timeout,
+            atomicity=atomicity,
+            parallel=parallel,
+            timeouts=timeouts,
+        )
+
+    try:
+        return await fan_out(urls, function, concurrency=concurrency)
+    finally:
+        if release:
+            for name in entries:
+                unload_module(f"{dir}.{name}")
+
+
+async def list_migrations_many(
+    urls: Iterable[str], dir: str = "migrations", concurrency: int = 10
+) -> List[FanoutResult]:
+    entries = load_manifest(dir)
+
+    async def function(database: Database) -> list:
+        return await list_database_migrations(database, dir=dir, entries=entries)
+
+    return await fan_out(urls, function, concurrency=concurrency)
+
+
+def _pool_options(url: str, pool_size: int) -> dict:
+    # SQLite connections are not pooled, so the options do not apply there.
+    if DatabaseURL(url).dialect == "sqlite":
+        return {}
+    return {"min_size": 1, "max_size": pool_size}
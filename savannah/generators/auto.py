@@ -0,0 +1,26 @@
+from ..autodetect import Autodetector
+from .format import format_file
+from .writer import write_migration
+
+
+class AutoGenerator:
+    def __init__(self, from_state: dict, to_state: dict):
+        self.from_state = from_state
+        self.to_state = to_state
+        self.autodetector = Autodetector(from_state["metadata"], to_state["metadata"])
+
+    def has_changes(self) -> bool:
+        return self.autodetector.has_changes()
+
+    def generate(self):
+        return self.autodetector.detect()
+
+    def write_migration_to_disk(
+        self, path: str, dependencies: list, use_black: bool = False
+    ) -> list:
+        operations = self.generate()
+        with open(path, "w") as fout:
+            write_migration(fout, operations, dependencies=dependencies)
+        if use_black:
+            format_file(path)
+        return operations
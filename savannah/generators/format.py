@@ -0,0 +1,26 @@
+def format_source(text: str) -> str:
+    """
+    Format generated migration source with black.
+
+    black is slow to import, and only needed when asked for, so it is
+    imported here rather than at the top of the module.
+    """
+    import black
+
+    return black.format_file_contents(text, fast=True, mode=black.FileMode())
+
+
+def format_file(path: str) -> None:
+    """
+    Reformat a migration file in place with black.
+    """
+    import black
+
+    with open(path, "r") as fin:
+        text = fin.read()
+    try:
+        text = format_source(text)
+    except black.NothingChanged:
+        return
+    with open(path, "w") as fout:
+        fout.write(text)
@@ -1,5 +1,6 @@
-from ..operations.create_table import CreateTable
-import black
+from ..autodetect import Autodetector
+from .format import format_file
+from .writer import write_migration
 
 
 class InitialGenerator:
@@ -8,26 +9,15 @@ class InitialGenerator:
         self.to_state = to_state
 
     def generate(self):
-        operations = []
-        tables = self.to_state["metadata"].tables.values()
-        for table in tables:
-            operation = CreateTable(
-                table.name, columns=[c.copy() for c in table.columns]
-            )
-            operations.append(operation)
-        return operations
+        # Every table is new, so the autodetector creates each one, with its
+        # constraints and indexes, in the order of their foreign keys.
+        autodetector = Autodetector(
+            self.from_state["metadata"], self.to_state["metadata"]
+        )
+        return autodetector.detect()
 
-    def write_migration_to_disk(self, path: str) -> None:
-        operations = self.generate()
-        text = f"""\
-import savannah
-import sqlalchemy
-
-
-class Migration(savannah.Migration):
-    dependencies = []
-    operations = {operations!r}
-"""
-        text = black.format_file_contents(text, fast=False, mode=black.FileMode())
+    def write_migration_to_disk(self, path: str, use_black: bool = False) -> None:
         with open(path, "w") as fout:
-            fout.write(text)
+            write_migration(fout, self.generate())
+        if use_black:
+            format_file(path)
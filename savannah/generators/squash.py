@@ -0,0 +1,78 @@
+"""
+Squashed migrations are written in one of two ways.
+
+If the range starts at the root of the history, and only changes the schema,
+the operations are folded into the schema that they leave behind, and the
+squashed migration creates each resulting table once, with its constraints
+and indexes. Setting up a new database then takes as many statements as the
+schema has tables and indexes, however long the history.
+
+Otherwise the operations are kept as they are, one after another, since the
+schema before the range is not known, or because operations such as `RunSQL`
+and `Backfill` act on data that cannot be folded.
+"""
+from typing import List
+import sqlalchemy
+from ..autodetect import Autodetector
+from ..operations.add_column import AddColumn
+from ..operations.add_constraint import AddConstraint
+from ..operations.alter_column import AlterColumn
+from ..operations.create_index import CreateIndex
+from ..operations.create_table import CreateTable
+from ..operations.drop_column import DropColumn
+from ..operations.drop_constraint import DropConstraint
+from ..operations.drop_table import DropTable
+from ..operations.rebuild_table import RebuildTable
+from .format import format_file
+from .writer import write_migration
+
+# Operations that only change the schema, which can be folded together.
+SCHEMA_OPERATIONS = (
+    AddColumn,
+    AddConstraint,
+    AlterColumn,
+    CreateIndex,
+    CreateTable,
+    DropColumn,
+    DropConstraint,
+    DropTable,
+    RebuildTable,
+)
+
+
+def can_fold(operations: list) -> bool:
+    return all(isinstance(operation, SCHEMA_OPERATIONS) for operation in operations)
+
+
+def fold_operations(operations: list) -> List:
+    """
+    Return the operations that create, on an empty database, the schema that
+    the given operations leave behind.
+    """
+    metadata = sqlalchemy.MetaData()
+    for operation in operations:
+        operation.state_forwards(metadata)
+    return Autodetector(sqlalchemy.MetaData(), metadata).detect()
+
+
+class SquashGenerator:
+    def __init__(self, dependencies: list, replaces: list, operations: list):
+        self.dependencies = dependencies
+        self.replaces = replaces
+        self.operations = operations
+
+    def generate(self) -> list:
+        if not self.dependencies and can_fold(self.operations):
+            return fold_operations(self.operations)
+        return self.operations
+
+    def write_migration_to_disk(self, path: str, use_black: bool = False) -> None:
+        with open(path, "w") as fout:
+            write_migration(
+                fout,
+                self.generate(),
+                dependencies=self.dependencies,
+                replaces=self.replaces,
+            )
+        if use_black:
+            format_file(path)
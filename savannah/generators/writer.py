@@ -0,0 +1,99 @@
+"""
+This module writes migration files.
+
+The source is laid out as it is written, one operation at a time, so that
+migrations with thousands of operations are neither built up as one string
+nor passed through a formatter. The layout follows black's: anything that
+fits within the line length goes on one line, otherwise the contents of its
+outermost brackets go on the lines between them, either together, or one
+item per line with a trailing comma, as is always the case for lists and
+dicts of more than one item. The output is unchanged by black.
+"""
+from typing import IO, Iterable, List
+import itertools
+from ..operations.render import Bracket, Code, Keyword, code
+
+LINE_LENGTH = 88
+INDENT = 4
+
+HEADER = """\
+import savannah
+import sqlalchemy
+
+
+class Migration(savannah.Migration):
+"""
+
+
+def layout(
+    item: Code, indent: int = 0, prefix: str = "", suffix: str = ""
+) -> List[str]:
+    """
+    Return the lines for `item`, starting at `indent` after `prefix`, and
+    followed by `suffix`.
+    """
+    line = f"{' ' * indent}{prefix}{item.source(double_quotes=True)}{suffix}"
+    if len(line) <= LINE_LENGTH:
+        return [line]
+    if isinstance(item, Keyword):
+        prefix += item.prefix(double_quotes=True)
+        return layout(item.value, indent, prefix, suffix)
+    if not isinstance(item, Bracket) or not item.items:
+        return [line]
+
+    head = f"{' ' * indent}{prefix}{item.opener}"
+    tail = f"{' ' * indent}{item.closer}{suffix}"
+    inner = indent + INDENT
+    body = item.body(double_quotes=True)
+    # Collections of more than one item are always split one per line, but
+    # the arguments to a call may share a line.
+    is_call = len(item.opener) > 1
+    has_commas = len(item.items) > 1 or item.is_tuple
+    if inner + len(body) <= LINE_LENGTH and (is_call or not has_commas):
+        return [head, f"{' ' * inner}{body}", tail]
+    if len(item.items) == 1 and not item.is_tuple:
+        return [head, *layout(item.items[0], inner), tail]
+
+    lines = [head]
+    for child in item.items:
+        lines.extend(layout(child, inner, suffix=","))
+    lines.append(tail)
+    return lines
+
+
+def write_migration(
+    fout: IO[str],
+    operations: Iterable,
+    dependencies: List[str] = (),
+    replaces: List[str] = None,
+) -> int:
+    """
+    Write a migration file with the given operations, which may be any
+    iterable, to `fout`. Returns the number of operations written.
+    """
+    fout.write(HEADER)
+    write_lines(fout, layout(code(list(dependencies)), INDENT, "dependencies = "))
+    if replaces is not None:
+        write_lines(fout, layout(code(list(replaces)), INDENT, "replaces = "))
+
+    # A short list of operations fits on a line, and a single operation has
+    # no trailing comma, so only longer lists can be written as they come.
+    operations = iter(operations)
+    first = list(itertools.islice(operations, 2))
+    if len(first) < 2:
+        rendered = [operation.render() for operation in first]
+        write_lines(fout, layout(code(rendered), INDENT, "operations = "))
+        return len(first)
+
+    count = 0
+    fout.write(f"{' ' * INDENT}operations = [\n")
+    for operation in itertools.chain(first, operations):
+        write_lines(fout, layout(operation.render(), INDENT * 2, suffix=","))
+        count += 1
+    fout.write(f"{' ' * INDENT}]\n")
+    return count
+
+
+def write_lines(fout: IO[str], lines: List[str]) -> None:
+    fout.write("\n".join(lines))
+    fout.write("\n")
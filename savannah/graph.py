@@ -0,0 +1,178 @@
+"""
+This module holds the migration graph, a directed acyclic graph of migration
+names, where each edge points from a migration to one of its dependencies.
+
+All the structural queries we need (topological ordering, roots, leaves,
+ancestors, descendants and name lookup) are answered from here, rather than
+being recomputed from dictionaries by each command.
+"""
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Tuple
+import bisect
+import heapq
+
+
+class MissingDependency(Exception):
+    def __init__(self, name: str, missing: List[str]) -> None:
+        self.name = name
+        self.missing = missing
+        names = ", ".join(repr(dependency) for dependency in missing)
+        super().__init__(f"Migration {name!r} depends on unknown migration(s) {names}.")
+
+
+class CircularDependency(Exception):
+    def __init__(self, cycle: List[str]) -> None:
+        self.cycle = cycle
+        path = " -> ".join(cycle)
+        super().__init__(f"Circular dependency between migrations: {path}")
+
+
+class MigrationGraph:
+    def __init__(
+        self,
+        dependencies: Mapping[str, Iterable[str]],
+        create_node: Callable[["MigrationGraph", str], object] = None,
+    ) -> None:
+        """
+        Build the graph from a mapping of migration name to the names it
+        depends on. If `create_node` is given, it is called once per
+        migration, in topological order, with the graph and the name, and
+        the results are returned when iterating over the graph.
+        """
+        self.dependencies: Dict[str, Tuple[str, ...]] = {
+            name: tuple(sorted(set(parents))) for name, parents in dependencies.items()
+        }
+
+        children: Dict[str, List[str]] = {name: [] for name in self.dependencies}
+        for name, parents in self.dependencies.items():
+            missing = [parent for parent in parents if parent not in children]
+            if missing:
+                raise MissingDependency(name, missing)
+            for parent in parents:
+                children[parent].append(name)
+        self.dependants: Dict[str, Tuple[str, ...]] = {
+            name: tuple(sorted(names)) for name, names in children.items()
+        }
+
+        self.order = self._sort()
+        self.index = {name: position for position, name in enumerate(self.order)}
+        self.roots = [name for name in self.order if not self.dependencies[name]]
+        self.leaves = [name for name in self.order if not self.dependants[name]]
+        self._roots = frozenset(self.roots)
+        self._leaves = frozenset(self.leaves)
+        self._sorted_names = sorted(self.order)
+        self._ancestors: Dict[str, FrozenSet[str]] = {}
+        self._descendants: Dict[str, FrozenSet[str]] = {}
+
+        if create_node is None:
+            self.nodes = {name: name for name in self.order}
+        else:
+            self.nodes = {name: create_node(self, name) for name in self.order}
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.nodes.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.nodes
+
+    def __getitem__(self, name: str):
+        return self.nodes[name]
+
+    def is_root(self, name: str) -> bool:
+        return name in self._roots
+
+    def is_leaf(self, name: str) -> bool:
+        return name in self._leaves
+
+    def indices(self, names: Iterable[str]) -> Tuple[int, ...]:
+        """
+        Return the positions of `names` in the topological order.
+        """
+        return tuple(self.index[name] for name in names)
+
+    def match(self, prefix: str) -> List[str]:
+        """
+        Return the names that start with `prefix`, or just the one name if
+        `prefix` is a complete name. This is a binary search over the sorted
+        names, rather than a scan of the whole history.
+        """
+        if prefix in self.nodes:
+            return [prefix]
+        names = self._sorted_names
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+    def ancestors(self, name: str) -> FrozenSet[str]:
+        """
+        Return the names of every migration that `name` transitively depends on.
+        """
+        if name not in self._ancestors:
+            self._ancestors[name] = self._walk(name, self.dependencies)
+        return self._ancestors[name]
+
+    def descendants(self, name: str) -> FrozenSet[str]:
+        """
+        Return the names of every migration that transitively depends on `name`.
+        """
+        if name not in self._descendants:
+            self._descendants[name] = self._walk(name, self.dependants)
+        return self._descendants[name]
+
+    def _walk(self, name: str, edges: Dict[str, Tuple[str, ...]]) -> FrozenSet[str]:
+        seen = set()
+        stack = list(edges[name])
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(edges[node])
+        return frozenset(seen)
+
+    def _sort(self) -> List[str]:
+        """
+        Kahn's algorithm, using a heap so that whenever more than one migration
+        is ready we always pick the lowest name. That gives a deterministic
+        ordering in O(E + V log V).
+        """
+        remaining = {name: len(parents) for name, parents in self.dependencies.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        heapq.heapify(ready)
+
+        ordered = []
+        while ready:
+            name = heapq.heappop(ready)
+            ordered.append(name)
+            for child in self.dependants[name]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    heapq.heappush(ready, child)
+
+        if len(ordered) != len(self.dependencies):
+            blocked = {name for name, count in remaining.items() if count}
+            raise CircularDependency(self._find_cycle(blocked))
+        return ordered
+
+    def _find_cycle(self, blocked: set) -> List[str]:
+        """
+        Given the set of names that could not be ordered, return one cycle
+        amongst them, as a path that starts and ends on the same name.
+        """
+        start = min(blocked)
+        path = [start]
+        position = {start: 0}
+        while True:
+            # Every blocked node has at least one blocked dependency,
+            # so following them must eventually revisit a node.
+            node = min(
+                parent for parent in self.dependencies[path[-1]] if parent in blocked
+            )
+            if node in position:
+                return path[position[node] :] + [node]
+            position[node] = len(path)
+            path.append(node)
@@ -0,0 +1,218 @@
+"""
+This module times migration runs.
+
+While migrating, the database is wrapped in an `InstrumentedDatabase`,
+which times each statement that passes through it. Migrations, operations
+and statements are each reported to any instruments as a pair of "start"
+and "end" events, with times taken from the monotonic clock.
+
+Row counts are reported where the driver makes them available, which is
+the number of rows returned by queries that fetch them. Statements that
+are sent through `execute()` report `None`.
+
+A few events mark a single point rather than a span. Once the migrations
+to run are known, a "plan" event gives their names in its `details`. Once
+the migration lock is held, a "lock" event gives the time spent waiting for
+it as its `duration`, and when a migration's lock times out, a "lock"
+event with the phase "timeout" gives the time the attempt took, and the
+pause before it is retried. Migrations that ran with lock timeouts report
+their time spent waiting for locks, and executing, in the `details` of
+their "end" event. In batched mode, migrations that are compiled up
+front report a "batched" event in place of their span.
+
+Instruments are called synchronously, as events happen. To consume events
+asynchronously instead, as `savannah.migrate_iter()` does, an `EventStream`
+collects them into a queue.
+"""
+from typing import Any, AsyncIterator, List, Optional, Sequence
+import asyncio
+import contextlib
+import time
+from databases import Database
+
+
+class Event:
+    def __init__(
+        self,
+        kind: str,
+        phase: str,
+        name: str,
+        time: float,
+        duration: float = None,
+        statements: int = None,
+        rows: int = None,
+        details: dict = None,
+    ) -> None:
+        self.kind = kind
+        self.phase = phase
+        self.name = name
+        self.time = time
+        self.duration = duration
+        self.statements = statements
+        self.rows = rows
+        self.details = {} if details is None else details
+
+    def __repr__(self) -> str:
+        return f"<Event {self.kind} {self.phase} {self.name!r}>"
+
+
+class Instrument:
+    """
+    The base class for instruments. Subclasses override `handle()`, which
+    is called with every event, in the order that they occur.
+    """
+
+    def handle(self, event: Event) -> None:
+        pass
+
+
+class EventStream(Instrument):
+    """
+    An instrument that queues every event, to be read back asynchronously
+    while the work that produces them runs in another task.
+    """
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def handle(self, event: Event) -> None:
+        self.queue.put_nowait(event)
+
+    async def follow(self, task: asyncio.Future) -> AsyncIterator[Event]:
+        """
+        Yield events as they arrive, until `task` is done, and then raise any
+        exception that it raised. The task is cancelled if iteration stops
+        early.
+        """
+        task.add_done_callback(lambda _: self.queue.put_nowait(None))
+        try:
+            while True:
+                event = await self.queue.get()
+                if event is None:
+                    break
+                yield event
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+
+class Span:
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind = kind
+        self.name = name
+        self.started: float = 0.0
+        self.duration: Optional[float] = None
+        self.statements = 0
+        self.rows: Optional[int] = None
+        self.details: dict = {}
+
+    def add_rows(self, rows: Optional[int]) -> None:
+        if rows is not None:
+            self.rows = rows if self.rows is None else self.rows + rows
+
+
+class InstrumentedDatabase:
+    """
+    Wraps a `Database`, timing each statement run through it.
+
+    Statements, and the number of rows returned, are also counted against
+    every span that is open at the time, so that each migration and
+    operation knows its own totals.
+    """
+
+    def __init__(
+        self, database: Database, instruments: Sequence[Instrument] = ()
+    ) -> None:
+        self.database = database
+        self.instruments = list(instruments)
+        self.spans: List[Span] = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.database, name)
+
+    @contextlib.asynccontextmanager
+    async def span(self, kind: str, name: str):
+        span = Span(kind, name)
+        span.started = time.monotonic()
+        self.emit(Event(kind, "start", name, span.started))
+        self.spans.append(span)
+        try:
+            yield span
+        finally:
+            self.spans.pop()
+            ended = time.monotonic()
+            span.duration = ended - span.started
+            event = Event(
+                kind,
+                "end",
+                name,
+                ended,
+                duration=span.duration,
+                statements=span.statements,
+                rows=span.rows,
+                details=span.details,
+            )
+            self.emit(event)
+
+    def emit(self, event: Event) -> None:
+        for instrument in self.instruments:
+            instrument.handle(event)
+
+    async def execute(self, query, values: dict = None) -> Any:
+        async with self.statement(query):
+            return await self.database.execute(query, values=values)
+
+    async def execute_many(self, query, values: list) -> None:
+        async with self.statement(query):
+            await self.database.execute_many(query, values=values)
+
+    async def fetch_all(self, query, values: dict = None) -> list:
+        async with self.statement(query) as span:
+            records = await self.database.fetch_all(query, values=values)
+            span.add_rows(len(records))
+        return records
+
+    async def fetch_one(self, query, values: dict = None) -> Any:
+        async with self.statement(query) as span:
+            record = await self.database.fetch_one(query, values=values)
+            span.add_rows(0 if record is None else 1)
+        return record
+
+    async def fetch_val(self, query, values: dict = None, column: Any = 0) -> Any:
+        async with self.statement(query) as span:
+            value = await self.database.fetch_val(query, values=values, column=column)
+            span.add_rows(1)
+        return value
+
+    @contextlib.asynccontextmanager
+    async def statement(self, query):
+        outer = list(self.spans)
+        async with self.span("statement", str(query).strip()) as span:
+            yield span
+        for parent in outer:
+            parent.statements += 1
+            parent.add_rows(span.rows)
+
+
+def span(database, kind: str, name: str):
+    """
+    Open a span on the database, if it is instrumented, or do nothing
+    otherwise. Migrations that run custom code may be given either.
+    """
+    if isinstance(database, InstrumentedDatabase):
+        return database.span(kind, name)
+    return _no_span()
+
+
+@contextlib.asynccontextmanager
+async def _no_span():
+    yield None
+
+
+def describe_operation(operation) -> str:
+    table_name = getattr(operation, "table_name", None)
+    class_name = type(operation).__name__
+    return class_name if table_name is None else f"{class_name}({table_name})"
@@ -0,0 +1,680 @@
+"""
+This module reads the schema of a live database, and compares it with the
+configured metadata, to find changes made outside of migrations.
+
+The whole schema is read with a few set-based catalog queries: one each for
+the columns, the constraints and the indexes of every table, rather than a
+round trip per table as SQLAlchemy's reflection makes. The result is built
+into a `MetaData`, which is compared with the metadata by an `Autodetector`
+that compares types and server defaults as the database would render them.
+
+PostgreSQL is read from `pg_catalog`, MySQL from `information_schema`, and
+SQLite from `sqlite_master` and its table-valued pragma functions. SQLite
+keeps no catalog of check constraints or constraint names, so those are
+parsed from the `CREATE TABLE` statement that it keeps for each table.
+
+MySQL makes no distinction between a unique index and a unique constraint,
+so both are read as unique constraints, and a unique `Index` in the metadata
+shows up as a difference there. Check constraints are only read from MySQL
+8.0.16 onwards, which is when they started to be enforced.
+"""
+from typing import Dict, List, Optional
+import re
+import sqlalchemy
+from databases import Database
+from .autodetect import Autodetector, constraint_signature
+from .tables import _get_dialect, metadata as migration_metadata
+
+POSTGRES_COLUMNS = """
+SELECT c.relname AS table_name, a.attname AS column_name,
+       format_type(a.atttypid, a.atttypmod) AS column_type,
+       a.attnotnull AS not_null, a.attidentity AS identity,
+       pg_get_expr(d.adbin, d.adrelid) AS column_default,
+       col_description(c.oid, a.attnum) AS comment
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')
+  AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+"""
+
+POSTGRES_CONSTRAINTS = """
+SELECT c.relname AS table_name, con.conname AS name, con.contype AS type,
+       ARRAY(
+         SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, i)
+         JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+         ORDER BY k.i
+       ) AS columns,
+       f.relname AS referred_table,
+       ARRAY(
+         SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, i)
+         JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+         ORDER BY k.i
+       ) AS referred_columns,
+       con.confdeltype AS on_delete, con.confupdtype AS on_update,
+       pg_get_constraintdef(con.oid) AS definition
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_class f ON f.oid = con.confrelid
+WHERE n.nspname = current_schema() AND con.contype IN ('p', 'u', 'f', 'c')
+ORDER BY c.relname, con.conname
+"""
+
+POSTGRES_INDEXES = """
+SELECT t.relname AS table_name, i.relname AS name, ix.indisunique AS is_unique,
+       ARRAY(
+         SELECT a.attname FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+         JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+         ORDER BY k.n
+       ) AS columns
+FROM pg_index ix
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE n.nspname = current_schema() AND t.relkind IN ('r', 'p')
+  AND NOT EXISTS (
+    SELECT 1 FROM pg_constraint con
+    WHERE con.conindid = ix.indexrelid AND con.contype IN ('p', 'u', 'x')
+  )
+ORDER BY t.relname, i.relname
+"""
+
+POSTGRES_ACTIONS = {
+    "r": "RESTRICT",
+    "c": "CASCADE",
+    "n": "SET NULL",
+    "d": "SET DEFAULT",
+}
+
+MYSQL_COLUMNS = """
+SELECT c.table_name AS table_name, c.column_name AS column_name,
+       c.column_type AS column_type, c.is_nullable AS is_nullable,
+       c.column_default AS column_default, c.column_comment AS comment
+FROM information_schema.columns c
+JOIN information_schema.tables t
+  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+WHERE c.table_schema = DATABASE() AND t.table_type = 'BASE TABLE'
+ORDER BY c.table_name, c.ordinal_position
+"""
+
+MYSQL_CONSTRAINTS = """
+SELECT tc.table_name AS table_name, tc.constraint_name AS name,
+       tc.constraint_type AS type, k.column_name AS column_name,
+       k.referenced_table_name AS referred_table,
+       k.referenced_column_name AS referred_column,
+       r.delete_rule AS on_delete, r.update_rule AS on_update
+FROM information_schema.table_constraints tc
+JOIN information_schema.key_column_usage k
+  ON k.constraint_schema = tc.constraint_schema
+  AND k.table_name = tc.table_name AND k.constraint_name = tc.constraint_name
+LEFT JOIN information_schema.referential_constraints r
+  ON r.constraint_schema = tc.constraint_schema
+  AND r.table_name = tc.table_name AND r.constraint_name = tc.constraint_name
+WHERE tc.table_schema = DATABASE()
+  AND tc.constraint_type IN ('PRIMARY KEY', 'UNIQUE', 'FOREIGN KEY')
+ORDER BY tc.table_name, tc.constraint_name, k.ordinal_position
+"""
+
+MYSQL_HAS_CHECKS = """
+SELECT count(*) AS count FROM information_schema.tables
+WHERE table_schema = 'information_schema' AND table_name = 'CHECK_CONSTRAINTS'
+"""
+
+MYSQL_CHECKS = """
+SELECT tc.table_name AS table_name, tc.constraint_name AS name,
+       cc.check_clause AS definition
+FROM information_schema.table_constraints tc
+JOIN information_schema.check_constraints cc
+  ON cc.constraint_schema = tc.constraint_schema
+  AND cc.constraint_name = tc.constraint_name
+WHERE tc.table_schema = DATABASE() AND tc.constraint_type = 'CHECK'
+ORDER BY tc.table_name, tc.constraint_name
+"""
+
+MYSQL_INDEXES = """
+SELECT s.table_name AS table_name, s.index_name AS name,
+       s.non_unique AS non_unique, s.column_name AS column_name
+FROM information_schema.statistics s
+WHERE s.table_schema = DATABASE()
+  AND NOT EXISTS (
+    SELECT 1 FROM information_schema.table_constraints tc
+    WHERE tc.table_schema = s.table_schema AND tc.table_name = s.table_name
+      AND tc.constraint_name = s.index_name
+  )
+ORDER BY s.table_name, s.index_name, s.seq_in_index
+"""
+
+# Integer display widths, such as int(11), which do not change the type.
+MYSQL_DISPLAY_WIDTH = re.compile(r"^(tinyint|smallint|mediumint|int|bigint)\(\d+\)")
+
+SQLITE_COLUMNS = """
+SELECT m.name AS table_name, p.name AS column_name, p.type AS column_type,
+       p."notnull" AS not_null, p.dflt_value AS column_default, p.pk AS pk
+FROM sqlite_master m JOIN pragma_table_info(m.name) p
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+ORDER BY m.name, p.cid
+"""
+
+SQLITE_INDEXES = """
+SELECT m.name AS table_name, l.name AS name, l."unique" AS is_unique,
+       l.origin AS origin, i.name AS column_name
+FROM sqlite_master m
+JOIN pragma_index_list(m.name) l
+JOIN pragma_index_info(l.name) i
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+ORDER BY m.name, l.name, i.seqno
+"""
+
+SQLITE_FOREIGN_KEYS = """
+SELECT m.name AS table_name, f.id AS id, f."table" AS referred_table,
+       f."from" AS column_name, f."to" AS referred_column,
+       f.on_delete AS on_delete, f.on_update AS on_update
+FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) f
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+ORDER BY m.name, f.id, f.seq
+"""
+
+SQLITE_TABLES = """
+SELECT m.name AS table_name, m.sql AS sql
+FROM sqlite_master m
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+"""
+
+SQLITE_CHECK = re.compile(
+    r"(?:\bCONSTRAINT\s+(\"[^\"]+\"|`[^`]+`|\[[^\]]+\]|\w+)\s+)?\bCHECK\s*\(",
+    re.IGNORECASE,
+)
+SQLITE_KEYS = re.compile(
+    r"^CONSTRAINT\s+(\"[^\"]+\"|`[^`]+`|\[[^\]]+\]|\w+)\s+"
+    r"(UNIQUE|FOREIGN\s+KEY)\s*\(([^)]*)\)",
+    re.IGNORECASE,
+)
+
+
+class CatalogType(sqlalchemy.types.UserDefinedType):
+    """
+    A type that the dialect does not know, kept as the catalog spells it.
+    """
+
+    cache_ok = True
+
+    def __init__(self, spec: str) -> None:
+        self.spec = spec
+
+    def get_col_spec(self, **kwargs) -> str:
+        return self.spec
+
+    def __repr__(self) -> str:
+        return f"CatalogType({self.spec!r})"
+
+
+async def load_database_schema(database: Database) -> sqlalchemy.MetaData:
+    """
+    Read the tables in the database into a `MetaData`, leaving out the
+    tables that savannah keeps for itself.
+    """
+    dialect = database.url.dialect
+    if dialect in ("postgres", "postgresql"):
+        tables = await _load_postgres(database)
+    elif dialect == "mysql":
+        tables = await _load_mysql(database)
+    elif dialect == "sqlite":
+        tables = await _load_sqlite(database)
+    else:
+        raise Exception(
+            f"Reading the schema of {dialect!r} databases is not supported."
+        )
+
+    metadata = sqlalchemy.MetaData()
+    for name, table in sorted(tables.items()):
+        if name in migration_metadata.tables:
+            continue
+        table_object = sqlalchemy.Table(
+            name, metadata, *table["columns"], *table["constraints"]
+        )
+        for index_name, columns, unique in table["indexes"]:
+            columns = [table_object.c[column] for column in columns]
+            sqlalchemy.Index(index_name, *columns, unique=unique)
+    return metadata
+
+
+async def _load_postgres(database: Database) -> Dict[str, dict]:
+    dialect = _get_dialect(str(database.url))
+    tables: Dict[str, dict] = {}
+    constraints = await database.fetch_all(POSTGRES_CONSTRAINTS)
+    primary_keys = {
+        row["table_name"]: set(row["columns"])
+        for row in constraints
+        if row["type"] == "p"
+    }
+
+    for row in await database.fetch_all(POSTGRES_COLUMNS):
+        table = _table(tables, row["table_name"])
+        default = row["column_default"]
+        if row["identity"] or (default or "").startswith("nextval("):
+            # Identity and serial columns are generated by the database.
+            default = None
+        is_primary_key = row["column_name"] in primary_keys.get(row["table_name"], ())
+        table["columns"].append(
+            sqlalchemy.Column(
+                row["column_name"],
+                catalog_type(dialect, row["column_type"]),
+                primary_key=is_primary_key,
+                nullable=not row["not_null"],
+                server_default=None if default is None else sqlalchemy.text(default),
+                comment=row["comment"],
+            )
+        )
+
+    for row in constraints:
+        table = _table(tables, row["table_name"])
+        if row["type"] == "u":
+            table["constraints"].append(
+                sqlalchemy.UniqueConstraint(*row["columns"], name=row["name"])
+            )
+        elif row["type"] == "f":
+            targets = [
+                f"{row['referred_table']}.{name}" for name in row["referred_columns"]
+            ]
+            table["constraints"].append(
+                sqlalchemy.ForeignKeyConstraint(
+                    list(row["columns"]),
+                    targets,
+                    name=row["name"],
+                    ondelete=POSTGRES_ACTIONS.get(row["on_delete"]),
+                    onupdate=POSTGRES_ACTIONS.get(row["on_update"]),
+                )
+            )
+        elif row["type"] == "c":
+            definition = re.sub(r"^CHECK\s*", "", row["definition"])
+            table["constraints"].append(
+                sqlalchemy.CheckConstraint(definition, name=row["name"])
+            )
+
+    for row in await database.fetch_all(POSTGRES_INDEXES):
+        table = _table(tables, row["table_name"])
+        # Indexes on expressions have no columns to compare.
+        if row["columns"]:
+            table["indexes"].append((row["name"], row["columns"], row["is_unique"]))
+    return tables
+
+
+async def _load_mysql(database: Database) -> Dict[str, dict]:
+    dialect = _get_dialect(str(database.url))
+    tables: Dict[str, dict] = {}
+    keys: Dict[tuple, dict] = {}
+    for row in await database.fetch_all(MYSQL_CONSTRAINTS):
+        key = (row["table_name"], row["name"])
+        if key not in keys:
+            keys[key] = {
+                "type": row["type"],
+                "columns": [],
+                "targets": [],
+                "on_delete": _mysql_action(row["on_delete"]),
+                "on_update": _mysql_action(row["on_update"]),
+            }
+        keys[key]["columns"].append(row["column_name"])
+        if row["referred_table"] is not None:
+            keys[key]["targets"].append(
+                f"{row['referred_table']}.{row['referred_column']}"
+            )
+    primary_keys = {
+        table_name: set(key["columns"])
+        for (table_name, _), key in keys.items()
+        if key["type"] == "PRIMARY KEY"
+    }
+
+    for row in await database.fetch_all(MYSQL_COLUMNS):
+        table = _table(tables, row["table_name"])
+        default = row["column_default"]
+        if default == "NULL":
+            # MariaDB spells out a default of null.
+            default = None
+        is_primary_key = row["column_name"] in primary_keys.get(row["table_name"], ())
+        table["columns"].append(
+            sqlalchemy.Column(
+                row["column_name"],
+                mysql_type(dialect, row["column_type"]),
+                primary_key=is_primary_key,
+                nullable=row["is_nullable"] == "YES",
+                server_default=None if default is None else sqlalchemy.text(default),
+                comment=row["comment"] or None,
+            )
+        )
+
+    for (table_name, name), key in keys.items():
+        table = _table(tables, table_name)
+        if key["type"] == "UNIQUE":
+            table["constraints"].append(
+                sqlalchemy.UniqueConstraint(*key["columns"], name=name)
+            )
+        elif key["type"] == "FOREIGN KEY":
+            table["constraints"].append(
+                sqlalchemy.ForeignKeyConstraint(
+                    key["columns"],
+                    key["targets"],
+                    name=name,
+                    ondelete=key["on_delete"],
+                    onupdate=key["on_update"],
+                )
+            )
+
+    has_checks = await database.fetch_val(MYSQL_HAS_CHECKS)
+    if has_checks:
+        for row in await database.fetch_all(MYSQL_CHECKS):
+            # MySQL quotes the column names in the expressions it keeps.
+            definition = row["definition"].replace("`", "")
+            _table(tables, row["table_name"])["constraints"].append(
+                sqlalchemy.CheckConstraint(definition, name=row["name"])
+            )
+
+    indexes: Dict[tuple, dict] = {}
+    for row in await database.fetch_all(MYSQL_INDEXES):
+        key = (row["table_name"], row["name"])
+        if key not in indexes:
+            indexes[key] = {"unique": not int(row["non_unique"]), "columns": []}
+        indexes[key]["columns"].append(row["column_name"])
+    for (table_name, name), index in indexes.items():
+        # Indexes on expressions have no columns to compare.
+        if None not in index["columns"]:
+            _table(tables, table_name)["indexes"].append(
+                (name, index["columns"], index["unique"])
+            )
+    return tables
+
+
+async def _load_sqlite(database: Database) -> Dict[str, dict]:
+    dialect = _get_dialect(str(database.url))
+    tables: Dict[str, dict] = {}
+    definitions = {
+        row["table_name"]: parse_sqlite_table(row["sql"] or "")
+        for row in await database.fetch_all(SQLITE_TABLES)
+    }
+
+    for row in await database.fetch_all(SQLITE_COLUMNS):
+        table = _table(tables, row["table_name"])
+        default = row["column_default"]
+        table["columns"].append(
+            sqlalchemy.Column(
+                row["column_name"],
+                catalog_type(dialect, row["column_type"]),
+                primary_key=bool(row["pk"]),
+                # Primary keys are never null, whatever SQLite reports.
+                nullable=not row["not_null"] and not row["pk"],
+                server_default=None if default is None else sqlalchemy.text(default),
+            )
+        )
+
+    indexes: Dict[tuple, dict] = {}
+    for row in await database.fetch_all(SQLITE_INDEXES):
+        key = (row["table_name"], row["name"])
+        if key not in indexes:
+            indexes[key] = {
+                "unique": bool(row["is_unique"]),
+                "origin": row["origin"],
+                "columns": [],
+            }
+        indexes[key]["columns"].append(row["column_name"])
+    for (table_name, name), index in indexes.items():
+        table = _table(tables, table_name)
+        if index["origin"] == "u":
+            # Unique constraints are backed by automatically named indexes.
+            key = ("unique", tuple(index["columns"]))
+            name = definitions[table_name]["names"].get(key)
+            table["constraints"].append(
+                sqlalchemy.UniqueConstraint(*index["columns"], name=name)
+            )
+        elif index["origin"] == "c" and None not in index["columns"]:
+            table["indexes"].append((name, index["columns"], index["unique"]))
+
+    foreign_keys: Dict[tuple, dict] = {}
+    for row in await database.fetch_all(SQLITE_FOREIGN_KEYS):
+        key = (row["table_name"], row["id"])
+        if key not in foreign_keys:
+            foreign_keys[key] = {
+                "columns": [],
+                "targets": [],
+                "on_delete": _sqlite_action(row["on_delete"]),
+                "on_update": _sqlite_action(row["on_update"]),
+            }
+        foreign_keys[key]["columns"].append(row["column_name"])
+        foreign_keys[key]["targets"].append(
+            f"{row['referred_table']}.{row['referred_column']}"
+        )
+    for (table_name, _), foreign_key in foreign_keys.items():
+        key = ("foreign key", tuple(foreign_key["columns"]))
+        _table(tables, table_name)["constraints"].append(
+            sqlalchemy.ForeignKeyConstraint(
+                foreign_key["columns"],
+                foreign_key["targets"],
+                name=definitions[table_name]["names"].get(key),
+                ondelete=foreign_key["on_delete"],
+                onupdate=foreign_key["on_update"],
+            )
+        )
+
+    for table_name, definition in definitions.items():
+        for name, sqltext in definition["checks"]:
+            _table(tables, table_name)["constraints"].append(
+                sqlalchemy.CheckConstraint(sqltext, name=name)
+            )
+    return tables
+
+
+def parse_sqlite_table(sql: str) -> dict:
+    """
+    Find the check constraints, and the names of the unique and foreign key
+    constraints, in a `CREATE TABLE` statement as SQLite keeps it.
+    """
+    checks = []
+    names = {}
+    start = sql.find("(")
+    body = sql[start + 1 : _closing_paren(sql, start)] if start != -1 else ""
+    for item in _split_sql(body):
+        item = item.strip()
+        match = SQLITE_KEYS.match(item)
+        if match is not None:
+            kind = " ".join(match.group(2).lower().split())
+            columns = tuple(_unquote(column) for column in _split_sql(match.group(3)))
+            names[(kind, columns)] = _unquote(match.group(1))
+        for match in SQLITE_CHECK.finditer(item):
+            opener = match.end() - 1
+            expression = item[opener + 1 : _closing_paren(item, opener)].strip()
+            name = None if match.group(1) is None else _unquote(match.group(1))
+            checks.append((name, expression))
+    return {"checks": checks, "names": names}
+
+
+def _closing_paren(sql: str, opener: int) -> int:
+    """
+    Return the position of the parenthesis that closes the one at `opener`.
+    """
+    depth = 0
+    quote = None
+    for position in range(opener, len(sql)):
+        char = sql[position]
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in "'\"`[":
+            quote = "]" if char == "[" else char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return position
+    return len(sql)
+
+
+def _split_sql(sql: str) -> List[str]:
+    """
+    Split a list of SQL clauses at the commas that are not within brackets
+    or quotes.
+    """
+    items = []
+    depth = 0
+    quote = None
+    start = 0
+    for position, char in enumerate(sql):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in "'\"`[":
+            quote = "]" if char == "[" else char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(sql[start:position])
+            start = position + 1
+    items.append(sql[start:])
+    return items
+
+
+def _unquote(name: str) -> str:
+    name = name.strip()
+    if name[:1] in ('"', "`", "[") and len(name) > 1:
+        return name[1:-1]
+    return name
+
+
+def _table(tables: Dict[str, dict], name: str) -> dict:
+    if name not in tables:
+        tables[name] = {"columns": [], "constraints": [], "indexes": []}
+    return tables[name]
+
+
+def _sqlite_action(action: str) -> Optional[str]:
+    return None if action in (None, "", "NO ACTION") else action
+
+
+def _mysql_action(action: Optional[str]) -> Optional[str]:
+    # InnoDB treats RESTRICT and NO ACTION alike, and reports either one for
+    # a foreign key that was declared without an action.
+    return None if action in (None, "RESTRICT", "NO ACTION") else action
+
+
+def mysql_type(dialect, spec: str) -> sqlalchemy.types.TypeEngine:
+    """
+    Return the SQLAlchemy type for a MySQL column type, such as "int(11)",
+    "int unsigned" or "enum('draft','published')".
+    """
+    spec = spec.strip().lower()
+    if spec.startswith(("enum(", "set(")):
+        # The values are kept as written, which is how they compile.
+        return CatalogType(spec)
+    spec = re.sub(r"\s+zerofill$", "", spec)
+    unsigned = spec.endswith(" unsigned")
+    if unsigned:
+        spec = spec[: -len(" unsigned")]
+    if not spec.startswith("tinyint(1)"):
+        spec = MYSQL_DISPLAY_WIDTH.sub(r"\1", spec)
+    type_ = catalog_type(dialect, spec)
+    if unsigned and hasattr(type_, "unsigned"):
+        type_.unsigned = True
+    return type_
+
+
+def catalog_type(dialect, spec: str) -> sqlalchemy.types.TypeEngine:
+    """
+    Return the SQLAlchemy type for a type as the catalog spells it, such as
+    "character varying(100)" or "integer[]".
+    """
+    spec = spec.strip()
+    if spec.endswith("[]"):
+        from sqlalchemy.dialects.postgresql import ARRAY
+
+        return ARRAY(catalog_type(dialect, spec[:-2]))
+
+    match = re.match(r"^([^(]*?)\s*(?:\(([^)]*)\))?\s*([^()]*)$", spec)
+    if match is None:
+        return CatalogType(spec)
+    name = " ".join(part for part in (match.group(1), match.group(3)) if part)
+    args = [
+        int(arg) for arg in (match.group(2) or "").split(",") if arg.strip().isdigit()
+    ]
+
+    names = dialect.ischema_names
+    type_class = names.get(name) or names.get(name.lower()) or names.get(name.upper())
+    if type_class is None:
+        return CatalogType(spec)
+
+    kwargs = {}
+    if "with time zone" in name.lower():
+        kwargs["timezone"] = True
+    if "time" in name.lower() and args:
+        kwargs["precision"] = args.pop(0)
+    try:
+        return type_class(*args, **kwargs)
+    except TypeError:
+        return type_class()
+
+
+class DatabaseAutodetector(Autodetector):
+    """
+    Compares a schema read from a database with the configured metadata.
+
+    Types and server defaults are compared as the database renders them,
+    since the catalog only records how each was stored, and not how it was
+    declared. Check constraints are compared by their normalized SQL, as
+    the database names those that were declared without a name.
+    """
+
+    # Types that the database stores under another name. A type is looked
+    # up in full, and then by its name alone, without its arguments.
+    TYPE_ALIASES = {
+        "postgresql": {"FLOAT": "DOUBLE PRECISION"},
+        "mysql": {"BOOL": "TINYINT(1)", "BOOLEAN": "TINYINT(1)", "NUMERIC": "DECIMAL"},
+    }
+
+    def __init__(
+        self,
+        from_metadata: sqlalchemy.MetaData,
+        to_metadata: sqlalchemy.MetaData,
+        dialect,
+    ) -> None:
+        super().__init__(from_metadata, to_metadata)
+        self.dialect = dialect
+        self.compiler = dialect.ddl_compiler(dialect, None)
+
+    def column_signature(self, column: sqlalchemy.Column) -> tuple:
+        default = None
+        if column.server_default is not None:
+            default = self.compiler.get_column_default_string(column)
+            default = normalize_sql(default) if default is not None else None
+        return (self.type_signature(column.type), bool(column.nullable), default)
+
+    def type_signature(self, type_) -> str:
+        try:
+            spec = type_.compile(dialect=self.dialect)
+        except Exception:
+            return repr(type_)
+        spec = re.sub(r"\s*,\s*", ", ", " ".join(spec.split())).upper()
+        aliases = self.TYPE_ALIASES.get(self.dialect.name, {})
+        if spec in aliases:
+            return aliases[spec]
+        name, paren, arguments = spec.partition("(")
+        return aliases.get(name, name) + paren + arguments
+
+    def constraint_signature(self, constraint: sqlalchemy.Constraint) -> tuple:
+        if isinstance(constraint, sqlalchemy.CheckConstraint):
+            return ("check", normalize_sql(str(constraint.sqltext)))
+        return constraint_signature(constraint)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Reduce a SQL expression to a form that is the same however it was
+    written, and however the database printed it back.
+    """
+    # PostgreSQL adds casts, such as 'x'::character varying.
+    sql = re.sub(r"::[\w ]+(\(\d+(,\s*\d+)?\))?(\[\])?", "", sql)
+    sql = re.sub(r"[\s()]", "", sql)
+    if re.match(r"^'[^']*'$", sql):
+        sql = sql[1:-1]
+    return sql
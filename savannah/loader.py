@@ -1,10 +1,113 @@
-from typing import Dict, Set, List, Tuple
-import pkgutil
+from typing import Dict, List, Sequence, Set, Tuple
 import sys
-import typing
-from importlib import import_module, invalidate_caches
+from importlib import import_module
 from databases import Database
-from .migration import Migration
+from .graph import MigrationGraph, MissingDependency
+from .manifest import ManifestEntry, load_manifest
+from .migration import Migration, call_hook
+
+
+class MigrationRecord:
+    """
+    A migration as loaded from the manifest. The migration module itself is
+    only imported once we actually need to run it, and may be released again
+    afterwards.
+
+    Records are kept small, since a long-running process may load the
+    history of many databases. Dependencies and dependants are held as
+    positions in the graph's ordering, which every record shares, and are
+    only turned back into names when asked for.
+    """
+
+    __slots__ = (
+        "name",
+        "dependency_indices",
+        "dependant_indices",
+        "names",
+        "is_applied",
+        "module_name",
+        "hash",
+        "replaces",
+        "_migration",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        dependency_indices: Tuple[int, ...],
+        dependant_indices: Tuple[int, ...],
+        names: Sequence[str],
+        is_applied: bool,
+        module_name: str,
+        hash: str,
+        replaces: Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.dependency_indices = dependency_indices
+        self.dependant_indices = dependant_indices
+        self.names = names
+        self.is_applied = is_applied
+        self.module_name = module_name
+        self.hash = hash
+        self.replaces = replaces
+        self._migration = None
+
+    def __repr__(self) -> str:
+        return f"<MigrationRecord {self.name!r}>"
+
+    @property
+    def dependencies(self) -> List[str]:
+        return [self.names[index] for index in self.dependency_indices]
+
+    @property
+    def dependants(self) -> List[str]:
+        return [self.names[index] for index in self.dependant_indices]
+
+    @property
+    def is_root(self) -> bool:
+        return not self.dependency_indices
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self.dependant_indices
+
+    def load(self) -> Migration:
+        """
+        Import the migration module, and return the migration instance.
+        """
+        if self._migration is None:
+            module = import_module(self.module_name)
+            migration_cls = getattr(module, "Migration")
+            self._migration = migration_cls(
+                name=self.name, is_applied=self.is_applied, dependants=self.dependants
+            )
+        return self._migration
+
+    def release(self) -> None:
+        """
+        Drop the migration instance, and unload the migration module, so
+        that it can be garbage collected. It is imported again if needed.
+        """
+        self._migration = None
+        unload_module(self.module_name)
+
+    async def upgrade(self, database: Database):
+        await call_hook(self.load().upgrade, database)
+
+    async def downgrade(self, database: Database):
+        await call_hook(self.load().downgrade, database)
+
+
+def unload_module(module_name: str) -> None:
+    """
+    Remove a migration module from `sys.modules`, and from its package, so
+    that it can be garbage collected.
+    """
+    if sys.modules.pop(module_name, None) is not None:
+        package_name, _, attribute = module_name.rpartition(".")
+        package = sys.modules.get(package_name)
+        if package is not None:
+            package.__dict__.pop(attribute, None)
 
 
 def build_dependants(dependencies: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
@@ -14,64 +117,104 @@ def build_dependants(dependencies: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
     dependants = {name: set() for name in dependencies.keys()}
     for child, parents in dependencies.items():
         for parent in parents:
+            if parent not in dependants:
+                raise MissingDependency(child, [parent])
             dependants[parent].add(child)
     return dependants
 
 
 def order_dependencies(
-    dependencies: Dict[str, Set[str]], dependants: Dict[str, Set[str]]
+    dependencies: Dict[str, Set[str]], dependants: Dict[str, Set[str]] = None
 ) -> List[str]:
     """
-    Given the dependencies and dependants mappings, return an ordered list
-    of the dependencies.
-    """
-    # The root nodes are the only ones with no dependencies.
-    root_nodes = sorted([name for name, deps in dependencies.items() if not deps])
-
-    ordered = list(root_nodes)
-    seen = set(root_nodes)
-    children = set()
-    for node in root_nodes:
-        children |= dependants[node]
-
-    while children:
-        for node in sorted(children):
-            if dependencies[node].issubset(seen):
-                ordered.append(node)
-                seen.add(node)
-                children.remove(node)
-                children |= dependants[node]
-                break
-        else:
-            raise Exception()
+    Given the dependencies mapping, return an ordered list of the dependencies.
 
-    return ordered
+    The dependants mapping is accepted for backwards compatibility, but is
+    no longer required, since the graph derives it.
+    """
+    return MigrationGraph(dependencies).order
 
 
-def load_migrations(applied: Set[str], dir_name: str) -> List[Migration]:
-    migration_classes = {}
-    dependencies = {}
+def load_migrations(
+    applied: Set[str], dir_name: str, entries: Dict[str, ManifestEntry] = None
+) -> MigrationGraph:
+    """
+    Load the migration graph for the given migrations package.
 
+    Only the manifest is read here. No migration modules are imported.
+    Callers that build graphs for many databases can load the manifest
+    once, and pass its `entries` in.
+    """
     if "." not in sys.path:
         sys.path.insert(0, ".")
 
-    names = [name for _, name, is_pkg in pkgutil.iter_modules([dir_name])]
-    for name in names:
-        module = import_module(f"{dir_name}.{name}")
-        migration_cls = getattr(module, "Migration")
-        migration_classes[name] = migration_cls
-        dependencies[name] = set(migration_cls.dependencies)
-
-    dependants = build_dependants(dependencies)
-    names = order_dependencies(dependencies, dependants)
-
-    migrations = []
-    for name in names:
-        migration_cls = migration_classes[name]
-        is_applied = name in applied
-        dependant_list = sorted(dependants[name])
-        migration = migration_cls(
-            name=name, is_applied=is_applied, dependants=dependant_list
+    if entries is None:
+        entries = load_manifest(dir_name)
+    dependencies, applied = resolve_replacements(entries, applied)
+
+    def create_node(graph: MigrationGraph, name: str) -> MigrationRecord:
+        entry = entries[name]
+        return MigrationRecord(
+            name=name,
+            dependency_indices=graph.indices(graph.dependencies[name]),
+            dependant_indices=graph.indices(graph.dependants[name]),
+            names=graph.order,
+            is_applied=name in applied,
+            module_name=f"{dir_name}.{name}",
+            hash=entry.hash,
+            replaces=tuple(entry.replaces),
         )
-        migrations.append(migration)
-    return migrations
+
+    return MigrationGraph(dependencies, create_node=create_node)
+
+
+def resolve_replacements(
+    entries: Dict[str, ManifestEntry], applied: Set[str]
+) -> Tuple[Dict[str, List[str]], Set[str]]:
+    """
+    Decide between each squashed migration and the migrations it replaces.
+
+    If the replaced migrations are either all applied or all unapplied, we
+    use the squashed migration and drop the originals from the graph.
+    Otherwise the database is part way through the originals, so we drop the
+    squashed migration instead, and the originals are applied as usual.
+
+    Returns the dependencies mapping for the graph, and the applied set
+    with squashed migrations marked as applied where appropriate.
+    """
+    dependencies = {name: list(entry.dependencies) for name, entry in entries.items()}
+    applied = set(applied)
+    remap = {}
+
+    for name, entry in entries.items():
+        if not entry.replaces:
+            continue
+        is_applied = [replaced in applied for replaced in entry.replaces]
+        if name in applied or all(is_applied) or not any(is_applied):
+            if all(is_applied):
+                applied.add(name)
+            for replaced in entry.replaces:
+                dependencies.pop(replaced, None)
+                remap[replaced] = [name]
+        else:
+            missing = [
+                replaced for replaced in entry.replaces if replaced not in entries
+            ]
+            if missing:
+                raise Exception(
+                    f"Migration {name!r} replaces partially applied migrations, "
+                    f"but {', '.join(missing)} are missing from disk."
+                )
+            del dependencies[name]
+            remap[name] = list(entry.replaces)
+
+    if remap:
+        for name, parents in dependencies.items():
+            resolved = []
+            for parent in parents:
+                for dependency in remap.get(parent, [parent]):
+                    if dependency != name and dependency not in resolved:
+                        resolved.append(dependency)
+            dependencies[name] = resolved
+
+    return dependencies, applied
@@ -0,0 +1,129 @@
+"""
+This module holds the migration lock, which makes sure that only one process
+migrates a database at a time, such as when many replicas start at once.
+
+On Postgres we use a session-level advisory lock, and on MySQL a named lock.
+SQLite has no locks that outlive a transaction, so we lock a file alongside
+the database instead.
+
+The lock is polled for, rather than blocked on, so that we can give up after
+a timeout on every backend.
+"""
+from typing import Optional
+import asyncio
+import contextlib
+import hashlib
+import os
+import time
+from databases import Database
+
+LOCK_NAME = "savannah_migrations"
+LOCK_KEY = int.from_bytes(
+    hashlib.sha256(LOCK_NAME.encode("utf-8")).digest()[:8], "big", signed=True
+)
+POLL_INTERVAL = 0.1
+
+
+class LockTimeout(Exception):
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        super().__init__(
+            f"Could not acquire the migration lock within {timeout:g} seconds."
+        )
+
+
+class LockStatus:
+    def __init__(self) -> None:
+        self.waited = 0.0
+
+    @property
+    def did_wait(self) -> bool:
+        """
+        Whether another process held the lock when we first tried to take it.
+        """
+        return self.waited > 0.0
+
+
+@contextlib.asynccontextmanager
+async def migration_lock(database: Database, timeout: Optional[float] = 60.0):
+    """
+    Hold the migration lock for the duration of the block, waiting at most
+    `timeout` seconds for it, or forever if `timeout` is `None`.
+
+    Session-level locks belong to a connection, so the block runs with a
+    single connection held throughout.
+    """
+    dialect = database.url.dialect
+    if dialect in ("postgres", "postgresql"):
+        acquire, release = _postgres_lock(database)
+    elif dialect == "mysql":
+        acquire, release = _mysql_lock(database)
+    else:
+        acquire, release = _sqlite_lock(database)
+
+    status = LockStatus()
+    async with database.connection():
+        started = time.monotonic()
+        while not await acquire():
+            elapsed = time.monotonic() - started
+            if timeout is not None and elapsed >= timeout:
+                raise LockTimeout(timeout)
+            await asyncio.sleep(POLL_INTERVAL)
+            status.waited = time.monotonic() - started
+        try:
+            yield status
+        finally:
+            await release()
+
+
+def _postgres_lock(database: Database):
+    async def acquire() -> bool:
+        return await database.fetch_val(f"SELECT pg_try_advisory_lock({LOCK_KEY})")
+
+    async def release() -> None:
+        await database.fetch_val(f"SELECT pg_advisory_unlock({LOCK_KEY})")
+
+    return acquire, release
+
+
+def _mysql_lock(database: Database):
+    async def acquire() -> bool:
+        return await database.fetch_val(f"SELECT GET_LOCK('{LOCK_NAME}', 0)") == 1
+
+    async def release() -> None:
+        await database.fetch_val(f"SELECT RELEASE_LOCK('{LOCK_NAME}')")
+
+    return acquire, release
+
+
+def _sqlite_lock(database: Database):
+    path = database.url.database
+    if not path or path == ":memory:":
+        # An in-memory database is private to this process.
+        async def acquire() -> bool:
+            return True
+
+        async def release() -> None:
+            pass
+
+        return acquire, release
+
+    import fcntl
+
+    lock_file = None
+
+    async def acquire() -> bool:
+        nonlocal lock_file
+        lock_file = open(f"{os.path.abspath(path)}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        return True
+
+    async def release() -> None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    return acquire, release
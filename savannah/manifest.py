@@ -0,0 +1,225 @@
+"""
+This module holds the on-disk manifest of migration files.
+
+For each migration the manifest records its name, dependencies, the names
+of any migrations it replaces, and a hash of its source, keyed by the file's
+modification time and size. Files that have not changed since the manifest
+was written are never opened, and files that have changed are parsed rather
+than imported, so that reading the migration history does not require
+importing every migration module.
+"""
+from typing import Dict, List, Optional
+from importlib import import_module, invalidate_caches
+import ast
+import hashlib
+import json
+import os
+import sys
+
+MANIFEST_PATH = os.path.join("__pycache__", "savannah", "manifest.json")
+MANIFEST_VERSION = 2
+MIGRATION_ATTRIBUTES = ("dependencies", "replaces")
+
+
+class ManifestEntry:
+    def __init__(
+        self,
+        name: str,
+        mtime: int,
+        size: int,
+        hash: str,
+        dependencies: List[str],
+        replaces: List[str] = None,
+    ) -> None:
+        self.name = name
+        self.mtime = mtime
+        self.size = size
+        self.hash = hash
+        self.dependencies = dependencies
+        self.replaces = [] if replaces is None else replaces
+
+    def to_dict(self) -> dict:
+        return {
+            "mtime": self.mtime,
+            "size": self.size,
+            "hash": self.hash,
+            "dependencies": self.dependencies,
+            "replaces": self.replaces,
+        }
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> "ManifestEntry":
+        return cls(
+            name=name,
+            mtime=data["mtime"],
+            size=data["size"],
+            hash=data["hash"],
+            dependencies=data["dependencies"],
+            replaces=data["replaces"],
+        )
+
+
+def load_manifest(dir_name: str) -> Dict[str, ManifestEntry]:
+    """
+    Return the manifest for the migrations package, updating the copy on
+    disk if any migration file was added, changed or removed.
+    """
+    if "." not in sys.path:
+        sys.path.insert(0, ".")
+
+    path = os.path.join(dir_name, MANIFEST_PATH)
+    cached = _read_manifest(path)
+
+    entries = {}
+    for name, filename, stat in _scan_migration_files(dir_name):
+        entry = cached.get(name)
+        if (
+            entry is None
+            or entry.mtime != stat.st_mtime_ns
+            or entry.size != stat.st_size
+        ):
+            entry = _read_migration_file(dir_name, name, filename, stat)
+        entries[name] = entry
+
+    if entries.keys() != cached.keys() or any(
+        entries[name] is not cached[name] for name in entries
+    ):
+        # Make sure the import system sees any newly written modules.
+        invalidate_caches()
+        _write_manifest(path, entries)
+    return entries
+
+
+def manifest_digest(entries: Dict[str, ManifestEntry]) -> str:
+    """
+    A digest of the names and contents of every migration, which changes
+    whenever a migration is added, changed or removed.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(entries):
+        digest.update(f"{name}:{entries[name].hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def parse_migration(source: bytes) -> Optional[Dict[str, List[str]]]:
+    """
+    Return the `dependencies` and `replaces` declared on the `Migration` class
+    in the given source, or `None` if they cannot be determined without
+    importing it.
+    """
+    tree = ast.parse(source)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "Migration":
+            # Attributes that are not set explicitly are only known to take
+            # their empty defaults if the class derives from `savannah.Migration`.
+            inherits_defaults = all(_is_base_migration(base) for base in node.bases)
+            attributes = {}
+            for attribute in MIGRATION_ATTRIBUTES:
+                value = None
+                for statement in node.body:
+                    value = _assigned_value(statement, attribute) or value
+                if value is None:
+                    if not inherits_defaults:
+                        return None
+                    attributes[attribute] = []
+                    continue
+                try:
+                    attributes[attribute] = list(ast.literal_eval(value))
+                except ValueError:
+                    return None
+            return attributes
+    return None
+
+
+def _assigned_value(statement: ast.stmt, target: str) -> Optional[ast.expr]:
+    if isinstance(statement, ast.Assign):
+        for node in statement.targets:
+            if isinstance(node, ast.Name) and node.id == target:
+                return statement.value
+    elif isinstance(statement, ast.AnnAssign):
+        node = statement.target
+        if isinstance(node, ast.Name) and node.id == target:
+            return statement.value
+    return None
+
+
+def _is_base_migration(node: ast.expr) -> bool:
+    if isinstance(node, ast.Attribute):
+        return (
+            node.attr == "Migration"
+            and isinstance(node.value, ast.Name)
+            and (node.value.id == "savannah")
+        )
+    return isinstance(node, ast.Name) and node.id == "Migration"
+
+
+def _scan_migration_files(dir_name: str):
+    with os.scandir(dir_name) as iterator:
+        for dir_entry in iterator:
+            filename = dir_entry.name
+            if not filename.endswith(".py") or filename == "__init__.py":
+                continue
+            if not dir_entry.is_file():
+                continue
+            yield filename[:-3], filename, dir_entry.stat()
+
+
+def _read_migration_file(
+    dir_name: str, name: str, filename: str, stat: os.stat_result
+) -> ManifestEntry:
+    with open(os.path.join(dir_name, filename), "rb") as fin:
+        source = fin.read()
+
+    attributes = parse_migration(source)
+    if attributes is None:
+        # The attributes are computed dynamically, so fall back to
+        # importing the module, just for this one migration.
+        invalidate_caches()
+        module = import_module(f"{dir_name}.{name}")
+        attributes = {
+            attribute: list(getattr(module.Migration, attribute))
+            for attribute in MIGRATION_ATTRIBUTES
+        }
+
+    return ManifestEntry(
+        name=name,
+        mtime=stat.st_mtime_ns,
+        size=stat.st_size,
+        hash=hashlib.sha256(source).hexdigest(),
+        dependencies=attributes["dependencies"],
+        replaces=attributes["replaces"],
+    )
+
+
+def _read_manifest(path: str) -> Dict[str, ManifestEntry]:
+    try:
+        with open(path, "r") as fin:
+            data = json.load(fin)
+    except (OSError, ValueError):
+        return {}
+
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return {
+        name: ManifestEntry.from_dict(name, entry)
+        for name, entry in data["migrations"].items()
+    }
+
+
+def _write_manifest(path: str, entries: Dict[str, ManifestEntry]) -> None:
+    data = {
+        "version": MANIFEST_VERSION,
+        "migrations": {
+            name: entry.to_dict() for name, entry in sorted(entries.items())
+        },
+    }
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "w") as fout:
+            json.dump(data, fout, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+    except OSError:
+        # The manifest is only a cache. If the migrations directory is not
+        # writable we simply re-parse changed files next time.
+        pass
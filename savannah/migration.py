@@ -1,9 +1,22 @@
-from typing import List
+from typing import Awaitable, Callable, List, Optional, Set
+import inspect
+import warnings
+from databases import Database
+from .instrumentation import describe_operation, span
+from .operations.rebuild_table import batch_operations
+from .tables import _get_dialect
 
 
 class Migration:
     dependencies: List[str] = []
+    replaces: List[str] = []
     operations = []
+    atomic = True
+    touches: Optional[List[str]] = None
+    # Limits in place of those given for the run, as in `savannah.timeouts`.
+    lock_timeout: Optional[float] = None
+    statement_timeout: Optional[float] = None
+    lock_attempts: Optional[int] = None
 
     def __init__(self, name: str, is_applied: bool, dependants: List[str]) -> None:
         self.name = name
@@ -18,8 +31,83 @@ class Migration:
     def is_leaf(self) -> bool:
         return not self.dependants
 
-    async def upgrade(self):
-        print(f"Applying {self.name}")
+    @property
+    def has_custom_code(self) -> bool:
+        """
+        Migrations that override `upgrade()` or `downgrade()` run arbitrary
+        code, so they cannot be compiled to SQL statements up front.
+        """
+        cls = type(self)
+        return cls.upgrade is not Migration.upgrade or (
+            cls.downgrade is not Migration.downgrade
+        )
+
+    @property
+    def is_atomic(self) -> bool:
+        """
+        Migrations run inside a transaction unless they set `atomic = False`,
+        or include an operation that cannot run inside a transaction.
+        """
+        return self.atomic and all(operation.atomic for operation in self.operations)
+
+    @property
+    def touched_tables(self) -> Optional[Set[str]]:
+        """
+        The tables that this migration reads or changes, which decides which
+        migrations may run alongside it when applying in parallel.
+
+        Migrations may declare them with `touches`. Otherwise they are worked
+        out from the operations, or are `None`, meaning any table, if the
+        migration runs custom code or includes raw SQL.
+        """
+        if self.touches is not None:
+            return set(self.touches)
+        if self.has_custom_code:
+            return None
+        tables = set()
+        for operation in self.operations:
+            touched = operation.touched_tables()
+            if touched is None:
+                return None
+            tables |= touched
+        return tables
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        statements = []
+        for operation in self.operations:
+            statements.extend(operation.upgrade_statements(dialect))
+        return statements
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        statements = []
+        for operation in reversed(self.operations):
+            statements.extend(operation.downgrade_statements(dialect))
+        return statements
+
+    async def upgrade(self, database: Database):
+        dialect = _get_dialect(str(database.url))
+        for operation in batch_operations(self.operations, dialect):
+            async with span(database, "operation", describe_operation(operation)):
+                await operation.upgrade(database, dialect)
+
+    async def downgrade(self, database: Database):
+        dialect = _get_dialect(str(database.url))
+        for operation in batch_operations(self.operations, dialect, reverse=True):
+            async with span(database, "operation", describe_operation(operation)):
+                await operation.downgrade(database, dialect)
+
 
-    async def downgrade(self):
-        print(f"Unapplying {self.name}")
+async def call_hook(hook: Callable[..., Awaitable[None]], database: Database) -> None:
+    """
+    Call a migration's `upgrade()` or `downgrade()` with the database. Before
+    they were passed the database they took no arguments, and overrides
+    written that way are still called without it.
+    """
+    if inspect.signature(hook).parameters:
+        await hook(database)
+        return
+    warnings.warn(
+        f"{hook.__qualname__}() should take the database as an argument.",
+        DeprecationWarning,
+    )
+    await hook()
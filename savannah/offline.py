@@ -0,0 +1,101 @@
+"""
+This module renders a migration plan as a single SQL script, without
+connecting to the database, so that it can be reviewed and then applied in
+one session, with `psql` or `mysql`.
+
+The script includes the transaction boundaries, and the statements that
+keep the migrations table up to date. It is generated one statement at a
+time, so that it can be streamed to its destination.
+"""
+from typing import Iterator, List
+import sqlalchemy
+from .executor import split_segments
+from .operations.rebuild_table import requires_rebuild
+from .tables import migrations
+
+
+def generate_script(
+    dialect,
+    downgrades: list,
+    upgrades: list,
+    create_migrations_table: bool = False,
+    atomicity: str = "all",
+) -> Iterator[str]:
+    """
+    Yield the SQL for unapplying the `downgrades` migrations, and then
+    applying the `upgrades` migrations, compiled for the given dialect.
+
+    Migrations are wrapped in transactions as they would be by `migrate`
+    with the same `atomicity`, and non-atomic migrations run outside of one.
+    """
+    steps = [(migration, False) for migration in downgrades] + [
+        (migration, True) for migration in upgrades
+    ]
+    # Fail before anything is written, rather than part way through the script.
+    for migration, forwards in steps:
+        instance = migration.load()
+        if instance.has_custom_code:
+            raise Exception(
+                f"Migration {migration.name!r} runs custom code, "
+                "and cannot be rendered as SQL."
+            )
+        if requires_rebuild(instance.operations, dialect):
+            raise Exception(
+                f"Migration {migration.name!r} rebuilds tables on SQLite, "
+                "and cannot be rendered as SQL."
+            )
+
+    if create_migrations_table:
+        ddl = sqlalchemy.schema.CreateTable(migrations).compile(dialect=dialect)
+        yield _terminate(ddl.string)
+
+    for atomic, segment in split_segments(steps, atomicity):
+        if atomic:
+            yield "BEGIN;\n"
+        for migration, forwards in segment:
+            instance = migration.load()
+            if forwards:
+                yield f"\n-- Applying {migration.name}\n"
+                statements = instance.upgrade_statements(dialect)
+                statements += _apply_statements(
+                    dialect, migration, statement_count=len(statements)
+                )
+            else:
+                yield f"\n-- Unapplying {migration.name}\n"
+                statements = instance.downgrade_statements(dialect)
+                names = [migration.name, *migration.replaces]
+                statements += _unapply_statements(dialect, names)
+            for statement in statements:
+                yield _terminate(statement)
+        if atomic:
+            yield "\nCOMMIT;\n"
+
+
+def _apply_statements(dialect, migration, statement_count: int) -> List[str]:
+    applied_at = sqlalchemy.func.current_timestamp()
+    query = migrations.insert().inline()
+    statements = [
+        query.values(
+            name=migration.name,
+            applied_at=applied_at,
+            statements=statement_count,
+            checksum=migration.hash,
+        )
+    ]
+    for name in migration.replaces:
+        statements.append(query.values(name=name, applied_at=applied_at))
+    return [_compile(dialect, statement) for statement in statements]
+
+
+def _unapply_statements(dialect, names: List[str]) -> List[str]:
+    query = migrations.delete().where(migrations.c.name.in_(names))
+    return [_compile(dialect, query)]
+
+
+def _compile(dialect, query) -> str:
+    compiled = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    return compiled.string
+
+
+def _terminate(statement: str) -> str:
+    return statement.strip().rstrip(";") + ";\n"
@@ -0,0 +1,78 @@
+from typing import List, Set
+import sqlalchemy
+from .base import Operation
+from .render import Code, build_table, call, referenced_tables, render_column
+
+
+class AddColumn(Operation):
+    def __init__(self, table_name, column):
+        self.table_name = table_name
+        self.column = column
+
+    def render(self) -> Code:
+        return call(
+            f"savannah.{self.__class__.__name__}",
+            table_name=self.table_name,
+            column=render_column(self.column),
+        )
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        table = metadata.tables[self.table_name]
+        table.append_column(self.column.copy())
+
+    def reverse(self) -> Operation:
+        from .drop_column import DropColumn
+
+        return DropColumn(self.table_name, self.column)
+
+    def touched_tables(self) -> Set[str]:
+        return {self.table_name} | referenced_tables(columns=[self.column])
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return add_column_statements(self.table_name, self.column, dialect)
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return drop_column_statements(self.table_name, self.column, dialect)
+
+
+def add_column_statements(table_name, column, dialect) -> List[str]:
+    table = build_table(table_name, [column])
+    column = table.c[column.name]
+    compiler = dialect.ddl_compiler(dialect, sqlalchemy.schema.CreateTable(table))
+    preparer = compiler.preparer
+    specification = compiler.get_column_specification(column)
+
+    constraints = [
+        foreign_key.constraint
+        for foreign_key in sorted(
+            column.foreign_keys, key=lambda foreign_key: foreign_key.target_fullname
+        )
+    ]
+    if dialect.name == "sqlite":
+        # SQLite cannot add constraints to an existing table, but does accept
+        # an inline reference when the column is added.
+        for constraint in constraints:
+            element = constraint.elements[0]
+            target = element.column
+            specification += (
+                f" REFERENCES {preparer.format_table(target.table)} "
+                f"({preparer.format_column(target)})"
+            )
+        constraints = []
+
+    statements = [
+        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {specification}"
+    ]
+    for constraint in constraints:
+        statement = sqlalchemy.schema.AddConstraint(constraint)
+        statements.append(statement.compile(dialect=dialect).string)
+    return statements
+
+
+def drop_column_statements(table_name, column, dialect) -> List[str]:
+    table = build_table(table_name, [column])
+    preparer = dialect.identifier_preparer
+    return [
+        f"ALTER TABLE {preparer.format_table(table)} "
+        f"DROP COLUMN {preparer.format_column(table.c[column.name])}"
+    ]
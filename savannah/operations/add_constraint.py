@@ -0,0 +1,69 @@
+from typing import List, Set
+import sqlalchemy
+from .base import Operation
+from .render import (
+    Code,
+    add_referenced_table,
+    call,
+    constraint_columns,
+    copy_constraint,
+    referenced_tables,
+    render_constraint,
+)
+
+
+class AddConstraint(Operation):
+    """
+    Add a unique, check or foreign key constraint to an existing table.
+    """
+
+    def __init__(self, table_name, constraint):
+        self.table_name = table_name
+        self.constraint = constraint
+
+    def render(self) -> Code:
+        return call(
+            f"savannah.{self.__class__.__name__}",
+            table_name=self.table_name,
+            constraint=render_constraint(self.constraint),
+        )
+
+    def get_constraint(self, metadata: sqlalchemy.MetaData = None):
+        """
+        Return a copy of the constraint, attached to the table in the given
+        metadata, or to a placeholder table if none is given.
+        """
+        if metadata is None:
+            metadata = sqlalchemy.MetaData()
+            columns = [
+                sqlalchemy.Column(name, sqlalchemy.types.NullType)
+                for name in constraint_columns(self.constraint)
+            ]
+            table = sqlalchemy.Table(self.table_name, metadata, *columns)
+            if isinstance(self.constraint, sqlalchemy.ForeignKeyConstraint):
+                for element in self.constraint.elements:
+                    add_referenced_table(metadata, element.target_fullname)
+        else:
+            table = metadata.tables[self.table_name]
+        constraint = copy_constraint(self.constraint)
+        table.append_constraint(constraint)
+        return constraint
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        self.get_constraint(metadata)
+
+    def reverse(self) -> Operation:
+        from .drop_constraint import DropConstraint
+
+        return DropConstraint(self.table_name, self.constraint)
+
+    def touched_tables(self) -> Set[str]:
+        return {self.table_name} | referenced_tables(constraints=[self.constraint])
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        statement = sqlalchemy.schema.AddConstraint(self.get_constraint())
+        return [statement.compile(dialect=dialect).string]
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        statement = sqlalchemy.schema.DropConstraint(self.get_constraint())
+        return [statement.compile(dialect=dialect).string]
@@ -0,0 +1,84 @@
+from typing import List
+import sqlalchemy
+from .base import Operation
+from .render import Code, build_table, call, render_column
+
+
+class AlterColumn(Operation):
+    """
+    Change the type, nullability or server default of a column. The existing
+    column definition is required so that the operation can be reversed.
+    """
+
+    def __init__(self, table_name, column, existing):
+        self.table_name = table_name
+        self.column = column
+        self.existing = existing
+
+    def render(self) -> Code:
+        return call(
+            f"savannah.{self.__class__.__name__}",
+            table_name=self.table_name,
+            column=render_column(self.column),
+            existing=render_column(self.existing),
+        )
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        table = metadata.tables[self.table_name]
+        column = table.c[self.existing.name]
+        column.type = self.column.type
+        column.nullable = self.column.nullable
+        column.server_default = (
+            None
+            if self.column.server_default is None
+            else sqlalchemy.DefaultClause(self.column.server_default.arg)
+        )
+
+    def reverse(self) -> "AlterColumn":
+        return AlterColumn(self.table_name, column=self.existing, existing=self.column)
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return alter_column_statements(
+            self.table_name, self.existing, self.column, dialect
+        )
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return alter_column_statements(
+            self.table_name, self.column, self.existing, dialect
+        )
+
+
+def alter_column_statements(table_name, existing, column, dialect) -> List[str]:
+    if dialect.name == "sqlite":
+        raise Exception(
+            f"SQLite cannot alter column {table_name}.{column.name} in place."
+        )
+
+    table = build_table(table_name, [column])
+    column = table.c[column.name]
+    compiler = dialect.ddl_compiler(dialect, sqlalchemy.schema.CreateTable(table))
+    preparer = compiler.preparer
+    prefix = f"ALTER TABLE {preparer.format_table(table)}"
+
+    if dialect.name == "mysql":
+        # MySQL restates the whole column definition.
+        specification = compiler.get_column_specification(column)
+        return [f"{prefix} MODIFY {specification}"]
+
+    name = preparer.format_column(column)
+    statements = []
+    old_type = existing.type.compile(dialect=dialect)
+    new_type = column.type.compile(dialect=dialect)
+    if old_type != new_type:
+        statements.append(f"{prefix} ALTER COLUMN {name} TYPE {new_type}")
+    if existing.nullable != column.nullable:
+        action = "DROP NOT NULL" if column.nullable else "SET NOT NULL"
+        statements.append(f"{prefix} ALTER COLUMN {name} {action}")
+    old_default = compiler.get_column_default_string(existing)
+    new_default = compiler.get_column_default_string(column)
+    if old_default != new_default:
+        if new_default is None:
+            statements.append(f"{prefix} ALTER COLUMN {name} DROP DEFAULT")
+        else:
+            statements.append(f"{prefix} ALTER COLUMN {name} SET DEFAULT {new_default}")
+    return statements
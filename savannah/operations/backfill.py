@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import time
+import sqlalchemy
+from databases import Database
+from .base import Operation
+from .render import Code, call
+from ..tables import (
+    db_clear_checkpoint,
+    db_create_checkpoints_table_if_not_exists,
+    db_load_checkpoint,
+    db_save_checkpoint,
+)
+
+
+class Backfill(Operation):
+    """
+    Update every row in a table, in batches.
+
+    Rows are visited in keyset order on `key`, `batch_size` at a time, and
+    each batch is committed together with a checkpoint of the last key
+    processed. If the run is interrupted, the next run resumes from the
+    checkpoint rather than starting over.
+
+    `values` maps column names to SQL expressions, eg.
+    `{"full_name": "first_name || ' ' || last_name"}`. `where` optionally
+    restricts the rows that are updated. Between batches we pause for
+    `sleep` seconds, and for longer if that is needed to stay under
+    `max_rows_per_second`.
+
+    Because each batch commits, the operation runs outside of a transaction.
+    It is best placed in a migration of its own, so that an interrupted run
+    does not re-run any other operations when it resumes.
+    """
+
+    atomic = False
+
+    def __init__(
+        self,
+        table_name: str,
+        values: Dict[str, str],
+        reverse_values: Dict[str, str] = None,
+        key: str = "id",
+        where: str = None,
+        batch_size: int = 1000,
+        sleep: float = 0.0,
+        max_rows_per_second: float = None,
+    ):
+        self.table_name = table_name
+        self.values = values
+        self.reverse_values = reverse_values
+        self.key = key
+        self.where = where
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.max_rows_per_second = max_rows_per_second
+
+    def render(self) -> Code:
+        kwargs = {"table_name": self.table_name, "values": self.values}
+        if self.reverse_values is not None:
+            kwargs["reverse_values"] = self.reverse_values
+        if self.key != "id":
+            kwargs["key"] = self.key
+        if self.where is not None:
+            kwargs["where"] = self.where
+        kwargs["batch_size"] = self.batch_size
+        if self.sleep:
+            kwargs["sleep"] = self.sleep
+        if self.max_rows_per_second is not None:
+            kwargs["max_rows_per_second"] = self.max_rows_per_second
+        return call(f"savannah.{self.__class__.__name__}", **kwargs)
+
+    def checkpoint_name(self, forwards: bool) -> str:
+        # Only the fields that decide which rows are updated, and how, are
+        # included, so that a run resumes after the batch size or throttle
+        # have been changed.
+        identity = json.dumps(
+            [self.table_name, self.values, self.reverse_values, self.key, self.where],
+            sort_keys=True,
+        )
+        digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+        direction = "upgrade" if forwards else "downgrade"
+        return f"{self.table_name}:{digest}:{direction}"
+
+    def get_table(self, values: Dict[str, str]) -> sqlalchemy.sql.TableClause:
+        columns = [self.key, *values.keys()]
+        return sqlalchemy.table(
+            self.table_name, *[sqlalchemy.column(name) for name in columns]
+        )
+
+    def get_update(self, values: Dict[str, str], lower=None, upper=None):
+        table = self.get_table(values)
+        query = table.update().values(
+            {
+                name: sqlalchemy.literal_column(expression)
+                for name, expression in values.items()
+            }
+        )
+        if lower is not None:
+            query = query.where(table.c[self.key] > lower)
+        if upper is not None:
+            query = query.where(table.c[self.key] <= upper)
+        if self.where is not None:
+            query = query.where(sqlalchemy.text(self.where))
+        return query
+
+    def get_keys(self, values: Dict[str, str], lower=None):
+        table = self.get_table(values)
+        key = table.c[self.key]
+        query = sqlalchemy.select([key]).order_by(key).limit(self.batch_size)
+        if lower is not None:
+            query = query.where(key > lower)
+        if self.where is not None:
+            query = query.where(sqlalchemy.text(self.where))
+        return query
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        # When compiled to plain SQL the update runs as a single statement.
+        query = self.get_update(self.values)
+        return [str(query.compile(dialect=dialect))]
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        if self.reverse_values is None:
+            return []
+        query = self.get_update(self.reverse_values)
+        return [str(query.compile(dialect=dialect))]
+
+    async def upgrade(self, database: Database, dialect) -> None:
+        await self.run(database, self.values, self.checkpoint_name(forwards=True))
+
+    async def downgrade(self, database: Database, dialect) -> None:
+        if self.reverse_values is not None:
+            name = self.checkpoint_name(forwards=False)
+            await self.run(database, self.reverse_values, name)
+
+    async def run(self, database: Database, values: Dict[str, str], name: str) -> int:
+        """
+        Run the batched update, returning the number of rows visited.
+        """
+        await db_create_checkpoints_table_if_not_exists(database)
+        lower = await db_load_checkpoint(database, name)
+        total = 0
+
+        while True:
+            started = time.monotonic()
+            async with database.transaction():
+                records = await database.fetch_all(self.get_keys(values, lower))
+                if not records:
+                    break
+                upper = records[-1][0]
+                await database.execute(self.get_update(values, lower, upper))
+                await db_save_checkpoint(database, name, upper)
+            lower = upper
+            total += len(records)
+            await asyncio.sleep(
+                self.get_delay(len(records), time.monotonic() - started)
+            )
+
+        await db_clear_checkpoint(database, name)
+        return total
+
+    def get_delay(self, rows: int, elapsed: float) -> float:
+        delay = self.sleep
+        if self.max_rows_per_second:
+            delay = max(delay, rows / self.max_rows_per_second - elapsed)
+        return delay
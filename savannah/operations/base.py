@@ -0,0 +1,61 @@
+from typing import List, Optional, Set
+import sqlalchemy
+from databases import Database
+from .render import Code
+
+
+class Operation:
+    """
+    The base class for migration operations.
+
+    Operations compile to a list of SQL statements for a given dialect,
+    so that the statements for a whole run can be prepared up front.
+    Operations that cannot run inside a transaction set `atomic = False`.
+
+    Operations that change the schema also apply themselves to an in-memory
+    `MetaData` in `state_forwards()`, so that the schema at any point in the
+    history can be computed without a database.
+    """
+
+    atomic = True
+
+    def __repr__(self) -> str:
+        return str(self.render())
+
+    def render(self) -> Code:
+        """
+        The source for this operation, as it appears in migration files.
+        """
+        raise NotImplementedError()
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        pass
+
+    def reverse(self) -> "Operation":
+        """
+        The operation that undoes this one.
+        """
+        raise NotImplementedError()
+
+    def touched_tables(self) -> Optional[Set[str]]:
+        """
+        The names of the tables that this operation reads or changes, which
+        keeps conflicting migrations apart when running in parallel. `None`
+        means that the operation could touch any table.
+        """
+        table_name = getattr(self, "table_name", None)
+        return None if table_name is None else {table_name}
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        raise NotImplementedError()
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        raise NotImplementedError()
+
+    async def upgrade(self, database: Database, dialect) -> None:
+        for statement in self.upgrade_statements(dialect):
+            await database.execute(statement)
+
+    async def downgrade(self, database: Database, dialect) -> None:
+        for statement in self.downgrade_statements(dialect):
+            await database.execute(statement)
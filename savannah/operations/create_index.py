@@ -0,0 +1,116 @@
+from typing import List
+import sqlalchemy
+from databases import Database
+from .base import Operation
+from .render import Code, call
+
+
+class CreateIndex(Operation):
+    """
+    Create an index. With `concurrently=True` the index is built without
+    blocking writes to the table on PostgreSQL, which means the operation
+    has to run outside of a transaction.
+    """
+
+    def __init__(
+        self, index_name, table_name, columns, unique=False, concurrently=False
+    ):
+        self.index_name = index_name
+        self.table_name = table_name
+        self.columns = columns
+        self.unique = unique
+        self.concurrently = concurrently
+
+    @property
+    def atomic(self) -> bool:
+        return not self.concurrently
+
+    def render(self) -> Code:
+        kwargs = {
+            "index_name": self.index_name,
+            "table_name": self.table_name,
+            "columns": self.columns,
+        }
+        if self.unique:
+            kwargs["unique"] = True
+        if self.concurrently:
+            kwargs["concurrently"] = True
+        return call(f"savannah.{self.__class__.__name__}", **kwargs)
+
+    def get_index(self) -> sqlalchemy.Index:
+        metadata = sqlalchemy.MetaData()
+        table = sqlalchemy.Table(
+            self.table_name,
+            metadata,
+            *[
+                sqlalchemy.Column(name, sqlalchemy.types.NullType)
+                for name in self.columns
+            ],
+        )
+        return sqlalchemy.Index(
+            self.index_name,
+            *[table.c[name] for name in self.columns],
+            unique=self.unique,
+            postgresql_concurrently=self.concurrently,
+        )
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        table = metadata.tables[self.table_name]
+        sqlalchemy.Index(
+            self.index_name,
+            *[table.c[name] for name in self.columns],
+            unique=self.unique,
+        )
+
+    def reverse(self) -> Operation:
+        from .drop_index import DropIndex
+
+        return DropIndex(
+            self.index_name,
+            self.table_name,
+            self.columns,
+            unique=self.unique,
+            concurrently=self.concurrently,
+        )
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        statement = sqlalchemy.schema.CreateIndex(self.get_index())
+        return [statement.compile(dialect=dialect).string.strip()]
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        statement = sqlalchemy.schema.DropIndex(self.get_index())
+        return [statement.compile(dialect=dialect).string.strip()]
+
+    async def upgrade(self, database: Database, dialect) -> None:
+        if not (self.concurrently and _is_postgres(database)):
+            await super().upgrade(database, dialect)
+            return
+
+        # A concurrent build that failed part way through, either in this run
+        # or in an earlier one, leaves an INVALID index behind. Drop it before
+        # building, and again on failure, so that the migration can be retried.
+        await drop_invalid_index(database, self.index_name)
+        try:
+            await super().upgrade(database, dialect)
+        except Exception:
+            await drop_invalid_index(database, self.index_name)
+            raise
+
+
+async def drop_invalid_index(database: Database, index_name: str) -> bool:
+    """
+    Drop the given index if PostgreSQL has it marked as invalid.
+    Returns `True` if an index was dropped.
+    """
+    query = (
+        "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+    )
+    if not await database.fetch_one(query, values={"name": index_name}):
+        return False
+    await database.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+    return True
+
+
+def _is_postgres(database: Database) -> bool:
+    return database.url.dialect in ("postgres", "postgresql")
@@ -1,19 +1,52 @@
-class CreateTable:
-    def __init__(self, table_name, columns):
+from typing import List, Set
+import sqlalchemy
+from .base import Operation
+from .render import (
+    Code,
+    build_table,
+    call,
+    referenced_tables,
+    render_column,
+    render_constraint,
+)
+
+
+class CreateTable(Operation):
+    def __init__(self, table_name, columns, constraints=None):
         self.table_name = table_name
         self.columns = columns
+        self.constraints = [] if constraints is None else constraints
+
+    def render(self) -> Code:
+        kwargs = {
+            "table_name": self.table_name,
+            "columns": [render_column(column) for column in self.columns],
+        }
+        if self.constraints:
+            kwargs["constraints"] = [
+                render_constraint(constraint) for constraint in self.constraints
+            ]
+        return call(f"savannah.{self.__class__.__name__}", **kwargs)
+
+    def get_table(self, metadata: sqlalchemy.MetaData = None) -> sqlalchemy.Table:
+        return build_table(self.table_name, self.columns, metadata, self.constraints)
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        self.get_table(metadata)
 
-    def __repr__(self):
-        class_name = self.__class__.__name__
+    def touched_tables(self) -> Set[str]:
+        return {self.table_name} | referenced_tables(self.columns, self.constraints)
 
-        column_repr = ""
-        for column in self.columns:
-            if column.primary_key:
-                column_repr += f"sqlalchemy.Column({column.name!r}, sqlalchemy.{column.type!r}, primary_key=True), "
-            else:
-                column_repr += (
-                    f"sqlalchemy.Column({column.name!r}, sqlalchemy.{column.type!r}), "
-                )
-        column_repr = column_repr.rstrip(", ")
+    def upgrade_statements(self, dialect) -> List[str]:
+        table = self.get_table()
+        statements = [sqlalchemy.schema.CreateTable(table).compile(dialect=dialect)]
+        for index in sorted(table.indexes, key=lambda index: str(index.name)):
+            statements.append(
+                sqlalchemy.schema.CreateIndex(index).compile(dialect=dialect)
+            )
+        return [statement.string for statement in statements]
 
-        return f"savannah.{class_name}(table_name={self.table_name!r}, columns=[{column_repr}])"
+    def downgrade_statements(self, dialect) -> List[str]:
+        table = self.get_table()
+        statement = sqlalchemy.schema.DropTable(table).compile(dialect=dialect)
+        return [statement.string]
@@ -0,0 +1,33 @@
+from typing import List
+import sqlalchemy
+from .add_column import AddColumn
+
+
+class DropColumn(AddColumn):
+    """
+    Drop a column. The column definition is required so that the operation
+    can be reversed.
+    """
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        table = metadata.tables[self.table_name]
+        column = table.c[self.column.name]
+        table._columns.remove(column)
+        for index in list(table.indexes):
+            if column in index.columns.values():
+                table.indexes.discard(index)
+        for constraint in list(table.constraints):
+            if isinstance(constraint, sqlalchemy.PrimaryKeyConstraint):
+                continue
+            columns = getattr(constraint, "columns", None)
+            if columns is not None and columns.contains_column(column):
+                table.constraints.discard(constraint)
+
+    def reverse(self) -> AddColumn:
+        return AddColumn(self.table_name, self.column)
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return super().downgrade_statements(dialect)
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return super().upgrade_statements(dialect)
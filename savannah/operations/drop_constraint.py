@@ -0,0 +1,29 @@
+from typing import List
+import sqlalchemy
+from .add_constraint import AddConstraint
+
+
+class DropConstraint(AddConstraint):
+    """
+    Drop a named constraint. The constraint definition is required so that
+    the operation can be reversed.
+    """
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        table = metadata.tables[self.table_name]
+        for constraint in list(table.constraints):
+            if constraint.name == self.constraint.name:
+                table.constraints.discard(constraint)
+                if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+                    for element in constraint.elements:
+                        element.parent.foreign_keys.discard(element)
+                    table.foreign_keys.difference_update(constraint.elements)
+
+    def reverse(self) -> AddConstraint:
+        return AddConstraint(self.table_name, self.constraint)
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return super().downgrade_statements(dialect)
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return super().upgrade_statements(dialect)
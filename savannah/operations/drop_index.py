@@ -0,0 +1,42 @@
+from typing import List
+import sqlalchemy
+from .base import Operation
+from .create_index import CreateIndex
+
+
+class DropIndex(CreateIndex):
+    """
+    Drop an index. The index definition is required so that the operation
+    can be reversed. With `concurrently=True` the index is dropped without
+    blocking access to the table on PostgreSQL, outside of a transaction.
+    """
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        table = metadata.tables[self.table_name]
+        for index in list(table.indexes):
+            if index.name == self.index_name:
+                table.indexes.discard(index)
+
+    def reverse(self) -> CreateIndex:
+        return CreateIndex(
+            self.index_name,
+            self.table_name,
+            self.columns,
+            unique=self.unique,
+            concurrently=self.concurrently,
+        )
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return super().downgrade_statements(dialect)
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return super().upgrade_statements(dialect)
+
+    async def upgrade(self, database, dialect) -> None:
+        await Operation.upgrade(self, database, dialect)
+
+    async def downgrade(self, database, dialect) -> None:
+        # Recreating the index goes through `CreateIndex`, with its handling
+        # of concurrent builds. Its `upgrade()` alone would call back into
+        # this class's statements.
+        await self.reverse().upgrade(database, dialect)
@@ -0,0 +1,19 @@
+from typing import List
+import sqlalchemy
+from .create_table import CreateTable
+
+
+class DropTable(CreateTable):
+    """
+    Drop a table. The table definition is required so that the operation
+    can be reversed.
+    """
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        metadata.remove(metadata.tables[self.table_name])
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return super().downgrade_statements(dialect)
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return super().upgrade_statements(dialect)
@@ -0,0 +1,202 @@
+"""
+SQLite cannot alter or drop columns, or add or drop constraints, with
+`ALTER TABLE`. Instead the table is rebuilt: a new table is created with the
+changed definition, the rows are copied across, the old table is dropped,
+and the new one is renamed in its place, before the indexes are recreated.
+
+Each rebuild copies every row, so within a migration all the operations on
+a table are grouped into a single `RebuildTable`, and the table is rebuilt
+once, however many changes are made to it.
+
+The current definition of the table is read from the database, so rebuilds
+can only run against a database, and not be compiled up front. Triggers and
+views on the table, and its generated columns, are not carried over.
+"""
+from typing import List, Optional, Sequence, Set
+import sqlalchemy
+from databases import Database
+from .add_column import AddColumn
+from .add_constraint import AddConstraint
+from .alter_column import AlterColumn
+from .base import Operation
+from .create_index import CreateIndex
+from .drop_column import DropColumn
+from .render import Code, call
+
+# Operations that can be applied as part of a rebuild.
+BATCHED_OPERATIONS = (AddColumn, AlterColumn, AddConstraint, CreateIndex)
+# Operations that SQLite can only apply by rebuilding the table.
+REBUILT_OPERATIONS = (AlterColumn, DropColumn, AddConstraint)
+
+
+class RebuildTable(Operation):
+    """
+    Apply a group of operations to one table by rebuilding it.
+    """
+
+    def __init__(self, table_name: str, operations: List[Operation]) -> None:
+        self.table_name = table_name
+        self.operations = operations
+
+    def render(self) -> Code:
+        return call(
+            f"savannah.operations.rebuild_table.{self.__class__.__name__}",
+            table_name=self.table_name,
+            operations=[operation.render() for operation in self.operations],
+        )
+
+    def state_forwards(self, metadata: sqlalchemy.MetaData) -> None:
+        for operation in self.operations:
+            operation.state_forwards(metadata)
+
+    def reverse(self) -> "RebuildTable":
+        operations = [operation.reverse() for operation in reversed(self.operations)]
+        return RebuildTable(self.table_name, operations)
+
+    def touched_tables(self) -> Set[str]:
+        tables = {self.table_name}
+        for operation in self.operations:
+            tables |= operation.touched_tables()
+        return tables
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        raise Exception(
+            f"Rebuilding table {self.table_name!r} needs its current definition, "
+            "so it can only run against a database."
+        )
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        return self.reverse().upgrade_statements(dialect)
+
+    async def upgrade(self, database: Database, dialect) -> None:
+        from ..introspect import load_database_schema
+
+        metadata = await load_database_schema(database)
+        table = metadata.tables[self.table_name]
+        existing = {column.name for column in table.columns}
+        self.state_forwards(metadata)
+        columns = [
+            column.name
+            for column in table.columns
+            if column.name in existing and column.computed is None
+        ]
+
+        # With foreign keys enforced, dropping the old table would run its
+        # ON DELETE actions against the tables that refer to it.
+        enforced = await database.fetch_val("PRAGMA foreign_keys")
+        if enforced:
+            await database.execute("PRAGMA foreign_keys = OFF")
+            if await database.fetch_val("PRAGMA foreign_keys"):
+                raise Exception(
+                    f"Cannot rebuild table {self.table_name!r} while foreign keys "
+                    "are enforced, since they cannot be turned off inside a "
+                    "transaction. Migrate with atomicity 'none', or with foreign "
+                    "keys turned off."
+                )
+        try:
+            for statement in rebuild_table_statements(table, columns, dialect):
+                await database.execute(statement)
+            if enforced:
+                violation = await database.fetch_one(
+                    "SELECT * FROM pragma_foreign_key_check(:table)",
+                    values={"table": self.table_name},
+                )
+                if violation is not None:
+                    raise Exception(
+                        f"Rebuilding table {self.table_name!r} left rows that "
+                        "violate its foreign keys."
+                    )
+        finally:
+            if enforced:
+                await database.execute("PRAGMA foreign_keys = ON")
+
+    async def downgrade(self, database: Database, dialect) -> None:
+        await self.reverse().upgrade(database, dialect)
+
+
+def rebuild_table_statements(
+    table: sqlalchemy.Table, columns: Sequence[str], dialect
+) -> List[str]:
+    """
+    The statements that rebuild `table` with its definition as given,
+    copying the named `columns` across from the table as it exists.
+    """
+    preparer = dialect.identifier_preparer
+    name = preparer.quote(table.name)
+    rebuilt_name = preparer.quote(f"_savannah_rebuild_{table.name}")
+    # The definition is compiled under the new table's name. Copying the
+    # table would lose changes made to its columns after they were created.
+    original_name = table.name
+    table.name = f"_savannah_rebuild_{table.name}"
+    try:
+        create = sqlalchemy.schema.CreateTable(table).compile(dialect=dialect)
+    finally:
+        table.name = original_name
+
+    statements = [create.string.strip()]
+    if columns:
+        names = ", ".join(preparer.quote(column) for column in columns)
+        statements.append(
+            f"INSERT INTO {rebuilt_name} ({names}) SELECT {names} FROM {name}"
+        )
+    statements.append(f"DROP TABLE {name}")
+    statements.append(f"ALTER TABLE {rebuilt_name} RENAME TO {name}")
+    for index in sorted(table.indexes, key=lambda index: str(index.name)):
+        statement = sqlalchemy.schema.CreateIndex(index).compile(dialect=dialect)
+        statements.append(statement.string.strip())
+    return statements
+
+
+def requires_rebuild(operations: Sequence[Operation], dialect) -> bool:
+    """
+    Whether any of the operations can only be applied by rebuilding a table.
+    """
+    return dialect.name == "sqlite" and any(
+        isinstance(operation, REBUILT_OPERATIONS) for operation in operations
+    )
+
+
+def batch_operations(
+    operations: Sequence[Operation], dialect, reverse: bool = False
+) -> List[Operation]:
+    """
+    Return the operations in the order that they run, with the operations
+    on each table that SQLite has to rebuild grouped into a `RebuildTable`.
+    With `reverse=True` that is the order in which they are undone.
+
+    Each group is run in the place of its first operation. A group is closed
+    by any other operation that touches its table, such as a `Backfill`,
+    and all groups are closed by operations that could touch any table.
+    """
+    operations = list(reversed(operations) if reverse else operations)
+    if not requires_rebuild(operations, dialect):
+        return operations
+
+    steps: list = []
+    groups = {}
+    for operation in operations:
+        touched: Optional[Set[str]] = operation.touched_tables()
+        if touched is None:
+            groups.clear()
+            steps.append(operation)
+        elif isinstance(operation, BATCHED_OPERATIONS):
+            if operation.table_name not in groups:
+                groups[operation.table_name] = []
+                steps.append(groups[operation.table_name])
+            groups[operation.table_name].append(operation)
+        else:
+            for table_name in touched:
+                groups.pop(table_name, None)
+            steps.append(operation)
+
+    batched = []
+    for step in steps:
+        if not isinstance(step, list):
+            batched.append(step)
+        elif requires_rebuild(step, dialect):
+            # A group is always held in the order that it is applied.
+            group = step[::-1] if reverse else step
+            batched.append(RebuildTable(group[0].table_name, group))
+        else:
+            batched.extend(step)
+    return batched
@@ -0,0 +1,329 @@
+"""
+Helpers for rendering schema objects as the Python source that appears in
+migration files, and for building the throwaway tables that operations use
+when compiling their statements.
+"""
+import sqlalchemy
+
+
+class Code:
+    """
+    The Python source for a value in a migration file.
+
+    Calls and collections are kept as trees, so that a writer can lay them
+    out across lines as needed, while `str()` gives the source on a single
+    line, as used by the `repr()` of operations.
+    """
+
+    def source(self, double_quotes: bool = False) -> str:
+        raise NotImplementedError()
+
+    def __str__(self) -> str:
+        return self.source()
+
+
+class Literal(Code):
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def source(self, double_quotes: bool = False) -> str:
+        text = repr(self.value)
+        if (
+            double_quotes
+            and isinstance(self.value, str)
+            and text.startswith("'")
+            and '"' not in self.value
+        ):
+            return f'"{text[1:-1]}"'
+        return text
+
+
+class Raw(Code):
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def source(self, double_quotes: bool = False) -> str:
+        return self.text
+
+
+class Keyword(Code):
+    """
+    A keyword argument, `name=value`, or a dictionary entry, `key: value`.
+    """
+
+    def __init__(self, key: Code, separator: str, value: Code) -> None:
+        self.key = key
+        self.separator = separator
+        self.value = value
+
+    def prefix(self, double_quotes: bool = False) -> str:
+        return f"{self.key.source(double_quotes)}{self.separator}"
+
+    def source(self, double_quotes: bool = False) -> str:
+        return f"{self.prefix(double_quotes)}{self.value.source(double_quotes)}"
+
+
+class Bracket(Code):
+    """
+    A call or a collection, with the items between its brackets.
+    """
+
+    def __init__(
+        self, opener: str, items: list, closer: str, is_tuple: bool = False
+    ) -> None:
+        self.opener = opener
+        self.items = items
+        self.closer = closer
+        self.is_tuple = is_tuple
+
+    def body(self, double_quotes: bool = False) -> str:
+        body = ", ".join(item.source(double_quotes) for item in self.items)
+        # A tuple of one needs its comma.
+        if self.is_tuple and len(self.items) == 1:
+            body += ","
+        return body
+
+    def source(self, double_quotes: bool = False) -> str:
+        return f"{self.opener}{self.body(double_quotes)}{self.closer}"
+
+
+def code(value) -> Code:
+    """
+    Return the source for a value, which may already be `Code`.
+    """
+    if isinstance(value, Code):
+        return value
+    elif isinstance(value, list):
+        return Bracket("[", [code(item) for item in value], "]")
+    elif isinstance(value, tuple):
+        return Bracket("(", [code(item) for item in value], ")", is_tuple=True)
+    elif isinstance(value, dict):
+        items = [Keyword(code(key), ": ", code(item)) for key, item in value.items()]
+        return Bracket("{", items, "}")
+    return Literal(value)
+
+
+def call(function: str, *args, **kwargs) -> Bracket:
+    items = [code(arg) for arg in args]
+    items.extend(Keyword(Raw(name), "=", code(value)) for name, value in kwargs.items())
+    return Bracket(f"{function}(", items, ")")
+
+
+def render_type(type_) -> Code:
+    return Raw(f"sqlalchemy.{type_!r}")
+
+
+def render_column(column: sqlalchemy.Column) -> Code:
+    args = [column.name, render_type(column.type)]
+    for foreign_key in sorted(column.foreign_keys, key=lambda fk: fk.target_fullname):
+        # Composite foreign keys are rendered as table constraints instead.
+        if foreign_key.constraint is None or len(foreign_key.constraint.elements) == 1:
+            args.append(render_foreign_key(foreign_key))
+    if column.computed is not None:
+        args.append(render_computed(column.computed))
+    if column.identity is not None:
+        args.append(render_identity(column.identity))
+
+    kwargs = {}
+    if column.primary_key:
+        kwargs["primary_key"] = True
+    if column.nullable != (not column.primary_key):
+        kwargs["nullable"] = column.nullable
+    # Computed and identity columns hold those as their server defaults.
+    if (
+        column.server_default is not None
+        and column.computed is None
+        and column.identity is None
+    ):
+        kwargs["server_default"] = render_default(column.server_default)
+    if column.autoincrement != "auto":
+        kwargs["autoincrement"] = column.autoincrement
+    if column.unique:
+        kwargs["unique"] = True
+    if column.index:
+        kwargs["index"] = True
+    for option in ("default", "onupdate"):
+        value = getattr(column, option)
+        # Only plain values can be written out. Defaults computed by
+        # Python functions or SQL expressions are left to the model.
+        if value is not None and value.is_scalar:
+            if isinstance(value.arg, (str, int, float, bool)):
+                kwargs[option] = value.arg
+    if getattr(column.server_onupdate, "arg", None) is not None:
+        kwargs["server_onupdate"] = render_default(column.server_onupdate)
+    if column.comment is not None:
+        kwargs["comment"] = column.comment
+    if column.key != column.name:
+        kwargs["key"] = column.key
+    if getattr(column.name, "quote", None) is not None:
+        kwargs["quote"] = column.name.quote
+    return call("sqlalchemy.Column", *args, **kwargs)
+
+
+def render_foreign_key(foreign_key: sqlalchemy.ForeignKey) -> Code:
+    kwargs = {}
+    for option in ("name", "ondelete", "onupdate"):
+        value = getattr(foreign_key, option)
+        if value is not None:
+            kwargs[option] = value
+    return call("sqlalchemy.ForeignKey", foreign_key.target_fullname, **kwargs)
+
+
+def render_computed(computed: sqlalchemy.Computed) -> Code:
+    kwargs = {}
+    if computed.persisted is not None:
+        kwargs["persisted"] = computed.persisted
+    return call("sqlalchemy.Computed", str(computed.sqltext), **kwargs)
+
+
+def render_identity(identity: sqlalchemy.Identity) -> Code:
+    kwargs = {}
+    if identity.always:
+        kwargs["always"] = True
+    for option in (
+        "on_null",
+        "start",
+        "increment",
+        "minvalue",
+        "maxvalue",
+        "nominvalue",
+        "nomaxvalue",
+        "cycle",
+        "cache",
+        "order",
+    ):
+        value = getattr(identity, option)
+        if value is not None:
+            kwargs[option] = value
+    return call("sqlalchemy.Identity", **kwargs)
+
+
+def render_default(default) -> Code:
+    arg = getattr(default, "arg", default)
+    if isinstance(arg, sqlalchemy.sql.elements.TextClause):
+        return call("sqlalchemy.text", arg.text)
+    if isinstance(arg, sqlalchemy.sql.ClauseElement):
+        # SQL expressions, such as `func.now()`, are written out as the SQL
+        # that they compile to, rather than as a string literal.
+        compiled = arg.compile(compile_kwargs={"literal_binds": True})
+        return call("sqlalchemy.text", str(compiled))
+    return Literal(str(arg))
+
+
+def render_constraint(constraint: sqlalchemy.Constraint) -> Code:
+    kwargs = {"name": constraint.name} if constraint.name else {}
+    if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+        columns = constraint_columns(constraint)
+        targets = [element.target_fullname for element in constraint.elements]
+        for option in ("ondelete", "onupdate"):
+            value = getattr(constraint, option)
+            if value is not None:
+                kwargs[option] = value
+        return call("sqlalchemy.ForeignKeyConstraint", columns, targets, **kwargs)
+    elif isinstance(constraint, sqlalchemy.UniqueConstraint):
+        columns = constraint_columns(constraint)
+        return call("sqlalchemy.UniqueConstraint", *columns, **kwargs)
+    elif isinstance(constraint, sqlalchemy.CheckConstraint):
+        return call("sqlalchemy.CheckConstraint", str(constraint.sqltext), **kwargs)
+    raise ValueError(f"Cannot render constraint {constraint!r}.")
+
+
+def constraint_columns(constraint: sqlalchemy.Constraint) -> list:
+    """
+    The names of the columns of a constraint, whether or not it is attached
+    to a table. Constraints in migration files name their columns, which
+    are only resolved once the constraint is attached.
+    """
+    if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+        return list(constraint.column_keys)
+    if len(constraint.columns) == 0:
+        return [
+            column if isinstance(column, str) else column.name
+            for column in getattr(constraint, "_pending_colargs", ())
+        ]
+    return [column.name for column in constraint.columns]
+
+
+def copy_constraint(constraint: sqlalchemy.Constraint) -> sqlalchemy.Constraint:
+    """
+    Return an unattached copy of a constraint, which can be attached to any
+    table with the same column names. SQLAlchemy's own copies lose the
+    columns of constraints that are not attached to a table.
+    """
+    kwargs = {"name": constraint.name}
+    if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+        targets = [element.target_fullname for element in constraint.elements]
+        return sqlalchemy.ForeignKeyConstraint(
+            constraint_columns(constraint),
+            targets,
+            ondelete=constraint.ondelete,
+            onupdate=constraint.onupdate,
+            **kwargs,
+        )
+    elif isinstance(constraint, sqlalchemy.UniqueConstraint):
+        return sqlalchemy.UniqueConstraint(*constraint_columns(constraint), **kwargs)
+    return constraint.copy()
+
+
+def referenced_tables(columns: list = (), constraints: list = ()) -> set:
+    """
+    The names of the tables referenced by foreign keys on the given columns
+    and constraints.
+    """
+    targets = [
+        foreign_key.target_fullname
+        for column in columns
+        for foreign_key in column.foreign_keys
+    ]
+    for constraint in constraints:
+        if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+            targets.extend(element.target_fullname for element in constraint.elements)
+    return {target.rpartition(".")[0] for target in targets}
+
+
+def build_table(
+    table_name: str,
+    columns: list,
+    metadata: sqlalchemy.MetaData = None,
+    constraints: list = (),
+) -> sqlalchemy.Table:
+    """
+    Build a table from copies of the given columns. Columns can only be
+    attached to a single table, so this is done afresh each time.
+
+    When no metadata is given, the table is only needed for compiling
+    statements. In that case placeholder tables are added for anything the
+    columns reference, since foreign key DDL needs to resolve its targets.
+    """
+    compiling = metadata is None
+    if compiling:
+        metadata = sqlalchemy.MetaData()
+    columns = [column.copy() for column in columns]
+    constraints = [copy_constraint(constraint) for constraint in constraints]
+    if compiling:
+        for column in columns:
+            for foreign_key in column.foreign_keys:
+                add_referenced_table(metadata, foreign_key.target_fullname)
+        for constraint in constraints:
+            if isinstance(constraint, sqlalchemy.ForeignKeyConstraint):
+                for element in constraint.elements:
+                    add_referenced_table(metadata, element.target_fullname)
+    return sqlalchemy.Table(table_name, metadata, *columns, *constraints)
+
+
+def add_referenced_table(metadata: sqlalchemy.MetaData, target: str) -> None:
+    table_key, _, column_name = target.rpartition(".")
+    if table_key in metadata.tables:
+        table = metadata.tables[table_key]
+        if column_name not in table.c:
+            table.append_column(
+                sqlalchemy.Column(column_name, sqlalchemy.types.NullType)
+            )
+        return
+    schema, _, table_name = table_key.rpartition(".")
+    sqlalchemy.Table(
+        table_name,
+        metadata,
+        sqlalchemy.Column(column_name, sqlalchemy.types.NullType),
+        schema=schema or None,
+    )
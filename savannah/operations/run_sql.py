@@ -0,0 +1,38 @@
+from typing import List, Union
+from .base import Operation
+from .render import Code, call
+
+
+class RunSQL(Operation):
+    """
+    Run raw SQL. Statements such as `ALTER TYPE ... ADD VALUE` on PostgreSQL
+    cannot run inside a transaction, and should pass `atomic=False`.
+    """
+
+    def __init__(
+        self,
+        sql: Union[str, List[str]],
+        reverse_sql: Union[str, List[str]] = None,
+        atomic: bool = True,
+    ):
+        self.sql = sql
+        self.reverse_sql = reverse_sql
+        self.atomic = atomic
+
+    def render(self) -> Code:
+        kwargs = {"sql": self.sql}
+        if self.reverse_sql is not None:
+            kwargs["reverse_sql"] = self.reverse_sql
+        if not self.atomic:
+            kwargs["atomic"] = False
+        return call(f"savannah.{self.__class__.__name__}", **kwargs)
+
+    def upgrade_statements(self, dialect) -> List[str]:
+        return [self.sql] if isinstance(self.sql, str) else list(self.sql)
+
+    def downgrade_statements(self, dialect) -> List[str]:
+        if self.reverse_sql is None:
+            raise Exception(f"{self!r} is not reversible.")
+        if isinstance(self.reverse_sql, str):
+            return [self.reverse_sql]
+        return list(self.reverse_sql)
@@ -0,0 +1,159 @@
+"""
+This module applies migrations in parallel.
+
+Migrations on independent branches of the graph do not depend on each other,
+so they may be applied at the same time. Each migration is started once the
+dependencies that are part of the run have completed, as long as no running
+migration touches any of the same tables. Migrations whose tables are not
+known, such as those that run custom code, run on their own.
+
+Every migration runs on a connection of its own, taken from a pool of at
+most `concurrency` connections, and is recorded in the migrations table as
+soon as it completes. SQLite only allows a single writer, so there the
+migrations are applied one at a time.
+"""
+from typing import Dict, List, Optional, Sequence, Set
+import asyncio
+from databases import Database
+from .executor import _run_sequential
+from .instrumentation import Instrument, InstrumentedDatabase
+from .timeouts import Timeouts
+
+
+class ParallelScheduler:
+    """
+    Decides which migrations may start, given the ones that are running.
+    """
+
+    def __init__(self, migrations: list, concurrency: int) -> None:
+        names = {migration.name for migration in migrations}
+        self.concurrency = concurrency
+        self.pending = list(migrations)
+        self.waiting_on: Dict[str, Set[str]] = {
+            migration.name: set(migration.dependencies) & names
+            for migration in migrations
+        }
+        self.dependants: Dict[str, List[str]] = {
+            migration.name: list(migration.dependants) for migration in migrations
+        }
+        self.tables: Dict[str, Optional[Set[str]]] = {
+            migration.name: migration.load().touched_tables for migration in migrations
+        }
+        self.running: Dict[str, Optional[Set[str]]] = {}
+
+    @property
+    def is_finished(self) -> bool:
+        return not self.pending and not self.running
+
+    def can_start(self, name: str) -> bool:
+        if self.waiting_on[name]:
+            return False
+        tables = self.tables[name]
+        if tables is None:
+            return not self.running
+        return all(
+            other is not None and not (tables & other)
+            for other in self.running.values()
+        )
+
+    def start_ready(self) -> list:
+        """
+        Mark the migrations that can start now as running, and return them,
+        in the order of the graph.
+        """
+        started = []
+        for migration in list(self.pending):
+            if len(self.running) >= self.concurrency:
+                break
+            name = migration.name
+            if not self.can_start(name):
+                # A migration that needs the database to itself would never
+                # get it if later migrations kept starting ahead of it.
+                if not self.waiting_on[name] and self.tables[name] is None:
+                    break
+                continue
+            self.pending.remove(migration)
+            self.running[name] = self.tables[name]
+            started.append(migration)
+        return started
+
+    def complete(self, name: str) -> None:
+        del self.running[name]
+        for dependant in self.dependants[name]:
+            if dependant in self.waiting_on:
+                self.waiting_on[dependant].discard(name)
+
+
+async def apply_parallel(
+    database: Database,
+    migrations: list,
+    concurrency: int,
+    instruments: Sequence[Instrument] = (),
+    atomicity: str = "per-migration",
+    timeouts: Optional[Timeouts] = None,
+) -> None:
+    """
+    Apply the given migrations, which are in the order of the graph, running
+    up to `concurrency` of them at once.
+
+    If a migration fails, no further migrations are started. The ones that
+    are already running are allowed to complete, and the first error is
+    then raised.
+    """
+    timeouts = Timeouts() if timeouts is None else timeouts
+    if database.url.dialect == "sqlite":
+        await _apply_scheduled(
+            database, migrations, 1, instruments, atomicity, timeouts
+        )
+        return
+
+    # Connections are tracked per task on each `Database`, and tasks inherit
+    # the connection of the task that created them, so the workers use a
+    # `Database` of their own, on which the caller holds no connection.
+    options = {**database.options, "min_size": 1, "max_size": concurrency}
+    async with Database(database.url, **options) as pool:
+        await _apply_scheduled(
+            pool, migrations, concurrency, instruments, atomicity, timeouts
+        )
+
+
+async def _apply_scheduled(
+    database: Database,
+    migrations: list,
+    concurrency: int,
+    instruments: Sequence[Instrument],
+    atomicity: str,
+    timeouts: Timeouts,
+) -> None:
+    scheduler = ParallelScheduler(migrations, concurrency)
+
+    async def apply(migration) -> None:
+        worker = InstrumentedDatabase(database, instruments)
+        if atomicity != "none" and migration.load().is_atomic:
+            async with worker.transaction():
+                await _run_sequential(worker, [(migration, True)], timeouts, True)
+        else:
+            await _run_sequential(worker, [(migration, True)], timeouts, False)
+
+    tasks: Dict[asyncio.Task, str] = {}
+    error: Optional[BaseException] = None
+    try:
+        while not scheduler.is_finished:
+            if error is None:
+                for migration in scheduler.start_ready():
+                    tasks[asyncio.create_task(apply(migration))] = migration.name
+            if not tasks:
+                break
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                scheduler.complete(tasks.pop(task))
+                if error is None and task.exception() is not None:
+                    error = task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+    if error is not None:
+        raise error
@@ -0,0 +1,67 @@
+"""
+Pytest fixtures for tests that need a migrated database.
+
+Enable them in `conftest.py`:
+
+    pytest_plugins = ["savannah.pytest_plugin"]
+
+And configure the database in the pytest configuration:
+
+    [pytest]
+    savannah_database_url = postgresql://localhost/myapp_test
+    savannah_migrations_dir = migrations
+    savannah_pool_size = 4
+
+If `savannah_database_url` is not set, the `DATABASE_URL` environment
+variable is used. Each test that takes the `savannah_database` fixture is
+given the URL of a migrated database of its own, cloned from a template, as
+described in `savannah.testing`. Under pytest-xdist, each worker keeps a
+pool of its own.
+"""
+import asyncio
+import os
+import pytest
+from .testing import DatabasePool
+
+
+def pytest_addoption(parser) -> None:
+    parser.addini(
+        "savannah_database_url", "The URL that test databases are named after."
+    )
+    parser.addini(
+        "savannah_migrations_dir", "The migrations package.", default="migrations"
+    )
+    parser.addini(
+        "savannah_pool_size", "The number of databases to keep ready.", default="4"
+    )
+
+
+@pytest.fixture(scope="session")
+def savannah_database_pool(request):
+    config = request.config
+    url = config.getini("savannah_database_url") or os.environ.get("DATABASE_URL")
+    if not url:
+        raise pytest.UsageError(
+            "Set 'savannah_database_url' in the pytest configuration, "
+            "or DATABASE_URL in the environment."
+        )
+
+    pool = DatabasePool(
+        url,
+        dir=config.getini("savannah_migrations_dir"),
+        size=int(config.getini("savannah_pool_size")),
+        name=os.environ.get("PYTEST_XDIST_WORKER", "main"),
+    )
+    asyncio.run(pool.prepare())
+    yield pool
+    asyncio.run(pool.close())
+
+
+@pytest.fixture
+def savannah_database(savannah_database_pool):
+    """
+    The URL of a migrated database, which is dropped after the test.
+    """
+    url = asyncio.run(savannah_database_pool.acquire())
+    yield url
+    asyncio.run(savannah_database_pool.release(url))
@@ -0,0 +1,122 @@
+"""
+This module computes the schema state at the head of the migration history,
+for use as the "from" state when generating a new migration.
+
+Rather than replaying every operation in every migration, we keep a cache of
+serialized schema snapshots, keyed by a hash of the migration's source
+together with the sources of all of its ancestors. Computing the state is
+then one snapshot load, plus replaying the few migrations written since.
+"""
+from typing import Dict, Iterable, Set
+import hashlib
+import os
+import pickle
+import zlib
+import sqlalchemy
+from .graph import MigrationGraph
+
+SNAPSHOT_DIR = os.path.join("__pycache__", "savannah", "snapshots")
+# Raised by snapshots that are truncated, or that were pickled by a version
+# of SQLAlchemy whose classes have since moved or changed.
+SNAPSHOT_ERRORS = (
+    OSError,
+    EOFError,
+    zlib.error,
+    pickle.UnpicklingError,
+    AttributeError,
+    ImportError,
+)
+
+
+def compute_state_hashes(graph: MigrationGraph) -> Dict[str, str]:
+    """
+    Return a hash for each migration that identifies the schema state after
+    it has been applied. The hash covers the content of the migration and,
+    transitively, of every migration it depends on.
+    """
+    state_hashes = {}
+    for migration in graph:
+        digest = hashlib.sha256(migration.hash.encode("ascii"))
+        for dependency in graph.dependencies[migration.name]:
+            digest.update(state_hashes[dependency].encode("ascii"))
+        state_hashes[migration.name] = digest.hexdigest()
+    return state_hashes
+
+
+def load_state(graph: MigrationGraph, dir_name: str) -> sqlalchemy.MetaData:
+    """
+    Return the schema state after every migration in the graph has been applied.
+    """
+    state_hashes = compute_state_hashes(graph)
+    available = _available_snapshots(dir_name)
+
+    # Start from the most recent migration that has a snapshot, if any.
+    metadata = sqlalchemy.MetaData()
+    covered = set()
+    for name in reversed(graph.order):
+        if state_hashes[name] not in available:
+            continue
+        try:
+            metadata = read_snapshot(dir_name, state_hashes[name])
+        except SNAPSHOT_ERRORS:
+            # Snapshots are only a cache, so one that cannot be read is
+            # removed, and we look further back instead.
+            _remove_snapshot(dir_name, state_hashes[name])
+            continue
+        covered = graph.ancestors(name) | {name}
+        break
+
+    remaining = [migration for migration in graph if migration.name not in covered]
+    for migration in remaining:
+        apply_operations(metadata, migration.load().operations)
+
+    if remaining and len(graph.leaves) == 1:
+        write_snapshot(dir_name, state_hashes[graph.leaves[0]], metadata)
+    return metadata
+
+
+def apply_operations(metadata: sqlalchemy.MetaData, operations: Iterable) -> None:
+    for operation in operations:
+        operation.state_forwards(metadata)
+
+
+def read_snapshot(dir_name: str, state_hash: str) -> sqlalchemy.MetaData:
+    with open(_snapshot_path(dir_name, state_hash), "rb") as fin:
+        return pickle.loads(zlib.decompress(fin.read()))
+
+
+def write_snapshot(dir_name: str, state_hash: str, metadata: sqlalchemy.MetaData):
+    path = _snapshot_path(dir_name, state_hash)
+    data = zlib.compress(pickle.dumps(metadata, protocol=pickle.HIGHEST_PROTOCOL))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "wb") as fout:
+            fout.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        # Snapshots are only a cache, so failing to write one is not an error.
+        pass
+
+
+def _available_snapshots(dir_name: str) -> Set[str]:
+    try:
+        filenames = os.listdir(os.path.join(dir_name, SNAPSHOT_DIR))
+    except OSError:
+        return set()
+    return {
+        filename[: -len(".pickle")]
+        for filename in filenames
+        if filename.endswith(".pickle")
+    }
+
+
+def _remove_snapshot(dir_name: str, state_hash: str) -> None:
+    try:
+        os.remove(_snapshot_path(dir_name, state_hash))
+    except OSError:
+        pass
+
+
+def _snapshot_path(dir_name: str, state_hash: str) -> str:
+    return os.path.join(dir_name, SNAPSHOT_DIR, f"{state_hash}.pickle")
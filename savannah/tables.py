@@ -2,11 +2,32 @@
 This module holds the database schema for the migrations table, as well
 as functions encapsulating all the database operations that we perform
 against the table.
+
+Alongside each migration name we record when it was applied, how long it
+took, how many statements it ran, and a checksum of its source. Tables
+created by earlier versions are upgraded in place, by adding the missing
+columns.
+
+A fingerprint of the applied migration names is kept in a table of its own,
+so that checking whether the database is up to date takes a single small
+query, however long the history.
+
+It also holds the checkpoints table, which records the progress of
+long-running data migrations, so that they can resume after an interruption.
 """
-from typing import Set
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
 import sqlalchemy
 from databases import Database, DatabaseURL
 
+# The SQLSTATE that PostgreSQL raises for a table that does not exist.
+POSTGRES_UNDEFINED_TABLE = "42P01"
+# The error code that MySQL raises for a table that does not exist.
+MYSQL_NO_SUCH_TABLE = 1146
 
 metadata = sqlalchemy.MetaData()
 
@@ -15,6 +36,27 @@ migrations = sqlalchemy.Table(
     metadata,
     sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=True),
     sqlalchemy.Column("name", sqlalchemy.String(length=100), index=True),
+    sqlalchemy.Column("applied_at", sqlalchemy.DateTime, nullable=True),
+    sqlalchemy.Column("duration", sqlalchemy.Float, nullable=True),
+    sqlalchemy.Column("statements", sqlalchemy.Integer, nullable=True),
+    sqlalchemy.Column("checksum", sqlalchemy.String(length=64), nullable=True),
+)
+
+DETAIL_COLUMNS = ("applied_at", "duration", "statements", "checksum")
+
+fingerprints = sqlalchemy.Table(
+    "migration_fingerprint",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("digest", sqlalchemy.String(length=64)),
+    sqlalchemy.Column("count", sqlalchemy.Integer),
+)
+
+checkpoints = sqlalchemy.Table(
+    "migration_checkpoints",
+    metadata,
+    sqlalchemy.Column("name", sqlalchemy.String(length=200), primary_key=True),
+    sqlalchemy.Column("last_key", sqlalchemy.Text),
 )
 
 
@@ -31,26 +73,57 @@ async def db_load_migrations_table(database: Database) -> Set[str]:
     return set([record["name"] for record in records])
 
 
+async def db_load_migration_details(database: Database) -> Dict[str, dict]:
+    """
+    Load the timings and checksums recorded for each applied migration.
+    Tables that have not been upgraded yet have no details to report.
+    """
+    has_migrations_table = await _has_table(database, "migrations")
+    if not has_migrations_table:
+        return {}
+
+    existing = await _table_columns(database, "migrations")
+    columns = [column for column in migrations.columns if column.name in existing]
+    query = sqlalchemy.sql.select(columns).order_by(migrations.c.id)
+    records = await database.fetch_all(query)
+    details = {}
+    for record in records:
+        values = {column.name: record[column.name] for column in columns}
+        for column in DETAIL_COLUMNS:
+            values.setdefault(column, None)
+        details[values.pop("name")] = values
+    return details
+
+
 async def db_create_migrations_table_if_not_exists(database: Database) -> None:
     """
-    Create the migrations table if needed.
+    Create the migrations table if needed, or add any columns that are
+    missing from a table created by an earlier version.
     """
     has_migrations_table = await _has_table(database, "migrations")
+    dialect = _get_dialect(str(database.url))
     if has_migrations_table:
+        existing = await _table_columns(database, "migrations")
+        compiler = dialect.ddl_compiler(dialect, None)
+        for name in DETAIL_COLUMNS:
+            if name not in existing:
+                spec = compiler.get_column_specification(migrations.c[name])
+                await database.execute(f"ALTER TABLE migrations ADD COLUMN {spec}")
         return
 
-    dialect = _get_dialect(str(database.url))
     ddl = sqlalchemy.schema.CreateTable(migrations)
     statement = ddl.compile(dialect=dialect).string
     await database.execute(statement)
 
 
-async def db_apply_migration(database: Database, name: str) -> None:
+async def db_apply_migration(database: Database, name: str, **details) -> None:
     """
     Persist a migration record to the database.
+
+    Any of `duration`, `statements` and `checksum` may be given as details.
     """
     query = migrations.insert()
-    await database.execute(query, values={"name": name})
+    await database.execute(query, values=migration_values(name, **details))
 
 
 async def db_unapply_migration(database: Database, name: str) -> None:
@@ -61,6 +134,174 @@ async def db_unapply_migration(database: Database, name: str) -> None:
     await database.execute(query)
 
 
+async def db_apply_migrations(
+    database: Database, names: List[str], details: Dict[str, dict] = None
+) -> None:
+    """
+    Persist several migration records to the database, in a single statement.
+    """
+    if names:
+        details = {} if details is None else details
+        values = [migration_values(name, **details.get(name, {})) for name in names]
+        query = migrations.insert()
+        await database.execute_many(query, values=values)
+
+
+async def db_unapply_migrations(database: Database, names: List[str]) -> None:
+    """
+    Remove several migration records from the database, in a single statement.
+    """
+    if names:
+        query = migrations.delete().where(migrations.c.name.in_(names))
+        await database.execute(query)
+
+
+def migration_values(
+    name: str, duration: float = None, statements: int = None, checksum: str = None
+) -> dict:
+    return {
+        "name": name,
+        "applied_at": datetime.datetime.utcnow(),
+        "duration": duration,
+        "statements": statements,
+        "checksum": checksum,
+    }
+
+
+def migrations_digest(names: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(names)).encode("utf-8")).hexdigest()
+
+
+async def db_load_fingerprint(database: Database) -> Optional[Tuple[str, int]]:
+    """
+    Return the stored digest of the applied migration names, or `None` if
+    there is no fingerprint, or it is out of step with the migrations table.
+
+    This is a single query. If the tables do not exist yet, there is no
+    fingerprint, but any other error, such as a lost connection, is raised.
+    """
+    count = sqlalchemy.sql.select([sqlalchemy.func.count()]).select_from(migrations)
+    query = sqlalchemy.sql.select(
+        [fingerprints.c.digest, fingerprints.c.count, count.scalar_subquery()]
+    ).where(fingerprints.c.id == 1)
+    try:
+        record = await database.fetch_one(query)
+    except Exception as error:
+        if not _is_undefined_table(error):
+            raise
+        return None
+    if record is None or record[1] != record[2]:
+        return None
+    return record[0], record[1]
+
+
+async def db_save_fingerprint(database: Database) -> None:
+    """
+    Store the digest of the currently applied migration names.
+    """
+    has_fingerprint_table = await _has_table(database, "migration_fingerprint")
+    if not has_fingerprint_table:
+        dialect = _get_dialect(str(database.url))
+        ddl = sqlalchemy.schema.CreateTable(fingerprints)
+        await database.execute(ddl.compile(dialect=dialect).string)
+
+    query = sqlalchemy.sql.select([migrations.c.name])
+    names = [record["name"] for record in await database.fetch_all(query)]
+    values = {"id": 1, "digest": migrations_digest(names), "count": len(names)}
+    async with database.transaction():
+        await database.execute(fingerprints.delete())
+        await database.execute(fingerprints.insert(), values=values)
+
+
+async def db_load_checkpoint(database: Database, name: str) -> Optional[Any]:
+    """
+    Return the last key processed by the named data migration, if any.
+    """
+    has_checkpoints_table = await _has_table(database, "migration_checkpoints")
+    if not has_checkpoints_table:
+        return None
+
+    query = sqlalchemy.sql.select([checkpoints.c.last_key]).where(
+        checkpoints.c.name == name
+    )
+    record = await database.fetch_one(query)
+    return None if record is None else decode_key(json.loads(record["last_key"]))
+
+
+async def db_save_checkpoint(database: Database, name: str, last_key: Any) -> None:
+    """
+    Record the last key processed by the named data migration.
+    """
+    await db_clear_checkpoint(database, name)
+    query = checkpoints.insert()
+    values = {"name": name, "last_key": json.dumps(encode_key(last_key))}
+    await database.execute(query, values=values)
+
+
+# Keys that JSON cannot hold are stored as a tagged string, and turned back
+# into the same type when loaded.
+KEY_TYPES = {
+    "uuid": (uuid.UUID, str, uuid.UUID),
+    "datetime": (
+        datetime.datetime,
+        datetime.datetime.isoformat,
+        datetime.datetime.fromisoformat,
+    ),
+    "date": (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    "time": (datetime.time, datetime.time.isoformat, datetime.time.fromisoformat),
+    "decimal": (decimal.Decimal, str, decimal.Decimal),
+    "bytes": (bytes, bytes.hex, bytes.fromhex),
+}
+
+
+def encode_key(key: Any) -> Any:
+    for name, (type_, encode, _) in KEY_TYPES.items():
+        if isinstance(key, type_):
+            return {"type": name, "value": encode(key)}
+    return key
+
+
+def decode_key(data: Any) -> Any:
+    if isinstance(data, dict):
+        _, _, decode = KEY_TYPES[data["type"]]
+        return decode(data["value"])
+    return data
+
+
+async def db_clear_checkpoint(database: Database, name: str) -> None:
+    """
+    Remove the checkpoint for a data migration that has completed.
+    """
+    query = checkpoints.delete().where(checkpoints.c.name == name)
+    await database.execute(query)
+
+
+async def db_create_checkpoints_table_if_not_exists(database: Database) -> None:
+    """
+    Create the checkpoints table if needed.
+    """
+    has_checkpoints_table = await _has_table(database, "migration_checkpoints")
+    if has_checkpoints_table:
+        return
+
+    dialect = _get_dialect(str(database.url))
+    ddl = sqlalchemy.schema.CreateTable(checkpoints)
+    statement = ddl.compile(dialect=dialect).string
+    await database.execute(statement)
+
+
+def _is_undefined_table(error: BaseException) -> bool:
+    # asyncpg sets `sqlstate`, and psycopg2 sets `pgcode`.
+    for attribute in ("sqlstate", "pgcode"):
+        if getattr(error, attribute, None) == POSTGRES_UNDEFINED_TABLE:
+            return True
+    args = getattr(error, "args", ())
+    if args and args[0] == MYSQL_NO_SUCH_TABLE:
+        return True
+    # SQLite only says so in the message.
+    return str(error).startswith("no such table")
+
+
 async def _has_table(database, table_name):
     if database.url.dialect in ("postgres", "postgresql"):
         statement = (
@@ -78,6 +319,24 @@ async def _has_table(database, table_name):
         return bool(result)
 
 
+async def _table_columns(database, table_name) -> Set[str]:
+    if database.url.dialect in ("postgres", "postgresql"):
+        statement = (
+            "SELECT column_name FROM information_schema.columns "
+            f"WHERE table_name = '{table_name}';"
+        )
+        result = await database.fetch_all(statement)
+        return {record["column_name"] for record in result}
+    elif database.url.dialect == "mysql":
+        statement = f"SHOW COLUMNS FROM {table_name};"
+        result = await database.fetch_all(statement)
+        return {record[0] for record in result}
+    else:
+        statement = f"PRAGMA table_info({table_name});"
+        result = await database.fetch_all(statement)
+        return {record["name"] for record in result}
+
+
 def _get_dialect(url):
     url = DatabaseURL(url)
 
@@ -89,7 +348,7 @@ def _get_dialect(url):
         from sqlalchemy.dialects.mysql import pymysql
 
         return pymysql.dialect(paramstyle="pyformat")
-    elif url.dialect == "mysql":
+    elif url.dialect == "sqlite":
         from sqlalchemy.dialects.sqlite import pysqlite
 
-        pysqlite.dialect(paramstyle="qmark")
+        return pysqlite.dialect(paramstyle="qmark")
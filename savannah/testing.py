@@ -0,0 +1,203 @@
+"""
+This module provides migrated databases for test suites, without replaying
+the migrations for every test.
+
+The migrations are applied once, to a template database, which is then
+cloned for each test. On Postgres the clones are made with
+`CREATE DATABASE ... TEMPLATE`, and on SQLite by copying the database file.
+Other databases have the migrations applied to each clone.
+
+The template's name includes a digest of the migration manifest, so it is
+only rebuilt when a migration is added, changed or removed. A pool of clones
+is kept ready, and each clone that is given back is replaced with a fresh
+one.
+
+For pytest, see `savannah.pytest_plugin`.
+"""
+from typing import List, Set
+import glob
+import os
+import shutil
+from databases import Database, DatabaseURL
+from .commands import (
+    _server_url,
+    create_database,
+    database_exists,
+    drop_database,
+    migrate,
+)
+from .manifest import load_manifest, manifest_digest
+
+
+class DatabasePool:
+    """
+    A pool of `size` migrated databases, named after the database at `url`.
+
+    Pools in different processes, such as parallel test workers, must each
+    have a different `name`, which keeps their clones apart. The template
+    is shared.
+    """
+
+    def __init__(
+        self, url: str, dir: str = "migrations", size: int = 4, name: str = None
+    ) -> None:
+        self.url = DatabaseURL(url)
+        self.dir = dir
+        self.size = size
+        self.name = str(os.getpid()) if name is None else name
+        self.template_url: str = None
+        self.ready: List[str] = []
+        self.in_use: Set[str] = set()
+        self.count = 0
+
+        if self.url.dialect == "sqlite" and self.url.database in ("", ":memory:"):
+            raise Exception("In-memory SQLite databases cannot be cloned.")
+
+    @property
+    def can_clone(self) -> bool:
+        return self.url.dialect in ("postgres", "postgresql", "sqlite")
+
+    async def prepare(self) -> None:
+        """
+        Build the template if the migrations have changed since it was last
+        built, and fill the pool.
+        """
+        if self.can_clone:
+            self.template_url = await self.build_template()
+        while len(self.ready) < self.size:
+            self.ready.append(await self.clone())
+
+    async def acquire(self) -> str:
+        """
+        Take a migrated database from the pool, and return its URL.
+        """
+        if not self.ready:
+            self.ready.append(await self.clone())
+        url = self.ready.pop(0)
+        self.in_use.add(url)
+        return url
+
+    async def release(self, url: str) -> None:
+        """
+        Drop a database that was taken from the pool, and replace it.
+        """
+        self.in_use.discard(url)
+        await _drop_if_exists(url)
+        if len(self.ready) < self.size:
+            self.ready.append(await self.clone())
+
+    async def close(self) -> None:
+        """
+        Drop every database in the pool. The template is kept.
+        """
+        for url in [*self.ready, *self.in_use]:
+            await _drop_if_exists(url)
+        self.ready.clear()
+        self.in_use.clear()
+
+    async def build_template(self) -> str:
+        prefix = "template_"
+        digest = manifest_digest(load_manifest(self.dir))[:12]
+        url = self.database_url(f"{prefix}{digest}")
+        if await database_exists(url):
+            return url
+
+        # Migrate under a name of our own, and then rename it, so that other
+        # processes never clone a template that is only partly migrated.
+        building = self.database_url(f"{prefix}{digest}_{self.name}")
+        await _drop_if_exists(building)
+        await create_database(building)
+        await migrate(building, dir=self.dir)
+
+        for stale in await self.database_urls(prefix):
+            if digest not in DatabaseURL(stale).database:
+                await _drop_if_exists(stale)
+
+        try:
+            await _rename_database(building, url)
+        except Exception:
+            # Another process got there first.
+            if not await database_exists(url):
+                raise
+            await _drop_if_exists(building)
+        return url
+
+    async def clone(self) -> str:
+        self.count += 1
+        url = self.database_url(f"{self.name}_{self.count}")
+        # A run that was interrupted may have left the database behind.
+        await _drop_if_exists(url)
+
+        dialect = self.url.dialect
+        if dialect == "sqlite":
+            template_path = DatabaseURL(self.template_url).database
+            shutil.copyfile(template_path, DatabaseURL(url).database)
+        elif dialect in ("postgres", "postgresql"):
+            clone_name = DatabaseURL(url).database
+            template_name = DatabaseURL(self.template_url).database
+            async with Database(_server_url(self.url)) as database:
+                await database.execute(
+                    f"CREATE DATABASE {clone_name} TEMPLATE {template_name}"
+                )
+        else:
+            await create_database(url)
+            await migrate(url, dir=self.dir)
+        return url
+
+    def database_url(self, suffix: str) -> str:
+        """
+        The URL of the database named after ours, with the given suffix.
+        """
+        name = self.url.database
+        if self.url.dialect == "sqlite":
+            root, ext = os.path.splitext(name)
+            return str(self.url.replace(database=f"{root}_{suffix}{ext}"))
+        return str(self.url.replace(database=f"{name}_{suffix}"))
+
+    async def database_urls(self, suffix_prefix: str) -> List[str]:
+        """
+        The URLs of the existing databases that are named after ours, with
+        a suffix that starts with `suffix_prefix`.
+        """
+        name = self.url.database
+        if self.url.dialect == "sqlite":
+            root, ext = os.path.splitext(name)
+            paths = glob.glob(f"{glob.escape(root)}_{suffix_prefix}*{ext}")
+            return [str(self.url.replace(database=path)) for path in sorted(paths)]
+
+        async with Database(_server_url(self.url)) as database:
+            rows = await database.fetch_all(
+                "SELECT datname FROM pg_database WHERE datname LIKE :pattern",
+                values={"pattern": f"{name}\\_{suffix_prefix}%"},
+            )
+        return [str(self.url.replace(database=row[0])) for row in rows]
+
+
+async def _drop_if_exists(url: str) -> None:
+    if await database_exists(url):
+        await drop_database(url)
+    url = DatabaseURL(url)
+    if url.dialect == "sqlite":
+        _remove_lock_file(url.database)
+
+
+async def _rename_database(url: str, new_url: str) -> None:
+    url, new_url = DatabaseURL(url), DatabaseURL(new_url)
+    if url.dialect == "sqlite":
+        # Any other process building the same template built an identical
+        # copy, so it does not matter which one wins.
+        os.replace(url.database, new_url.database)
+        _remove_lock_file(url.database)
+        return
+
+    async with Database(_server_url(url)) as database:
+        await database.execute(
+            f"ALTER DATABASE {url.database} RENAME TO {new_url.database}"
+        )
+
+
+def _remove_lock_file(path: str) -> None:
+    # The migration lock leaves a file alongside SQLite databases.
+    lock_path = f"{os.path.abspath(path)}.lock"
+    if os.path.exists(lock_path):
+        os.remove(lock_path)
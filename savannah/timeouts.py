@@ -0,0 +1,211 @@
+"""
+This module limits how long migrations wait for locks, and how long their
+statements run.
+
+A DDL statement that waits for a lock on a busy table, such as the ACCESS
+EXCLUSIVE lock taken by `ALTER TABLE` on PostgreSQL, holds up every query
+on that table that arrives after it. With a lock timeout the statement gives
+up instead, and the migration is tried again after a pause, so that the
+queries queued behind it can run in the meantime. The pauses grow
+exponentially, with full jitter, so that retries from many processes do not
+line up.
+
+On PostgreSQL the limits are set with `lock_timeout` and `statement_timeout`,
+and on MySQL with `lock_wait_timeout`. MySQL has no statement timeout that
+applies to DDL, and SQLite has neither, so they are ignored there.
+
+A migration is only retried if the failed attempt can be undone. Inside a
+transaction, each attempt runs in a savepoint. Outside of one, a retry is
+only made if the lock timed out before any of the migration's statements
+had completed.
+
+The limits apply to every migration in a run, and a migration can override
+them with its `lock_timeout`, `statement_timeout` and `lock_attempts`
+attributes.
+"""
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import contextlib
+import math
+import random
+import time
+from .instrumentation import Event, Span
+
+# The SQLSTATE that PostgreSQL raises when `lock_timeout` expires.
+POSTGRES_LOCK_NOT_AVAILABLE = "55P03"
+# The error code that MySQL raises when `lock_wait_timeout` expires.
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+
+
+class Timeouts:
+    def __init__(
+        self,
+        lock_timeout: Optional[float] = None,
+        statement_timeout: Optional[float] = None,
+        attempts: int = 1,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        """
+        `lock_timeout` and `statement_timeout` are in seconds, or `None` to
+        leave the database's own settings in place. A migration whose lock
+        times out is tried up to `attempts` times in all, pausing for up to
+        `backoff` seconds before the first retry, doubling each time, to at
+        most `max_backoff` seconds.
+        """
+        if attempts < 1:
+            raise Exception("Migrations must be attempted at least once.")
+        self.lock_timeout = lock_timeout
+        self.statement_timeout = statement_timeout
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def __repr__(self) -> str:
+        return (
+            f"Timeouts(lock_timeout={self.lock_timeout!r}, "
+            f"statement_timeout={self.statement_timeout!r}, "
+            f"attempts={self.attempts!r})"
+        )
+
+    def for_migration(self, migration) -> "Timeouts":
+        """
+        Return the limits for `migration`, with any that it sets itself in
+        place of these.
+        """
+        overrides = {
+            "lock_timeout": migration.lock_timeout,
+            "statement_timeout": migration.statement_timeout,
+            "attempts": migration.lock_attempts,
+        }
+        overrides = {
+            key: value for key, value in overrides.items() if value is not None
+        }
+        if not overrides:
+            return self
+        options = {
+            "lock_timeout": self.lock_timeout,
+            "statement_timeout": self.statement_timeout,
+            "attempts": self.attempts,
+            "backoff": self.backoff,
+            "max_backoff": self.max_backoff,
+        }
+        return Timeouts(**{**options, **overrides})
+
+    def delay(self, attempt: int) -> float:
+        """
+        The pause before retrying after the given attempt failed.
+        """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def set_statements(self, dialect: str) -> List[str]:
+        statements = []
+        if dialect in ("postgres", "postgresql"):
+            if self.lock_timeout is not None:
+                milliseconds = max(1, round(self.lock_timeout * 1000))
+                statements.append(f"SET lock_timeout = {milliseconds}")
+            if self.statement_timeout is not None:
+                milliseconds = max(1, round(self.statement_timeout * 1000))
+                statements.append(f"SET statement_timeout = {milliseconds}")
+        elif dialect == "mysql" and self.lock_timeout is not None:
+            # MySQL counts whole seconds, and one is the least it accepts.
+            seconds = max(1, math.ceil(self.lock_timeout))
+            statements.append(f"SET SESSION lock_wait_timeout = {seconds}")
+        return statements
+
+    def reset_statements(self, dialect: str) -> List[str]:
+        statements = []
+        if dialect in ("postgres", "postgresql"):
+            if self.lock_timeout is not None:
+                statements.append("RESET lock_timeout")
+            if self.statement_timeout is not None:
+                statements.append("RESET statement_timeout")
+        elif dialect == "mysql" and self.lock_timeout is not None:
+            statements.append("SET SESSION lock_wait_timeout = DEFAULT")
+        return statements
+
+
+def is_lock_timeout(error: BaseException) -> bool:
+    """
+    Whether `error` is the database giving up on waiting for a lock.
+    """
+    # asyncpg sets `sqlstate`, and psycopg2 sets `pgcode`.
+    for attribute in ("sqlstate", "pgcode"):
+        if getattr(error, attribute, None) == POSTGRES_LOCK_NOT_AVAILABLE:
+            return True
+    args = getattr(error, "args", ())
+    return bool(args) and args[0] == MYSQL_LOCK_WAIT_TIMEOUT
+
+
+async def run_with_timeouts(
+    database,
+    timeouts: Timeouts,
+    span: Span,
+    run: Callable[[], Awaitable[None]],
+    transactional: bool = False,
+) -> None:
+    """
+    Call `run()` with the given limits in place, retrying it if a lock times
+    out, as described above. `transactional` says whether it runs inside a
+    transaction.
+
+    The time spent on attempts that timed out, and pausing between them, is
+    recorded as `lock_wait` in the span's details, and the time taken by the
+    final attempt as `execution`, along with the number of `attempts`.
+    """
+    dialect = database.url.dialect
+    for statement in timeouts.set_statements(dialect):
+        await database.execute(statement)
+
+    succeeded = False
+    try:
+        waited = 0.0
+        attempt = 1
+        while True:
+            started = time.monotonic()
+            completed = span.statements
+            can_retry = attempt < timeouts.attempts
+            try:
+                if transactional and can_retry:
+                    async with database.transaction():
+                        await run()
+                else:
+                    await run()
+                break
+            except Exception as error:
+                elapsed = time.monotonic() - started
+                undone = transactional or span.statements == completed
+                if not (can_retry and undone and is_lock_timeout(error)):
+                    raise
+                delay = timeouts.delay(attempt)
+                database.emit(
+                    Event(
+                        "lock",
+                        "timeout",
+                        span.name,
+                        time.monotonic(),
+                        duration=elapsed,
+                        details={"attempt": attempt, "delay": delay},
+                    )
+                )
+                await asyncio.sleep(delay)
+                waited += elapsed + delay
+                attempt += 1
+
+        span.details.update(
+            lock_wait=waited,
+            execution=time.monotonic() - started,
+            attempts=attempt,
+        )
+        succeeded = True
+    finally:
+        # Inside a transaction that failed, the settings are rolled back
+        # with everything else, and no further statements can run.
+        if succeeded:
+            for statement in timeouts.reset_statements(dialect):
+                await database.execute(statement)
+        elif not transactional:
+            with contextlib.suppress(Exception):
+                for statement in timeouts.reset_statements(dialect):
+                    await database.execute(statement)
@@ -0,0 +1,59 @@
+import os
+import sys
+import pytest
+
+
+@pytest.fixture
+def migrations_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("migrations")
+    with open(os.path.join("migrations", "__init__.py"), "w") as fout:
+        fout.write("")
+    yield "migrations"
+    for name in list(sys.modules):
+        if name == "migrations" or name.startswith("migrations."):
+            del sys.modules[name]
+
+
+@pytest.fixture
+def create_table():
+    def create(name):
+        """
+        The operations for a migration that creates a table with only an `id`.
+        """
+        return (
+            f"[savannah.CreateTable(table_name={name!r}, columns=["
+            "sqlalchemy.Column('id', sqlalchemy.Integer(), primary_key=True)])]"
+        )
+
+    return create
+
+
+@pytest.fixture
+def unload():
+    def unload(dir):
+        """
+        Forget the imported migration modules, as a new process would.
+        """
+        for name in list(sys.modules):
+            if name.startswith(f"{dir}."):
+                del sys.modules[name]
+
+    return unload
+
+
+@pytest.fixture
+def write_migration():
+    def write(dir, name, dependencies, operations="[]", extra=""):
+        with open(os.path.join(dir, f"{name}.py"), "w") as fout:
+            fout.write(f"""\
+import savannah
+import sqlalchemy
+
+
+class Migration(savannah.Migration):
+    dependencies = {dependencies!r}
+    operations = {operations}
+{extra}""")
+
+    return write
@@ -0,0 +1,176 @@
+from savannah.autodetect import detect_changes, table_fingerprint
+from databases import Database
+import pytest
+import savannah
+import sqlalchemy
+import sys
+
+
+def state(*tables):
+    metadata = sqlalchemy.MetaData()
+    for name, *columns in tables:
+        sqlalchemy.Table(name, metadata, *columns)
+    return {"metadata": metadata}
+
+
+def id_column():
+    return sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True)
+
+
+def describe(operations):
+    return [
+        (type(operation).__name__, operation.table_name) for operation in operations
+    ]
+
+
+def test_create_and_drop_tables_in_foreign_key_order():
+    to_state = state(
+        ("b", id_column(), sqlalchemy.Column("a_id", sqlalchemy.ForeignKey("a.id"))),
+        ("a", id_column()),
+    )
+    operations = detect_changes(state(), to_state)
+    assert describe(operations) == [("CreateTable", "a"), ("CreateTable", "b")]
+
+    operations = detect_changes(to_state, state())
+    assert describe(operations) == [("DropTable", "b"), ("DropTable", "a")]
+
+
+def test_unchanged_tables():
+    from_state = state(("a", id_column(), sqlalchemy.Column("name", sqlalchemy.Text)))
+    to_state = state(("a", id_column(), sqlalchemy.Column("name", sqlalchemy.Text)))
+    assert table_fingerprint(from_state["metadata"].tables["a"]) == table_fingerprint(
+        to_state["metadata"].tables["a"]
+    )
+    assert detect_changes(from_state, to_state) == []
+
+
+def test_column_changes():
+    from_state = state(
+        (
+            "a",
+            id_column(),
+            sqlalchemy.Column("name", sqlalchemy.String(20)),
+            sqlalchemy.Column("old", sqlalchemy.Integer),
+        )
+    )
+    to_state = state(
+        (
+            "a",
+            id_column(),
+            sqlalchemy.Column("name", sqlalchemy.String(40), nullable=False),
+            sqlalchemy.Column("new", sqlalchemy.Integer, index=True),
+        )
+    )
+    operations = detect_changes(from_state, to_state)
+    assert describe(operations) == [
+        ("AddColumn", "a"),
+        ("AlterColumn", "a"),
+        ("DropColumn", "a"),
+        ("CreateIndex", "a"),
+    ]
+    add_column, alter_column, drop_column, create_index = operations
+    assert add_column.column.name == "new"
+    assert alter_column.column.type.length == 40
+    assert alter_column.existing.type.length == 20
+    assert drop_column.column.name == "old"
+    assert create_index.columns == ["new"]
+
+
+def test_unique_constraint_changes():
+    from_state = state(("a", id_column(), sqlalchemy.Column("email", sqlalchemy.Text)))
+    to_state = state(
+        (
+            "a",
+            id_column(),
+            sqlalchemy.Column("email", sqlalchemy.Text),
+            sqlalchemy.UniqueConstraint("email", name="uq_a_email"),
+        )
+    )
+    operations = detect_changes(from_state, to_state)
+    assert describe(operations) == [("AddConstraint", "a")]
+
+    operations = detect_changes(to_state, from_state)
+    assert describe(operations) == [("DropConstraint", "a")]
+
+
+def test_operations_repr_round_trip():
+    to_state = state(
+        ("a", id_column()),
+        (
+            "b",
+            id_column(),
+            sqlalchemy.Column("a_id", sqlalchemy.ForeignKey("a.id"), nullable=False),
+            sqlalchemy.Column("name", sqlalchemy.String(20), server_default="x"),
+        ),
+    )
+    operations = detect_changes(state(), to_state)
+    namespace = {"savannah": savannah, "sqlalchemy": sqlalchemy}
+    rebuilt = eval(repr(operations), namespace)
+    assert repr(rebuilt) == repr(operations)
+
+    metadata = sqlalchemy.MetaData()
+    for operation in rebuilt:
+        operation.state_forwards(metadata)
+    assert detect_changes({"metadata": metadata}, to_state) == []
+
+
+@pytest.mark.asyncio
+async def test_add_column_on_sqlite(tmp_path):
+    url = f"sqlite:///{tmp_path}/test.db"
+    from_state = state(("a", id_column()))
+    to_state = state(("a", id_column(), sqlalchemy.Column("name", sqlalchemy.Text)))
+
+    async with Database(url) as database:
+        for operation in detect_changes(state(), from_state):
+            await operation.upgrade(database, database._backend._dialect)
+        for operation in detect_changes(from_state, to_state):
+            await operation.upgrade(database, database._backend._dialect)
+        await database.execute("INSERT INTO a (id, name) VALUES (1, 'x')")
+        assert await database.fetch_val("SELECT name FROM a") == "x"
+
+
+EXAMPLE_MODELS = """\
+import sqlalchemy
+import sys
+
+metadata = sqlalchemy.MetaData()
+sqlalchemy.Table(
+    "org",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("region", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("email", sqlalchemy.String(100), index=True),
+    sqlalchemy.Column("size", sqlalchemy.Integer),
+    sqlalchemy.UniqueConstraint("email", "region", name="uq_email_org"),
+    sqlalchemy.CheckConstraint("size > 0", name="ck_org"),
+)
+sqlalchemy.Table(
+    "member",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("org_id", sqlalchemy.Integer),
+    sqlalchemy.Column("org_region", sqlalchemy.Integer),
+    sqlalchemy.ForeignKeyConstraint(["org_id", "org_region"], ["org.id", "org.region"]),
+)
+"""
+
+
+@pytest.mark.asyncio
+async def test_initial_migration_has_no_pending_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    with open("example.py", "w") as fout:
+        fout.write(EXAMPLE_MODELS)
+
+    try:
+        await savannah.init()
+        with open("migrations/0001_initial.py") as fin:
+            source = fin.read()
+        assert "ix_org_email" in source
+        assert "uq_email_org" in source
+        assert "ck_org" in source
+        assert not await savannah.make_migration(check=True)
+    finally:
+        for name in list(sys.modules):
+            if name in ("example", "migrations") or name.startswith("migrations."):
+                del sys.modules[name]
@@ -0,0 +1,94 @@
+from databases import Database
+from savannah.tables import db_create_checkpoints_table_if_not_exists
+from savannah.tables import db_load_checkpoint, db_save_checkpoint
+import savannah
+import pytest
+import datetime
+import decimal
+import sqlite3
+import uuid
+
+
+def create_rows(path, count):
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, score INTEGER)")
+        connection.executemany(
+            "INSERT INTO users (id, score) VALUES (?, 0)",
+            [(index,) for index in range(1, count + 1)],
+        )
+
+
+def scores(path):
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT score FROM users ORDER BY id")
+        return [row[0] for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_backfill(tmp_path):
+    path = str(tmp_path / "test.db")
+    create_rows(path, 25)
+    operation = savannah.Backfill(
+        "users", values={"score": "id * 2"}, where="id != 3", batch_size=10
+    )
+
+    async with Database(f"sqlite:///{path}") as database:
+        total = await operation.run(database, operation.values, "test")
+        assert total == 24
+        assert await db_load_checkpoint(database, "test") is None
+
+    assert scores(path) == [0 if index == 3 else index * 2 for index in range(1, 26)]
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_checkpoint(tmp_path):
+    path = str(tmp_path / "test.db")
+    create_rows(path, 25)
+    operation = savannah.Backfill("users", values={"score": "1"}, batch_size=10)
+    name = operation.checkpoint_name(forwards=True)
+
+    async with Database(f"sqlite:///{path}") as database:
+        await db_create_checkpoints_table_if_not_exists(database)
+        await db_save_checkpoint(database, name, 20)
+        await operation.upgrade(database, dialect=None)
+
+    assert scores(path) == [0] * 20 + [1] * 5
+
+
+def test_backfill_delay():
+    operation = savannah.Backfill("users", values={}, max_rows_per_second=100)
+    assert operation.get_delay(rows=100, elapsed=0.25) == 0.75
+    assert operation.get_delay(rows=100, elapsed=2.0) == 0.0
+
+
+def test_checkpoint_survives_throttle_changes():
+    operation = savannah.Backfill("users", values={"score": "1"}, batch_size=10)
+    throttled = savannah.Backfill(
+        "users",
+        values={"score": "1"},
+        batch_size=100,
+        sleep=1.0,
+        max_rows_per_second=50,
+    )
+    changed = savannah.Backfill("users", values={"score": "2"}, batch_size=10)
+    name = operation.checkpoint_name(forwards=True)
+    assert throttled.checkpoint_name(forwards=True) == name
+    assert changed.checkpoint_name(forwards=True) != name
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_keys_keep_their_type(tmp_path):
+    keys = [
+        uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        datetime.datetime(2024, 5, 1, 12, 30),
+        datetime.date(2024, 5, 1),
+        decimal.Decimal("10.25"),
+        "text",
+        42,
+    ]
+    async with Database(f"sqlite:///{tmp_path / 'test.db'}") as database:
+        await db_create_checkpoints_table_if_not_exists(database)
+        for key in keys:
+            await db_save_checkpoint(database, "test", key)
+            loaded = await db_load_checkpoint(database, "test")
+            assert (type(loaded), loaded) == (type(key), key)
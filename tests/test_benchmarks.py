@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "benchmarks", "run.py")
+
+
+def run_benchmarks(*args):
+    return subprocess.run(
+        [sys.executable, SCRIPT, "--sizes", "10", "--repeat", "1", *args],
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_benchmark_suite(tmp_path):
+    output = str(tmp_path / "results.json")
+    result = run_benchmarks("--output", output)
+    assert result.returncode == 0, result.stderr
+    with open(output) as fin:
+        results = json.load(fin)
+    names = {(row["name"], row["shape"]) for row in results["results"]}
+    assert ("apply", "merges") in names
+    assert ("plan", "wide") in names
+
+    # Against an impossibly fast baseline, every benchmark is a regression.
+    for row in results["results"]:
+        row["median"] = 0.0
+    with open(output, "w") as fout:
+        json.dump(results, fout)
+    result = run_benchmarks("--baseline", output, "--min-delta", "0")
+    assert result.returncode == 1
+    assert "Regression: apply (linear, 10)" in result.stdout
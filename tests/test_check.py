@@ -0,0 +1,69 @@
+import savannah
+import pytest
+import sqlite3
+import sys
+from databases import Database
+from savannah.tables import db_load_fingerprint
+
+
+@pytest.mark.asyncio
+async def test_check(migrations_dir, write_migration, create_table, unload):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    assert not await savannah.check(database_url)
+
+    await savannah.migrate(database_url)
+    unload(migrations_dir)
+    assert await savannah.check(database_url)
+    assert not any(name.startswith(f"{migrations_dir}.") for name in sys.modules)
+
+    write_migration(migrations_dir, "0003_auto", ["0002_auto"], create_table("c"))
+    assert not await savannah.check(database_url)
+    await savannah.migrate(database_url)
+    assert await savannah.check(database_url)
+
+
+@pytest.mark.asyncio
+async def test_check_detects_stale_fingerprint(
+    migrations_dir, write_migration, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    await savannah.migrate(database_url)
+
+    with sqlite3.connect("test.db") as connection:
+        connection.execute("DELETE FROM migrations WHERE name = '0002_auto'")
+    assert not await savannah.check(database_url)
+
+
+@pytest.mark.asyncio
+async def test_migrate_saves_missing_fingerprint(
+    migrations_dir, write_migration, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    await savannah.migrate(database_url)
+
+    # As for a database migrated before fingerprints were kept.
+    with sqlite3.connect("test.db") as connection:
+        connection.execute("DROP TABLE migration_fingerprint")
+    await savannah.migrate(database_url)
+
+    with sqlite3.connect("test.db") as connection:
+        rows = connection.execute("SELECT count FROM migration_fingerprint").fetchall()
+    assert rows == [(1,)]
+
+
+@pytest.mark.asyncio
+async def test_load_fingerprint_raises_database_errors(migrations_dir):
+    # No tables yet, so no fingerprint.
+    async with Database("sqlite:///test.db") as database:
+        assert await db_load_fingerprint(database) is None
+
+    with open("test.db", "w") as fout:
+        fout.write("This is not a database." * 10)
+    async with Database("sqlite:///test.db") as database:
+        with pytest.raises(sqlite3.DatabaseError, match="not a database"):
+            await db_load_fingerprint(database)
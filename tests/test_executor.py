@@ -0,0 +1,276 @@
+import savannah
+import pytest
+import sqlite3
+import sys
+from databases import DatabaseURL
+from savannah.executor import StatementBatch
+
+
+def table_names(path):
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        return sorted(row[0] for row in rows)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+async def test_migrate_runs_operations(
+    migrations_dir, write_migration, batch, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    write_migration(migrations_dir, "0003_auto", ["0002_auto"], create_table("c"))
+
+    await savannah.migrate(database_url, batch=batch)
+    assert table_names("test.db") == [
+        "a",
+        "b",
+        "c",
+        "migration_fingerprint",
+        "migrations",
+    ]
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [True, True, True]
+
+    await savannah.migrate(database_url, target="0001", batch=batch)
+    assert table_names("test.db") == ["a", "migration_fingerprint", "migrations"]
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [True, False, False]
+
+
+def test_concurrent_index_statements():
+    from sqlalchemy.dialects import postgresql, sqlite
+
+    operation = savannah.CreateIndex(
+        "ix_a_id", table_name="a", columns=["id"], concurrently=True
+    )
+    assert not operation.atomic
+    assert operation.upgrade_statements(postgresql.dialect()) == [
+        "CREATE INDEX CONCURRENTLY ix_a_id ON a (id)"
+    ]
+    assert operation.upgrade_statements(sqlite.dialect()) == [
+        "CREATE INDEX ix_a_id ON a (id)"
+    ]
+
+    operation = savannah.DropIndex(
+        "ix_a_id", table_name="a", columns=["id"], concurrently=True
+    )
+    assert operation.upgrade_statements(postgresql.dialect()) == [
+        "DROP INDEX CONCURRENTLY ix_a_id"
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+async def test_non_atomic_migrations(
+    migrations_dir, write_migration, batch, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(
+        migrations_dir,
+        "0002_index",
+        ["0001_initial"],
+        "[savannah.CreateIndex('ix_a_id', table_name='a', columns=['id'], "
+        "concurrently=True)]",
+    )
+    write_migration(migrations_dir, "0003_auto", ["0002_index"], create_table("b"))
+
+    from savannah.executor import split_segments
+    from savannah.loader import load_migrations
+
+    graph = load_migrations(set(), dir_name=migrations_dir)
+    segments = split_segments([(migration, True) for migration in graph])
+    assert [(atomic, len(steps)) for atomic, steps in segments] == [
+        (True, 1),
+        (False, 1),
+        (True, 1),
+    ]
+
+    await savannah.migrate(database_url, batch=batch)
+    assert table_names("test.db") == ["a", "b", "migration_fingerprint", "migrations"]
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [True, True, True]
+
+    await savannah.migrate(database_url, target="zero", batch=batch)
+    assert table_names("test.db") == ["migration_fingerprint", "migrations"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+@pytest.mark.parametrize("atomicity", ["all", "per-migration", "none"])
+async def test_atomicity_and_resume(
+    migrations_dir, write_migration, batch, atomicity, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    write_migration(
+        migrations_dir, "0003_auto", ["0002_auto"], "[savannah.RunSQL('NOT SQL')]"
+    )
+
+    with pytest.raises(Exception):
+        await savannah.migrate(database_url, batch=batch, atomicity=atomicity)
+    migrations = await savannah.list_migrations(database_url)
+    if atomicity == "all":
+        assert table_names("test.db") == ["migrations"]
+        assert [m.is_applied for m in migrations] == [False, False, False]
+    else:
+        assert table_names("test.db") == [
+            "a",
+            "b",
+            "migration_fingerprint",
+            "migrations",
+        ]
+        assert [m.is_applied for m in migrations] == [True, True, False]
+
+    # Fixing the failed migration and running again picks up where we left off.
+    for name in list(sys.modules):
+        if name.startswith(f"{migrations_dir}."):
+            del sys.modules[name]
+    write_migration(
+        migrations_dir,
+        "0003_auto",
+        ["0002_auto"],
+        "[savannah.RunSQL('CREATE TABLE c (id INTEGER)')]",
+    )
+    await savannah.migrate(database_url, batch=batch, atomicity=atomicity)
+    assert table_names("test.db") == [
+        "a",
+        "b",
+        "c",
+        "migration_fingerprint",
+        "migrations",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_migration_modules_are_released(
+    migrations_dir, write_migration, create_table
+):
+    from savannah.loader import load_migrations
+
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+
+    graph = load_migrations(set(), dir_name=migrations_dir)
+    record = graph["0002_auto"]
+    assert not hasattr(record, "__dict__")
+    assert record.dependencies == ["0001_initial"]
+    assert graph["0001_initial"].dependants == ["0002_auto"]
+    assert "migrations.0001_initial" not in sys.modules
+
+    # By default the modules stay loaded, for the next run to use.
+    await savannah.migrate("sqlite:///test.db", target="0001")
+    assert "migrations.0001_initial" in sys.modules
+
+    await savannah.migrate("sqlite:///test.db", release=True)
+    assert table_names("test.db") == ["a", "b", "migration_fingerprint", "migrations"]
+    assert "migrations.0001_initial" in sys.modules
+    assert "migrations.0002_auto" not in sys.modules
+    assert not hasattr(sys.modules["migrations"], "0002_auto")
+
+    # Loading again imports the module afresh.
+    assert record.load().dependencies == ["0001_initial"]
+    record.release()
+    assert "migrations.0002_auto" not in sys.modules
+
+
+def index_names(path):
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        return sorted(row[0] for row in rows)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+async def test_drop_index_round_trip(
+    migrations_dir, write_migration, batch, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(
+        migrations_dir,
+        "0002_index",
+        ["0001_initial"],
+        "[savannah.CreateIndex('ix_a_id', table_name='a', columns=['id'])]",
+    )
+    write_migration(
+        migrations_dir,
+        "0003_drop_index",
+        ["0002_index"],
+        "[savannah.DropIndex('ix_a_id', table_name='a', columns=['id'])]",
+    )
+
+    await savannah.migrate(database_url, batch=batch)
+    assert index_names("test.db") == []
+
+    await savannah.migrate(database_url, target="0002", batch=batch)
+    assert index_names("test.db") == ["ix_a_id"]
+
+
+class ScriptConnection:
+    """
+    Stands in for a connection to PostgreSQL, which is sent batches as a
+    single script, and only allows that once it has been acquired.
+    """
+
+    def __init__(self):
+        self.acquired = False
+        self.scripts = []
+
+    async def __aenter__(self):
+        self.acquired = True
+        return self
+
+    async def __aexit__(self, *args):
+        self.acquired = False
+
+    @property
+    def raw_connection(self):
+        assert self.acquired, "Connection is not acquired"
+        return self
+
+    async def execute(self, script):
+        self.scripts.append(script)
+
+
+@pytest.mark.asyncio
+async def test_batch_outside_transaction():
+    connection = ScriptConnection()
+
+    class Database:
+        url = DatabaseURL("postgresql://localhost/example")
+
+        def connection(self):
+            return connection
+
+    batch = StatementBatch(Database())
+    batch.extend(["CREATE TABLE a (id INTEGER)", "CREATE TABLE b (id INTEGER)"])
+    await batch.flush()
+    assert connection.scripts == [
+        "CREATE TABLE a (id INTEGER);\nCREATE TABLE b (id INTEGER)"
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+async def test_upgrade_without_database(migrations_dir, write_migration, batch):
+    write_migration(
+        migrations_dir,
+        "0001_initial",
+        [],
+        extra="""
+    async def upgrade(self):
+        pass
+
+    async def downgrade(self):
+        pass
+""",
+    )
+
+    with pytest.warns(DeprecationWarning):
+        await savannah.migrate("sqlite:///test.db", batch=batch)
+    migrations = await savannah.list_migrations("sqlite:///test.db")
+    assert [m.is_applied for m in migrations] == [True]
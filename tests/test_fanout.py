@@ -0,0 +1,57 @@
+from click.testing import CliRunner
+from savannah import fanout
+from savannah.cli import cli
+import pytest
+import sys
+
+
+@pytest.fixture
+def history(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    return migrations_dir
+
+
+def test_load_database_urls(tmp_path):
+    path = tmp_path / "urls.txt"
+    path.write_text(
+        "# tenants\npostgresql://localhost/a\n\npostgresql://localhost/b\n"
+        "postgresql://localhost/a\n"
+    )
+    assert fanout.load_database_urls(file=str(path)) == [
+        "postgresql://localhost/a",
+        "postgresql://localhost/b",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_migrate_many(history):
+    urls = [f"sqlite:///tenant_{index}.db" for index in range(5)]
+    results = await fanout.migrate_many(urls, target="0001", concurrency=2)
+    assert [result.url for result in results] == urls
+    assert [result.result for result in results] == [1] * 5
+
+    assert "migrations.0001_initial" in sys.modules
+
+    results = await fanout.migrate_many(urls, concurrency=2, release=True)
+    assert [result.result for result in results] == [1] * 5
+    assert "migrations.0001_initial" not in sys.modules
+    assert "migrations.0002_auto" not in sys.modules
+
+    results = await fanout.list_migrations_many(urls)
+    for result in results:
+        assert [migration.is_applied for migration in result.result] == [True, True]
+
+
+def test_migrate_many_cli(history):
+    with open("tenant_1.db", "w") as fout:
+        fout.write("")
+    with open("tenant_2.db", "w") as fout:
+        fout.write("This is not a database." * 10)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["migrate", "--databases-glob", "tenant_*.db"])
+    assert result.exit_code == 1
+    assert "ok     sqlite:///tenant_1.db" in result.output
+    assert "FAILED sqlite:///tenant_2.db" in result.output
+    assert "1 succeeded, 1 failed." in result.output
@@ -0,0 +1,85 @@
+from savannah.graph import CircularDependency, MigrationGraph, MissingDependency
+import pytest
+
+
+def test_order_is_deterministic():
+    graph = MigrationGraph(
+        {
+            "0001_initial": [],
+            "0002_b": ["0001_initial"],
+            "0002_a": ["0001_initial"],
+            "0003_merge": ["0002_a", "0002_b"],
+        }
+    )
+    assert graph.order == ["0001_initial", "0002_a", "0002_b", "0003_merge"]
+    assert graph.roots == ["0001_initial"]
+    assert graph.leaves == ["0003_merge"]
+    assert graph.dependants["0001_initial"] == ("0002_a", "0002_b")
+
+
+def test_ancestors_and_descendants():
+    graph = MigrationGraph(
+        {
+            "0001_initial": [],
+            "0002_a": ["0001_initial"],
+            "0002_b": ["0001_initial"],
+            "0003_a": ["0002_a"],
+        }
+    )
+    assert graph.ancestors("0003_a") == {"0001_initial", "0002_a"}
+    assert graph.descendants("0002_a") == {"0003_a"}
+    assert graph.descendants("0001_initial") == {"0002_a", "0002_b", "0003_a"}
+    assert graph.is_leaf("0002_b")
+    assert graph.is_root("0001_initial")
+
+
+def test_create_node():
+    graph = MigrationGraph(
+        {"0001_initial": [], "0002_auto": ["0001_initial"]},
+        create_node=lambda graph, name: (name, graph.dependants[name]),
+    )
+    assert list(graph) == [
+        ("0001_initial", ("0002_auto",)),
+        ("0002_auto", ()),
+    ]
+    assert graph["0002_auto"] == ("0002_auto", ())
+    assert graph.indices(["0002_auto", "0001_initial"]) == (1, 0)
+
+
+def test_missing_dependency():
+    with pytest.raises(MissingDependency) as exc_info:
+        MigrationGraph({"0001_initial": [], "0002_auto": ["0001_missing"]})
+    assert exc_info.value.name == "0002_auto"
+    assert exc_info.value.missing == ["0001_missing"]
+
+
+def test_circular_dependency():
+    with pytest.raises(CircularDependency) as exc_info:
+        MigrationGraph(
+            {
+                "0001_initial": [],
+                "0002_a": ["0001_initial", "0003_b"],
+                "0003_b": ["0002_a"],
+            }
+        )
+    assert exc_info.value.cycle == ["0002_a", "0003_b", "0002_a"]
+
+
+def test_long_chain():
+    names = [f"{index:05}_auto" for index in range(20000)]
+    dependencies = {names[0]: []}
+    for parent, child in zip(names, names[1:]):
+        dependencies[child] = [parent]
+    graph = MigrationGraph(dependencies)
+    assert graph.order == names
+    assert len(graph.ancestors(names[-1])) == 19999
+
+
+def test_match():
+    graph = MigrationGraph(
+        {"0001_initial": [], "0002_a": ["0001_initial"], "0002_b": ["0001_initial"]}
+    )
+    assert graph.match("0001") == ["0001_initial"]
+    assert graph.match("0002") == ["0002_a", "0002_b"]
+    assert graph.match("0002_b") == ["0002_b"]
+    assert graph.match("0003") == []
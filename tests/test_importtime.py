@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets are generous, so that slow CI machines do not fail them, but
+# still catch a heavy dependency creeping back into the import path.
+COMMANDS = [
+    # `savannah --help`, and the import done by every migration module.
+    (
+        "import savannah",
+        "savannah",
+        300,
+        ["black", "databases", "dotenv", "sqlalchemy"],
+    ),
+    # `list-migrations`, `migrate` and `check`.
+    (
+        "from savannah import commands",
+        "savannah.commands",
+        1000,
+        ["black", "savannah.autodetect", "savannah.generators", "savannah.state"],
+    ),
+]
+
+
+def import_times(statement):
+    """
+    Return the cumulative import time in milliseconds of each module
+    imported by `statement`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        times[module.strip()] = int(cumulative) / 1000
+    return times
+
+
+@pytest.mark.parametrize("statement,module,budget,excluded", COMMANDS)
+def test_import_time(statement, module, budget, excluded):
+    times = import_times(statement)
+    assert times[module] < budget
+
+    for name in excluded:
+        loaded = [key for key in times if key == name or key.startswith(f"{name}.")]
+        assert not loaded, f"{statement!r} imports {name!r}"
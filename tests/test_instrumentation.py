@@ -0,0 +1,113 @@
+import savannah
+import pytest
+import sqlite3
+
+
+class Recorder(savannah.Instrument):
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event):
+        self.events.append(event)
+
+
+@pytest.mark.asyncio
+async def test_migrate_reports_events(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    recorder = Recorder()
+
+    await savannah.migrate("sqlite:///test.db", instruments=[recorder])
+    kinds = [(event.kind, event.phase) for event in recorder.events]
+    assert kinds[:8] == [
+        ("lock", "end"),
+        ("plan", "end"),
+        ("migration", "start"),
+        ("operation", "start"),
+        ("statement", "start"),
+        ("statement", "end"),
+        ("operation", "end"),
+        ("migration", "end"),
+    ]
+    assert recorder.events[1].details == {
+        "downgrades": [],
+        "upgrades": ["0001_initial"],
+    }
+    migration_end = recorder.events[7]
+    assert migration_end.name == "0001_initial"
+    assert migration_end.statements == 1
+    assert migration_end.duration >= 0
+
+    with sqlite3.connect("test.db") as connection:
+        row = connection.execute(
+            "SELECT name, applied_at, duration, statements, checksum FROM migrations"
+        ).fetchone()
+    name, applied_at, duration, statements, checksum = row
+    assert name == "0001_initial"
+    assert applied_at is not None
+    assert duration >= 0
+    assert statements == 1
+    assert len(checksum) == 64
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+async def test_migrate_iter(migrations_dir, write_migration, batch, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+
+    events = [
+        event async for event in savannah.migrate_iter("sqlite:///test.db", batch=batch)
+    ]
+    assert events[0].kind == "lock" and events[0].duration == 0.0
+    assert events[1].details["upgrades"] == ["0001_initial", "0002_auto"]
+    phase = "batched" if batch else "start"
+    started = [
+        event.name
+        for event in events
+        if event.kind == "migration" and event.phase == phase
+    ]
+    assert started == ["0001_initial", "0002_auto"]
+    statements = [event for event in events if event.kind == "statement"]
+    assert statements and all(
+        event.duration >= 0 for event in statements if event.phase == "end"
+    )
+
+    events = [event async for event in savannah.migrate_iter("sqlite:///test.db")]
+    assert [(event.kind, event.details) for event in events] == [
+        ("plan", {"downgrades": [], "upgrades": []})
+    ]
+
+    write_migration(
+        migrations_dir, "0003_auto", ["0002_auto"], "[savannah.RunSQL('oops')]"
+    )
+    with pytest.raises(Exception):
+        async for event in savannah.migrate_iter("sqlite:///test.db"):
+            pass
+    assert (event.kind, event.phase, event.name) == ("migration", "end", "0003_auto")
+
+
+@pytest.mark.asyncio
+async def test_migrations_table_upgraded_in_place(
+    migrations_dir, write_migration, create_table
+):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    with sqlite3.connect("test.db") as connection:
+        connection.execute(
+            "CREATE TABLE migrations (id INTEGER PRIMARY KEY, name VARCHAR(100))"
+        )
+        connection.execute("CREATE TABLE a (id INTEGER PRIMARY KEY)")
+        connection.execute("INSERT INTO migrations (name) VALUES ('0001_initial')")
+
+    await savannah.migrate("sqlite:///test.db")
+    report = await savannah.migration_timings("sqlite:///test.db")
+    assert [row["applied"] for row in report] == [True, True]
+    assert report[0]["duration"] is None
+    assert report[1]["statements"] == 1
+    assert not report[1]["modified"]
+
+    write_migration(
+        migrations_dir, "0002_auto", ["0001_initial"], create_table("b") + "  # edit"
+    )
+    report = await savannah.migration_timings("sqlite:///test.db")
+    assert report[1]["modified"]
@@ -0,0 +1,136 @@
+import savannah
+import os
+import pytest
+import sqlite3
+import sys
+import sqlalchemy
+from sqlalchemy.dialects import mysql
+from savannah.introspect import (
+    DatabaseAutodetector,
+    catalog_type,
+    mysql_type,
+    normalize_sql,
+)
+from savannah.tables import _get_dialect
+
+MODELS = """\
+import sqlalchemy
+
+metadata = sqlalchemy.MetaData()
+
+authors = sqlalchemy.Table(
+    "authors",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True),
+    sqlalchemy.Column("name", sqlalchemy.String(length=100), nullable=False),
+    sqlalchemy.Column("email", sqlalchemy.String(), unique=True),
+)
+
+books = sqlalchemy.Table(
+    "books",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True),
+    sqlalchemy.Column(
+        "author_id",
+        sqlalchemy.Integer(),
+        sqlalchemy.ForeignKey("authors.id", ondelete="CASCADE"),
+    ),
+    sqlalchemy.Column("title", sqlalchemy.Text(), server_default="untitled"),
+    sqlalchemy.Column("published", sqlalchemy.Boolean(), server_default="0"),
+    sqlalchemy.Index("ix_books_title", "title"),
+)
+"""
+
+OPERATIONS = """[
+    savannah.CreateTable(
+        table_name="authors",
+        columns=[
+            sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True),
+            sqlalchemy.Column("name", sqlalchemy.String(length=100), nullable=False),
+            sqlalchemy.Column("email", sqlalchemy.String(), unique=True),
+        ],
+    ),
+    savannah.CreateTable(
+        table_name="books",
+        columns=[
+            sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True),
+            sqlalchemy.Column(
+                "author_id",
+                sqlalchemy.Integer(),
+                sqlalchemy.ForeignKey("authors.id", ondelete="CASCADE"),
+            ),
+            sqlalchemy.Column("title", sqlalchemy.Text(), server_default="untitled"),
+            sqlalchemy.Column("published", sqlalchemy.Boolean(), server_default="0"),
+        ],
+    ),
+    savannah.CreateIndex("ix_books_title", "books", ["title"]),
+]"""
+
+
+@pytest.fixture
+def models(migrations_dir):
+    with open("models.py", "w") as fout:
+        fout.write(MODELS)
+    savannah.Config(metadata="models:metadata").write_config_to_disk(
+        path=os.path.join(migrations_dir, "__init__.py")
+    )
+    yield
+    sys.modules.pop("models", None)
+
+
+@pytest.mark.asyncio
+async def test_diff(models, migrations_dir, write_migration):
+    url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], OPERATIONS)
+    await savannah.migrate(url)
+    assert await savannah.diff(url) == []
+
+    connection = sqlite3.connect("test.db")
+    connection.execute("ALTER TABLE books ADD COLUMN isbn VARCHAR(13)")
+    connection.execute("DROP INDEX ix_books_title")
+    connection.commit()
+    connection.close()
+
+    operations = await savannah.diff(url)
+    assert [type(operation).__name__ for operation in operations] == [
+        "DropColumn",
+        "CreateIndex",
+    ]
+    assert operations[0].column.name == "isbn"
+
+
+def test_catalog_type():
+    dialect = _get_dialect("postgresql://localhost/example")
+    assert (
+        repr(catalog_type(dialect, "character varying(100)")) == "VARCHAR(length=100)"
+    )
+    assert (
+        repr(catalog_type(dialect, "numeric(10,2)")) == "NUMERIC(precision=10, scale=2)"
+    )
+    assert catalog_type(dialect, "timestamp(3) with time zone").timezone
+    assert repr(catalog_type(dialect, "integer[]")) == "ARRAY(INTEGER())"
+    assert repr(catalog_type(dialect, "tsvector2")) == "CatalogType('tsvector2')"
+
+
+def test_mysql_type():
+    dialect = _get_dialect("mysql://localhost/example")
+    detector = DatabaseAutodetector(
+        sqlalchemy.MetaData(), sqlalchemy.MetaData(), dialect
+    )
+    for spec, declared in [
+        ("int(11)", sqlalchemy.Integer()),
+        ("bigint", sqlalchemy.BigInteger()),
+        ("tinyint(1)", sqlalchemy.Boolean()),
+        ("decimal(10,2)", sqlalchemy.Numeric(10, 2)),
+        ("int(10) unsigned", mysql.INTEGER(unsigned=True)),
+        ("enum('draft','published')", sqlalchemy.Enum("draft", "published")),
+        ("varchar(100)", sqlalchemy.String(length=100)),
+    ]:
+        assert detector.type_signature(
+            mysql_type(dialect, spec)
+        ) == detector.type_signature(declared)
+
+
+def test_normalize_sql():
+    assert normalize_sql("'draft'::character varying") == "draft"
+    assert normalize_sql("((price > (0)::numeric))") == normalize_sql("price > 0")
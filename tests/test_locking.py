@@ -0,0 +1,38 @@
+from databases import Database
+from savannah.commands import migrate_database
+from savannah.locking import migration_lock
+import asyncio
+import savannah
+import pytest
+import sqlite3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_migrate(migrations_dir, write_migration, create_table):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+
+    async def migrate():
+        async with Database(database_url) as database:
+            return await migrate_database(database, dir=migrations_dir)
+
+    counts = await asyncio.gather(*[migrate() for _ in range(5)])
+    assert sorted(counts) == [0, 0, 0, 0, 2]
+    with sqlite3.connect("test.db") as connection:
+        rows = connection.execute("SELECT name FROM migrations ORDER BY name")
+        assert [row[0] for row in rows] == ["0001_initial", "0002_auto"]
+
+
+@pytest.mark.asyncio
+async def test_lock_timeout(migrations_dir, write_migration, create_table):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+
+    async with Database(database_url) as database:
+        async with migration_lock(database):
+            with pytest.raises(savannah.LockTimeout):
+                await savannah.migrate(database_url, migration_lock_timeout=0.2)
+
+    await savannah.migrate(database_url, migration_lock_timeout=0.2)
+    assert await savannah.check(database_url)
@@ -0,0 +1,64 @@
+from savannah.loader import load_migrations
+from savannah.manifest import MANIFEST_PATH, load_manifest, parse_migration
+import os
+import sys
+
+
+def test_parse_migration():
+    source = b"""
+import savannah
+
+class Migration(savannah.Migration):
+    dependencies = ["0001_initial"]
+"""
+    assert parse_migration(source) == {
+        "dependencies": ["0001_initial"],
+        "replaces": [],
+    }
+
+    source = b"""
+import savannah
+
+class Migration(savannah.Migration):
+    operations = []
+"""
+    assert parse_migration(source) == {"dependencies": [], "replaces": []}
+
+    source = b"""
+import savannah
+
+class Migration(savannah.Migration):
+    dependencies = [name for name in ("0001_initial",)]
+"""
+    assert parse_migration(source) is None
+
+
+def test_load_migrations_without_import(migrations_dir, write_migration):
+    write_migration(migrations_dir, "0001_initial", [])
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"])
+
+    graph = load_migrations(set(), dir_name=migrations_dir)
+    assert graph.order == ["0001_initial", "0002_auto"]
+    assert graph.leaves == ["0002_auto"]
+    assert "migrations.0001_initial" not in sys.modules
+    assert os.path.exists(os.path.join(migrations_dir, MANIFEST_PATH))
+
+    migration = graph["0002_auto"].load()
+    assert migration.name == "0002_auto"
+    assert "migrations.0002_auto" in sys.modules
+
+
+def test_manifest_picks_up_changes(migrations_dir, write_migration):
+    write_migration(migrations_dir, "0001_initial", [])
+    write_migration(migrations_dir, "0002_a", ["0001_initial"])
+    write_migration(migrations_dir, "0002_b", ["0001_initial"])
+    first = load_manifest(migrations_dir)
+
+    write_migration(migrations_dir, "0002_b", ["0001_initial", "0002_a"])
+    os.remove(os.path.join(migrations_dir, "0002_a.py"))
+    write_migration(migrations_dir, "0002_a", ["0001_initial"], extra="    # ...\n")
+    second = load_manifest(migrations_dir)
+
+    assert second["0002_b"].dependencies == ["0001_initial", "0002_a"]
+    assert second["0002_a"].hash != first["0002_a"].hash
+    assert second["0001_initial"].hash == first["0001_initial"].hash
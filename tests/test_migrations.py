@@ -1,6 +1,7 @@
 import savannah
 import pytest
 import os
+import sys
 
 
 @pytest.mark.asyncio
@@ -52,3 +53,66 @@ async def test_migrate(tmp_path, database_url):
         assert [m.is_applied for m in migrations] == [False, False, False]
     finally:
         await savannah.drop_database(database_url)
+
+
+@pytest.mark.asyncio
+async def test_migrate_branches(migrations_dir, write_migration):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [])
+    write_migration(migrations_dir, "0002_a", ["0001_initial"])
+    write_migration(migrations_dir, "0002_b", ["0001_initial"])
+    write_migration(migrations_dir, "0003_merge", ["0002_a", "0002_b"])
+
+    await savannah.migrate(database_url, target="0002_a")
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.name for m in migrations] == [
+        "0001_initial",
+        "0002_a",
+        "0002_b",
+        "0003_merge",
+    ]
+    assert [m.is_applied for m in migrations] == [True, True, False, False]
+
+    await savannah.migrate(database_url)
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [True, True, True, True]
+    assert [m.name for m in migrations if m.is_leaf] == ["0003_merge"]
+
+
+@pytest.mark.asyncio
+async def test_make_migration_with_url(migrations_dir, write_migration):
+    write_migration(migrations_dir, "0001_initial", [])
+    with open("models.py", "w") as fout:
+        fout.write("import sqlalchemy\n\nmetadata = sqlalchemy.MetaData()\n")
+    savannah.Config(metadata="models:metadata").write_config_to_disk(
+        path=os.path.join(migrations_dir, "__init__.py")
+    )
+
+    try:
+        with pytest.warns(DeprecationWarning):
+            await savannah.make_migration("sqlite:///test.db")
+    finally:
+        sys.modules.pop("models", None)
+    assert os.path.exists(os.path.join(migrations_dir, "0002_auto.py"))
+
+
+def test_make_migration_cli_accepts_database(migrations_dir, write_migration):
+    from click.testing import CliRunner
+    from savannah.cli import cli
+
+    write_migration(migrations_dir, "0001_initial", [])
+    with open("models.py", "w") as fout:
+        fout.write("import sqlalchemy\n\nmetadata = sqlalchemy.MetaData()\n")
+    savannah.Config(metadata="models:metadata").write_config_to_disk(
+        path=os.path.join(migrations_dir, "__init__.py")
+    )
+
+    try:
+        result = CliRunner().invoke(
+            cli, ["make-migration", "--database", "sqlite:///test.db", "--check"]
+        )
+    finally:
+        sys.modules.pop("models", None)
+    assert result.exit_code == 0, result.output
+    assert "the database URL is ignored" in result.output
+    assert "No changes detected." in result.output
@@ -0,0 +1,60 @@
+import savannah
+import pytest
+import sqlite3
+
+
+def table_names(connection):
+    rows = connection.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return sorted(row[0] for row in rows)
+
+
+def test_migrate_sql(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    url = "sqlite:///test.db"
+
+    script = "".join(savannah.migrate_sql(url, target="0001"))
+    assert script.count("BEGIN;") == 1
+    assert "INSERT INTO migrations (name, applied_at, statements, checksum)" in script
+    with sqlite3.connect("test.db") as connection:
+        connection.executescript(script)
+        assert table_names(connection) == ["a", "migrations"]
+
+    script = "".join(savannah.migrate_sql(url, start="0001"))
+    assert "CREATE TABLE migrations" not in script
+    with sqlite3.connect("test.db") as connection:
+        connection.executescript(script)
+        assert table_names(connection) == ["a", "b", "migrations"]
+        rows = connection.execute("SELECT name FROM migrations ORDER BY name")
+        assert [row[0] for row in rows] == ["0001_initial", "0002_auto"]
+
+    script = "".join(savannah.migrate_sql(url, target="zero", start="0002"))
+    with sqlite3.connect("test.db") as connection:
+        connection.executescript(script)
+        assert table_names(connection) == ["migrations"]
+        assert connection.execute("SELECT count(*) FROM migrations").fetchone() == (0,)
+
+
+def test_migrate_sql_non_atomic(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(
+        migrations_dir,
+        "0002_auto",
+        ["0001_initial"],
+        "[savannah.CreateIndex('ix_a_id', table_name='a', columns=['id'], concurrently=True)]",
+    )
+
+    script = "".join(savannah.migrate_sql("postgresql://localhost/example"))
+    _, _, after_commit = script.partition("COMMIT;")
+    assert "BEGIN;" not in after_commit
+    assert "CREATE INDEX CONCURRENTLY ix_a_id ON a (id);" in after_commit
+
+
+def test_migrate_sql_custom_code(migrations_dir, write_migration):
+    extra = """
+    async def upgrade(self, database):
+        pass
+"""
+    write_migration(migrations_dir, "0001_initial", [], extra=extra)
+    with pytest.raises(Exception, match="custom code"):
+        "".join(savannah.migrate_sql("sqlite:///test.db"))
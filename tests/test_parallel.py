@@ -0,0 +1,109 @@
+import savannah
+import pytest
+import sqlalchemy
+from savannah.parallel import ParallelScheduler
+
+
+class FakeMigration:
+    def __init__(self, name, dependencies, dependants, tables):
+        self.name = name
+        self.dependencies = dependencies
+        self.dependants = dependants
+        self.touched_tables = tables
+
+    def load(self):
+        return self
+
+
+def names(migrations):
+    return [migration.name for migration in migrations]
+
+
+def test_touched_tables():
+    class Migration(savannah.Migration):
+        operations = [
+            savannah.CreateTable(
+                "b",
+                columns=[
+                    sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True),
+                    sqlalchemy.Column(
+                        "a_id", sqlalchemy.Integer(), sqlalchemy.ForeignKey("a.id")
+                    ),
+                ],
+            ),
+            savannah.CreateIndex("ix_c_id", table_name="c", columns=["id"]),
+        ]
+
+    migration = Migration(name="0001", is_applied=False, dependants=[])
+    assert migration.touched_tables == {"a", "b", "c"}
+
+    Migration.operations = [*Migration.operations, savannah.RunSQL("SELECT 1")]
+    assert migration.touched_tables is None
+
+    Migration.touches = ["d"]
+    assert migration.touched_tables == {"d"}
+
+
+def test_scheduler():
+    migrations = [
+        FakeMigration("0001", [], ["0002_a", "0002_b", "0002_c"], {"a"}),
+        FakeMigration("0002_a", ["0001"], ["0003"], {"b"}),
+        FakeMigration("0002_b", ["0001"], ["0003"], {"b", "c"}),
+        FakeMigration("0002_c", ["0001"], ["0003"], {"d"}),
+        FakeMigration("0003", ["0002_a", "0002_b", "0002_c"], [], None),
+    ]
+    scheduler = ParallelScheduler(migrations, concurrency=4)
+    assert names(scheduler.start_ready()) == ["0001"]
+    assert names(scheduler.start_ready()) == []
+
+    # 0002_b touches a table that 0002_a is changing, so it waits.
+    scheduler.complete("0001")
+    assert names(scheduler.start_ready()) == ["0002_a", "0002_c"]
+    scheduler.complete("0002_a")
+    assert names(scheduler.start_ready()) == ["0002_b"]
+
+    # A migration with unknown tables runs on its own.
+    scheduler.complete("0002_b")
+    scheduler.complete("0002_c")
+    assert names(scheduler.start_ready()) == ["0003"]
+    scheduler.complete("0003")
+    assert scheduler.is_finished
+
+
+def test_scheduler_concurrency():
+    migrations = [
+        FakeMigration(f"0001_{index}", [], [], {f"table_{index}"}) for index in range(5)
+    ]
+    scheduler = ParallelScheduler(migrations, concurrency=2)
+    assert names(scheduler.start_ready()) == ["0001_0", "0001_1"]
+    scheduler.complete("0001_1")
+    assert names(scheduler.start_ready()) == ["0001_2"]
+
+
+@pytest.mark.asyncio
+async def test_migrate_parallel(migrations_dir, write_migration):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], "[]")
+    for branch in "abc":
+        write_migration(
+            migrations_dir,
+            f"0002_{branch}",
+            ["0001_initial"],
+            f"[savannah.CreateTable(table_name={branch!r}, columns=["
+            "sqlalchemy.Column('id', sqlalchemy.Integer(), primary_key=True)])]",
+        )
+    write_migration(migrations_dir, "0003_merge", ["0002_a", "0002_b", "0002_c"])
+
+    with pytest.raises(Exception, match="share a transaction"):
+        await savannah.migrate(database_url, parallel=4)
+    with pytest.raises(Exception, match="Batched"):
+        await savannah.migrate(
+            database_url, parallel=4, batch=True, atomicity="per-migration"
+        )
+
+    await savannah.migrate(database_url, parallel=4, atomicity="per-migration")
+    migrations = await savannah.list_migrations(database_url)
+    assert all(migration.is_applied for migration in migrations)
+    timings = await savannah.migration_timings(database_url)
+    assert all(timing["duration"] is not None for timing in timings)
+    assert await savannah.check(database_url)
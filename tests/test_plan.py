@@ -0,0 +1,37 @@
+import savannah
+import pytest
+
+
+def names(migrations):
+    return [migration.name for migration in migrations]
+
+
+@pytest.mark.asyncio
+async def test_plan_leaves_other_branches(migrations_dir, write_migration):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [])
+    write_migration(migrations_dir, "0002_a", ["0001_initial"])
+    write_migration(migrations_dir, "0002_b", ["0001_initial"])
+    write_migration(migrations_dir, "0003_a", ["0002_a"])
+    await savannah.migrate(database_url)
+
+    # 0003_a does not depend on 0002_b, so it stays applied.
+    downgrades, upgrades = await savannah.migration_plan(database_url, "0002_b")
+    assert names(downgrades) == []
+    assert names(upgrades) == []
+
+    downgrades, upgrades = await savannah.migration_plan(database_url, "0002_a")
+    assert names(downgrades) == ["0003_a"]
+    assert names(upgrades) == []
+
+    await savannah.migrate(database_url, target="0001")
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [True, False, False, False]
+
+    # Only the ancestors of the target are applied.
+    downgrades, upgrades = await savannah.migration_plan(database_url, "0003")
+    assert names(downgrades) == []
+    assert names(upgrades) == ["0002_a", "0003_a"]
+
+    with pytest.raises(Exception, match="more than one"):
+        await savannah.migration_plan(database_url, "0002")
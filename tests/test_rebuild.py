@@ -0,0 +1,150 @@
+import savannah
+import pytest
+import sqlalchemy
+import sqlite3
+from sqlalchemy.dialects import postgresql, sqlite
+from savannah.operations.rebuild_table import RebuildTable, batch_operations
+
+INITIAL = """[
+    savannah.CreateTable(
+        table_name="authors",
+        columns=[sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True)],
+    ),
+    savannah.CreateTable(
+        table_name="books",
+        columns=[
+            sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True),
+            sqlalchemy.Column("title", sqlalchemy.String(length=50)),
+            sqlalchemy.Column("price", sqlalchemy.Integer(), nullable=False),
+            sqlalchemy.Column("isbn", sqlalchemy.String(length=13)),
+            sqlalchemy.Column(
+                "author_id",
+                sqlalchemy.Integer(),
+                sqlalchemy.ForeignKey("authors.id", name="fk_books_author"),
+            ),
+        ],
+        constraints=[
+            sqlalchemy.CheckConstraint("price > 0", name="ck_books_price"),
+        ],
+    ),
+    savannah.CreateIndex("ix_books_isbn", "books", ["isbn"]),
+    savannah.RunSQL(
+        ["INSERT INTO authors (id) VALUES (1)",
+         "INSERT INTO books VALUES (1, 'Dune', 10, '9780441013593', 1)"]
+    ),
+]"""
+
+CHANGES = """[
+    savannah.AlterColumn(
+        table_name="books",
+        column=sqlalchemy.Column("title", sqlalchemy.Text(), nullable=False),
+        existing=sqlalchemy.Column("title", sqlalchemy.String(length=50)),
+    ),
+    savannah.DropIndex("ix_books_isbn", "books", ["isbn"]),
+    savannah.DropColumn(
+        table_name="books",
+        column=sqlalchemy.Column("isbn", sqlalchemy.String(length=13)),
+    ),
+    savannah.AddColumn(
+        table_name="books",
+        column=sqlalchemy.Column(
+            "stock", sqlalchemy.Integer(), nullable=False, server_default="0"
+        ),
+    ),
+    savannah.AddConstraint(
+        table_name="books",
+        constraint=sqlalchemy.UniqueConstraint("title", name="uq_books_title"),
+    ),
+    savannah.CreateIndex("ix_books_stock", "books", ["stock"]),
+]"""
+
+
+class Recorder(savannah.Instrument):
+    def __init__(self):
+        self.statements = []
+
+    def handle(self, event):
+        if event.kind == "statement" and event.phase == "start":
+            self.statements.append(event.name)
+
+
+def table_sql(name):
+    with sqlite3.connect("test.db") as connection:
+        return connection.execute(
+            "SELECT sql FROM sqlite_master WHERE name = ?", (name,)
+        ).fetchone()[0]
+
+
+def index_names():
+    with sqlite3.connect("test.db") as connection:
+        rows = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )
+        return sorted(row[0] for row in rows)
+
+
+def books():
+    with sqlite3.connect("test.db") as connection:
+        return connection.execute("SELECT * FROM books").fetchall()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch", [False, True])
+async def test_rebuild_once_per_migration(migrations_dir, write_migration, batch):
+    url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], INITIAL)
+    write_migration(migrations_dir, "0002_books", ["0001_initial"], CHANGES)
+    await savannah.migrate(url, target="0001_initial")
+
+    recorder = Recorder()
+    await savannah.migrate(url, batch=batch, instruments=[recorder])
+    copies = [
+        sql for sql in recorder.statements if "SELECT" in sql and "FROM books" in sql
+    ]
+    assert len(copies) == 1
+    assert books() == [(1, "Dune", 10, 1, 0)]
+    assert index_names() == ["ix_books_stock"]
+    sql = table_sql("books")
+    assert "title TEXT NOT NULL" in sql
+    assert "CONSTRAINT ck_books_price CHECK (price > 0)" in sql
+    assert "CONSTRAINT fk_books_author FOREIGN KEY" in sql
+    assert "CONSTRAINT uq_books_title UNIQUE (title)" in sql
+
+    await savannah.migrate(url, target="0001_initial", batch=batch)
+    assert books() == [(1, "Dune", 10, 1, None)]
+    assert index_names() == ["ix_books_isbn"]
+    assert "title VARCHAR(50)" in table_sql("books")
+    assert "uq_books_title" not in table_sql("books")
+
+
+def test_batch_operations():
+    alter = savannah.AlterColumn(
+        "a",
+        column=sqlalchemy.Column("x", sqlalchemy.Text()),
+        existing=sqlalchemy.Column("x", sqlalchemy.String()),
+    )
+    add = savannah.AddColumn("a", sqlalchemy.Column("y", sqlalchemy.Integer()))
+    other = savannah.AddColumn("b", sqlalchemy.Column("z", sqlalchemy.Integer()))
+    run_sql = savannah.RunSQL("UPDATE a SET y = 1")
+    drop = savannah.DropColumn("a", sqlalchemy.Column("y", sqlalchemy.Integer()))
+    operations = [add, other, alter, run_sql, drop]
+
+    assert batch_operations(operations, postgresql.dialect()) == operations
+    batched = batch_operations(operations, sqlite.dialect())
+    assert [type(operation) for operation in batched] == [
+        RebuildTable,
+        savannah.AddColumn,
+        savannah.RunSQL,
+        RebuildTable,
+    ]
+    assert batched[0].operations == [add, alter]
+    assert batched[3].operations == [drop]
+
+    batched = batch_operations(operations, sqlite.dialect(), reverse=True)
+    assert [type(operation) for operation in batched] == [
+        RebuildTable,
+        savannah.RunSQL,
+        RebuildTable,
+        savannah.AddColumn,
+    ]
+    assert batched[2].operations == [add, alter]
@@ -0,0 +1,162 @@
+import savannah
+import os
+import pytest
+import sqlite3
+import sys
+
+MODELS = """\
+import sqlalchemy
+
+metadata = sqlalchemy.MetaData()
+for name in ["a", "b", "c", "d"]:
+    sqlalchemy.Table(
+        name, metadata, sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True)
+    )
+"""
+
+
+@pytest.fixture
+def history(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    write_migration(migrations_dir, "0003_auto", ["0002_auto"], create_table("c"))
+    write_migration(migrations_dir, "0004_auto", ["0003_auto"])
+    return migrations_dir
+
+
+@pytest.mark.asyncio
+async def test_squash(history):
+    database_url = "sqlite:///test.db"
+    await savannah.squash("0001", "0003", dir=history)
+
+    with open(os.path.join(history, "0001_squashed_0003_auto.py")) as fin:
+        source = fin.read()
+    assert 'replaces = ["0001_initial", "0002_auto", "0003_auto"]' in source
+    assert source.count("savannah.CreateTable(") == 3
+
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.name for m in migrations] == ["0001_squashed_0003_auto", "0004_auto"]
+    assert migrations[1].dependencies == ["0001_squashed_0003_auto"]
+
+    await savannah.migrate(database_url)
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [True, True]
+
+    await savannah.migrate(database_url, target="zero")
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.is_applied for m in migrations] == [False, False]
+
+
+@pytest.mark.asyncio
+async def test_squash_with_originals_applied(history):
+    database_url = "sqlite:///test.db"
+    await savannah.migrate(database_url, target="0003")
+    await savannah.squash("0001", "0003", dir=history)
+
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.name for m in migrations] == ["0001_squashed_0003_auto", "0004_auto"]
+    assert [m.is_applied for m in migrations] == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_squash_with_originals_partially_applied(history):
+    database_url = "sqlite:///test.db"
+    await savannah.migrate(database_url, target="0002")
+    await savannah.squash("0001", "0003", dir=history)
+
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.name for m in migrations] == [
+        "0001_initial",
+        "0002_auto",
+        "0003_auto",
+        "0004_auto",
+    ]
+    assert [m.is_applied for m in migrations] == [True, True, False, False]
+
+    await savannah.migrate(database_url)
+    migrations = await savannah.list_migrations(database_url)
+    assert [m.name for m in migrations] == ["0001_squashed_0003_auto", "0004_auto"]
+    assert [m.is_applied for m in migrations] == [True, True]
+
+
+@pytest.mark.asyncio
+async def test_make_migration_after_squash(
+    migrations_dir, write_migration, create_table
+):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    write_migration(migrations_dir, "0003_auto", ["0002_auto"], create_table("c"))
+    with open("models.py", "w") as fout:
+        fout.write(MODELS)
+    savannah.Config(metadata="models:metadata").write_config_to_disk(
+        path=os.path.join(migrations_dir, "__init__.py")
+    )
+
+    try:
+        await savannah.squash("0001", "0003", dir=migrations_dir)
+        # The squashed migration is numbered 0001, but 0002 is taken.
+        assert await savannah.make_migration(dir=migrations_dir)
+    finally:
+        sys.modules.pop("models", None)
+
+    migrations = await savannah.list_migrations("sqlite:///test.db")
+    assert [m.name for m in migrations] == ["0001_squashed_0003_auto", "0004_auto"]
+    assert migrations[1].dependencies == ["0001_squashed_0003_auto"]
+
+
+@pytest.mark.asyncio
+async def test_squash_folds_schema_changes(
+    migrations_dir, write_migration, create_table
+):
+    database_url = "sqlite:///test.db"
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(
+        migrations_dir,
+        "0002_auto",
+        ["0001_initial"],
+        "[savannah.AddColumn('a', sqlalchemy.Column('name', sqlalchemy.Text())), "
+        "savannah.AddColumn('a', sqlalchemy.Column('old', sqlalchemy.Integer())), "
+        "savannah.CreateIndex('ix_a_name', table_name='a', columns=['name'])]",
+    )
+    write_migration(
+        migrations_dir,
+        "0003_auto",
+        ["0002_auto"],
+        "[savannah.DropColumn('a', sqlalchemy.Column('old', sqlalchemy.Integer())), "
+        "savannah.AlterColumn('a', "
+        "column=sqlalchemy.Column('name', sqlalchemy.Text(), nullable=False), "
+        "existing=sqlalchemy.Column('name', sqlalchemy.Text()))]",
+    )
+    await savannah.squash("0001", "0003", dir=migrations_dir)
+
+    with open(os.path.join(migrations_dir, "0001_squashed_0003_auto.py")) as fin:
+        source = fin.read()
+    assert source.count("savannah.CreateTable(") == 1
+    assert source.count("savannah.CreateIndex(") == 1
+    assert "AddColumn" not in source and "DropColumn" not in source
+    assert "'old'" not in source and '"old"' not in source
+    assert "nullable=False" in source
+
+    await savannah.migrate(database_url)
+    with sqlite3.connect("test.db") as connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(a)")]
+    assert columns == ["id", "name"]
+
+
+@pytest.mark.asyncio
+async def test_squash_keeps_data_operations(
+    migrations_dir, write_migration, create_table
+):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(
+        migrations_dir,
+        "0002_auto",
+        ["0001_initial"],
+        "[savannah.RunSQL('INSERT INTO a (id) VALUES (1)', reverse_sql='DELETE FROM a')]",
+    )
+    await savannah.squash("0001", "0002", dir=migrations_dir)
+
+    with open(os.path.join(migrations_dir, "0001_squashed_0002_auto.py")) as fin:
+        source = fin.read()
+    assert "savannah.CreateTable(" in source
+    assert "savannah.RunSQL(" in source
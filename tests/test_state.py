@@ -0,0 +1,61 @@
+from savannah.loader import load_migrations
+from savannah.state import SNAPSHOT_DIR, compute_state_hashes, load_state
+import savannah
+import os
+import sys
+
+
+def test_load_state(migrations_dir, write_migration, create_table, unload):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    write_migration(
+        migrations_dir,
+        "0003_auto",
+        ["0002_auto"],
+        "[savannah.CreateIndex('ix_b_id', table_name='b', columns=['id'])]",
+    )
+
+    graph = load_migrations(set(), dir_name=migrations_dir)
+    metadata = load_state(graph, dir_name=migrations_dir)
+    assert sorted(metadata.tables) == ["a", "b"]
+    assert [index.name for index in metadata.tables["b"].indexes] == ["ix_b_id"]
+    state_hash = compute_state_hashes(graph)["0003_auto"]
+    snapshot = os.path.join(migrations_dir, SNAPSHOT_DIR, f"{state_hash}.pickle")
+    assert os.path.exists(snapshot)
+
+    # Only the migrations written after the snapshot are replayed.
+    unload(migrations_dir)
+    write_migration(migrations_dir, "0004_auto", ["0003_auto"], create_table("c"))
+    graph = load_migrations(set(), dir_name=migrations_dir)
+    metadata = load_state(graph, dir_name=migrations_dir)
+    assert sorted(metadata.tables) == ["a", "b", "c"]
+    assert f"{migrations_dir}.0004_auto" in sys.modules
+    assert f"{migrations_dir}.0001_initial" not in sys.modules
+
+
+def test_state_hash_covers_ancestors(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"])
+    before = compute_state_hashes(load_migrations(set(), dir_name=migrations_dir))
+
+    write_migration(migrations_dir, "0001_initial", [], create_table("bb"))
+    after = compute_state_hashes(load_migrations(set(), dir_name=migrations_dir))
+    assert before["0002_auto"] != after["0002_auto"]
+
+
+def test_unreadable_snapshot_is_replayed(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    graph = load_migrations(set(), dir_name=migrations_dir)
+    load_state(graph, dir_name=migrations_dir)
+    state_hash = compute_state_hashes(graph)["0002_auto"]
+    snapshot = os.path.join(migrations_dir, SNAPSHOT_DIR, f"{state_hash}.pickle")
+    with open(snapshot, "r+b") as fout:
+        fout.truncate(10)
+
+    metadata = load_state(graph, dir_name=migrations_dir)
+    assert sorted(metadata.tables) == ["a", "b"]
+    # The snapshot was written again from the replayed state.
+    assert sorted(load_state(graph, dir_name=migrations_dir).tables) == ["a", "b"]
+    with open(snapshot, "rb") as fin:
+        assert len(fin.read()) > 10
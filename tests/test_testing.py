@@ -0,0 +1,50 @@
+import savannah
+import pytest
+import os
+from savannah.testing import DatabasePool
+
+
+def templates():
+    return sorted(path for path in os.listdir(".") if "_template_" in path)
+
+
+@pytest.mark.asyncio
+async def test_database_pool(migrations_dir, write_migration, create_table):
+    write_migration(migrations_dir, "0001_initial", [], create_table("a"))
+    pool = DatabasePool("sqlite:///test.db", size=2, name="gw0")
+    await pool.prepare()
+    assert len(templates()) == 1
+    assert pool.ready == ["sqlite:///test_gw0_1.db", "sqlite:///test_gw0_2.db"]
+
+    first = await pool.acquire()
+    second = await pool.acquire()
+    assert first != second
+    for url in (first, second):
+        migrations = await savannah.list_migrations(url)
+        assert [m.is_applied for m in migrations] == [True]
+        assert await savannah.check(url)
+
+    await pool.release(first)
+    assert not os.path.exists("test_gw0_1.db")
+    assert pool.ready == ["sqlite:///test_gw0_3.db"]
+    await pool.close()
+    assert not any(path.startswith("test_gw0") for path in os.listdir("."))
+
+    # The template is reused until the migrations change.
+    template = templates()[0]
+    mtime = os.stat(template).st_mtime_ns
+    pool = DatabasePool("sqlite:///test.db", size=1, name="gw1")
+    await pool.prepare()
+    assert templates() == [template]
+    assert os.stat(template).st_mtime_ns == mtime
+    await pool.close()
+
+    write_migration(migrations_dir, "0002_auto", ["0001_initial"], create_table("b"))
+    pool = DatabasePool("sqlite:///test.db", size=1, name="gw0")
+    await pool.prepare()
+    assert len(templates()) == 1
+    assert templates() != [template]
+    url = await pool.acquire()
+    migrations = await savannah.list_migrations(url)
+    assert [m.is_applied for m in migrations] == [True, True]
+    await pool.close()
@@ -0,0 +1,101 @@
+import savannah
+import pytest
+import sqlite3
+from savannah.timeouts import Timeouts, is_lock_timeout
+
+FLAKY_UPGRADE = """
+    lock_attempts = 3
+    failures = {failures}
+
+    async def upgrade(self, database):
+        await database.execute("CREATE TABLE a (id INTEGER PRIMARY KEY)")
+        if Migration.failures:
+            Migration.failures -= 1
+            error = Exception("canceling statement due to lock timeout")
+            error.sqlstate = "55P03"
+            raise error
+"""
+
+
+class Recorder(savannah.Instrument):
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event):
+        self.events.append(event)
+
+
+def test_timeout_statements():
+    timeouts = Timeouts(lock_timeout=2.5, statement_timeout=60)
+    assert timeouts.set_statements("postgresql") == [
+        "SET lock_timeout = 2500",
+        "SET statement_timeout = 60000",
+    ]
+    assert timeouts.reset_statements("postgresql") == [
+        "RESET lock_timeout",
+        "RESET statement_timeout",
+    ]
+    assert timeouts.set_statements("mysql") == ["SET SESSION lock_wait_timeout = 3"]
+    assert timeouts.set_statements("sqlite") == []
+    assert Timeouts().set_statements("postgresql") == []
+
+
+def test_migration_overrides_and_backoff():
+    class Migration(savannah.Migration):
+        lock_timeout = 1.0
+
+    timeouts = Timeouts(lock_timeout=5.0, attempts=4, backoff=1.0, max_backoff=3.0)
+    limits = timeouts.for_migration(Migration("0001_initial", False, []))
+    assert (limits.lock_timeout, limits.attempts) == (1.0, 4)
+    assert timeouts.for_migration(savannah.Migration("0002", False, [])) is timeouts
+
+    for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 3.0), (10, 3.0)]:
+        assert all(0 <= timeouts.delay(attempt) <= ceiling for _ in range(20))
+
+
+def test_is_lock_timeout():
+    error = Exception("lock timeout")
+    error.sqlstate = "55P03"
+    assert is_lock_timeout(error)
+    assert is_lock_timeout(Exception(1205, "Lock wait timeout exceeded"))
+    assert not is_lock_timeout(Exception("syntax error"))
+
+
+@pytest.mark.asyncio
+async def test_lock_timeouts_are_retried(migrations_dir, write_migration):
+    write_migration(
+        migrations_dir, "0001_initial", [], extra=FLAKY_UPGRADE.format(failures=2)
+    )
+
+    recorder = Recorder()
+    await savannah.migrate(
+        "sqlite:///test.db", instruments=[recorder], timeouts=Timeouts(backoff=0)
+    )
+    with sqlite3.connect("test.db") as connection:
+        assert connection.execute("SELECT count(*) FROM a").fetchone() == (0,)
+
+    retries = [event for event in recorder.events if event.phase == "timeout"]
+    assert [event.details["attempt"] for event in retries] == [1, 2]
+    [end] = [
+        event
+        for event in recorder.events
+        if event.kind == "migration" and event.phase == "end"
+    ]
+    assert end.details["attempts"] == 3
+    assert end.details["lock_wait"] >= 0
+    assert end.details["execution"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_completed_statements_are_not_retried(migrations_dir, write_migration):
+    write_migration(
+        migrations_dir, "0001_initial", [], extra=FLAKY_UPGRADE.format(failures=1)
+    )
+
+    # Without a transaction, the table created by the first attempt remains.
+    with pytest.raises(Exception, match="lock timeout"):
+        await savannah.migrate(
+            "sqlite:///test.db", atomicity="none", timeouts=Timeouts(backoff=0)
+        )
+    migrations = await savannah.list_migrations("sqlite:///test.db")
+    assert [migration.is_applied for migration in migrations] == [False]
@@ -0,0 +1,115 @@
+import savannah
+import io
+import pytest
+import sqlalchemy
+from savannah.generators.writer import write_migration
+from savannah.operations.render import render_column
+
+
+def long_table(name, count):
+    columns = [sqlalchemy.Column("id", sqlalchemy.Integer(), primary_key=True)]
+    for index in range(count):
+        columns.append(
+            sqlalchemy.Column(
+                f"column_{index}",
+                sqlalchemy.String(length=100),
+                sqlalchemy.ForeignKey(f"other_{index}.id", ondelete="CASCADE"),
+                nullable=False,
+                server_default="it's",
+                comment='a "comment"',
+            )
+        )
+    return savannah.CreateTable(name, columns=columns)
+
+
+def write(operations, **kwargs):
+    fout = io.StringIO()
+    count = write_migration(fout, operations, **kwargs)
+    return fout.getvalue(), count
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 20])
+def test_output_matches_black(count):
+    black = pytest.importorskip("black")
+    operations = [long_table(f"table_{index}", index) for index in range(count)]
+    operations.append(savannah.RunSQL(["SELECT 1", "SELECT 2"], reverse_sql="SELECT 3"))
+    text, written = write(
+        (operation for operation in operations),
+        dependencies=["0001_initial", "0002_auto"],
+        replaces=["0003_a"],
+    )
+    assert written == len(operations)
+    with pytest.raises(black.NothingChanged):
+        black.format_file_contents(text, fast=False, mode=black.FileMode())
+
+    namespace = {}
+    exec(text, namespace)
+    migration = namespace["Migration"]
+    assert migration.dependencies == ["0001_initial", "0002_auto"]
+    assert migration.replaces == ["0003_a"]
+    assert repr(migration.operations) == repr(operations)
+
+
+def test_empty_migration():
+    text, count = write([])
+    assert count == 0
+    assert text.endswith("    dependencies = []\n    operations = []\n")
+
+
+def test_column_attributes():
+    columns = [
+        sqlalchemy.Column(
+            "id",
+            sqlalchemy.Integer(),
+            sqlalchemy.Identity(always=True, start=10),
+            primary_key=True,
+        ),
+        sqlalchemy.Column("total", sqlalchemy.Integer(), sqlalchemy.Computed("a + b")),
+        sqlalchemy.Column(
+            "name",
+            sqlalchemy.String(),
+            autoincrement=False,
+            unique=True,
+            index=True,
+            default="x",
+            onupdate="y",
+            server_onupdate=sqlalchemy.text("now()"),
+            comment="The name.",
+            key="title",
+            quote=True,
+        ),
+        sqlalchemy.Column(
+            "code", sqlalchemy.Integer(), primary_key=True, nullable=True
+        ),
+    ]
+    for column in columns:
+        source = str(render_column(column))
+        rebuilt = eval(source, {"sqlalchemy": sqlalchemy})
+        assert str(render_column(rebuilt)) == source
+
+    assert "sqlalchemy.Identity(always=True, start=10)" in str(
+        render_column(columns[0])
+    )
+    assert "sqlalchemy.Computed('a + b')" in str(render_column(columns[1]))
+    assert str(render_column(columns[2])) == (
+        "sqlalchemy.Column('name', sqlalchemy.String(), autoincrement=False, "
+        "unique=True, index=True, default='x', onupdate='y', "
+        "server_onupdate=sqlalchemy.text('now()'), comment='The name.', "
+        "key='title', quote=True)"
+    )
+    assert str(render_column(columns[3])).endswith("primary_key=True, nullable=True)")
+
+
+def test_expression_server_default():
+    from sqlalchemy.dialects import sqlite
+
+    column = sqlalchemy.Column(
+        "created", sqlalchemy.DateTime(), server_default=sqlalchemy.func.now()
+    )
+    source = str(render_column(column))
+    assert "server_default=sqlalchemy.text('now()')" in source
+
+    rebuilt = eval(source, {"sqlalchemy": sqlalchemy})
+    table = sqlalchemy.Table("a", sqlalchemy.MetaData(), rebuilt)
+    ddl = str(sqlalchemy.schema.CreateTable(table).compile(dialect=sqlite.dialect()))
+    assert "DEFAULT now()" in ddl